@@ -3,6 +3,7 @@ from flask_cors import CORS
 from .api.routes import api
 from .database import init_db
 from .config.config import settings
+from .middleware.tracing import init_tracing
 
 def create_app():
     app = Flask(__name__)
@@ -12,6 +13,9 @@ def create_app():
     app.config['SECRET_KEY'] = settings.SECRET_KEY
     app.config['SQLALCHEMY_DATABASE_URL'] = settings.DATABASE_URL
     
+    # Trace every request
+    init_tracing(app, settings)
+    
     # Initialize the database
     init_db()
     
@@ -1,24 +1,116 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context, url_for
 from werkzeug.utils import secure_filename
 import os
+import json
 import logging
 import uuid
+import cv2
 from ..core.check_parser import CheckParser
+from ..core.image_processor import ImageQualityError
+from ..core.workspace import ThreadLocalWorkspace, register_workspace_metrics
+from ..core.artifacts import ArtifactStore
+from ..core.archive import CheckArchive
+from ..core.deadline import Deadline
+from ..core.jobs import JOB_ITEM, JobRunner, JobStore, stream_events, summarize
 from ..models.check import Check
-from ..database import get_db, init_db
+from ..database import SessionLocal, get_db, init_db
+from ..config.config import settings
+from ..utils.tracing import span
+from ..utils.export import (CHECK_EXPORT_SCHEMA, EXPORT_MIMETYPES, iter_check_chunks, monthly_summary,
+                            parse_chunk_size, parse_date_bound, resolve_columns, stream_export)
+from ..utils.cache import CachedRecord, LRUCache, invalidate_on_commit, row_version_check
+from ..utils.metrics import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 api = Blueprint('api', __name__)
-check_parser = CheckParser()
+check_parser = CheckParser(
+    workspace=ThreadLocalWorkspace() if settings.IMAGE_WORKSPACE_ENABLED else None
+)
+if check_parser.workspace is not None:
+    register_workspace_metrics(check_parser.workspace)
+
+# Read-through cache of serialized checks for single-check lookups. Local writes
+# evict at commit; hits older than CHECK_CACHE_REVALIDATE_S are revalidated
+# against updated_at, since other processes also write checks.
+check_cache = LRUCache(settings.CHECK_CACHE_SIZE)
+invalidate_on_commit(SessionLocal, Check, check_cache)
+check_row_is_current = row_version_check(SessionLocal, Check, Check.updated_at,
+                                         settings.CHECK_CACHE_REVALIDATE_S)
+
+# Version of records served from the archive, whose checks never change
+ARCHIVED_VERSION = 'archived'
+
+# Preprocessed regions and stage versions per check, for incremental reprocessing
+artifact_store = ArtifactStore(settings.ARTIFACT_STORE_PATH) if settings.ARTIFACT_STORE_PATH else None
+
+# Closed months rolled out of the checks table by run_archive.py
+check_archive = CheckArchive(settings.ARCHIVE_PATH, settings.ARCHIVE_COMPRESSION,
+                             settings.ARCHIVE_ROW_GROUP_SIZE) if settings.ARCHIVE_PATH else None
+
+# Batch jobs: event logs shared by all server workers, run in the accepting process
+job_store = JobStore(settings.JOB_STORE_PATH, settings.JOB_RETENTION_S)
+job_runner = JobRunner(settings.JOB_WORKERS, settings.JOB_HEARTBEAT_S)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
 
+# Parser output returned with a check but not stored on it
+PARSE_METADATA = ('processing_profile',)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def serialize_check_data(check_data):
+    """Convert parser output to the JSON-serializable fields stored on a Check"""
+    return {
+        'amount_numeric': float(check_data.get('amount_numeric', 0.0)),
+        'date': str(check_data.get('date')) if check_data.get('date') else None,
+        'bank_code': str(check_data.get('bank_code', '')),
+        'account_number': str(check_data.get('account_number', '')),
+        'check_number': str(check_data.get('check_number', '')),
+        'fraud_detected': bool(check_data.get('fraud_detected', False)),
+        'signature_verified': bool(check_data.get('signature_verified', False)),
+        'partial': bool(check_data.get('partial', False)),
+        'field_status': json.dumps(check_data['field_status']) if check_data.get('field_status') else None
+    }
+
+def requested_profile():
+    """Processing profile asked for by the ?profile= argument or X-Processing-Profile header"""
+    profile = request.args.get('profile') or request.headers.get('X-Processing-Profile')
+    if profile and profile != 'auto' and profile not in settings.PROCESSING_PROFILES:
+        raise ValueError(f"Unknown processing profile '{profile}'. "
+                         f"Available: auto, {', '.join(settings.PROCESSING_PROFILES)}")
+    return profile
+
+def requested_deadline():
+    """Deadline from the X-Request-Timeout-Ms header (capped at PARSE_DEADLINE_MAX_S), or None"""
+    timeout_ms = request.headers.get('X-Request-Timeout-Ms')
+    if not timeout_ms:
+        return None
+    try:
+        budget = float(timeout_ms) / 1000.0
+    except ValueError:
+        raise ValueError(f"Invalid X-Request-Timeout-Ms: {timeout_ms}")
+    if budget <= 0:
+        raise ValueError("X-Request-Timeout-Ms must be positive")
+    return Deadline(min(budget, settings.PARSE_DEADLINE_MAX_S))
+
+def parse_metadata(check_data):
+    return {key: check_data[key] for key in PARSE_METADATA if key in check_data}
+
+def save_artifacts(check_id, artifacts, raw=None):
+    """Persist a check's artifacts; a failure is logged and does not fail the request"""
+    if artifact_store is None or not artifacts or 'manifest' not in artifacts:
+        return
+    try:
+        with span('artifacts.save', check_id=check_id):
+            artifact_store.save(check_id, artifacts['arrays'], artifacts['manifest'],
+                                raw=raw if settings.ARTIFACT_STORE_RAW else None)
+    except Exception as e:
+        logger.error("Error saving artifacts for check %s: %s", check_id, str(e))
+
 @api.route('/checks/upload', methods=['POST'])
 def upload_check():
     """Handle check image upload and processing"""
@@ -42,32 +134,36 @@ def upload_check():
             logger.error("Invalid file type: %s", file.filename)
             return jsonify({'error': f'Invalid file type. Allowed types are: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
             
+        try:
+            profile = requested_profile()
+            deadline = requested_deadline()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
         try:
             # Read file contents
             file_bytes = file.read()
             
             # Parse check
-            check_data = check_parser.parse_check(file_bytes)
+            artifacts = {} if artifact_store is not None else None
+            check_data = check_parser.parse_check(file_bytes, artifacts, profile, deadline)
+            metadata = parse_metadata(check_data)
             
             # Convert any non-serializable types
-            check_data = {
-                'amount_numeric': float(check_data.get('amount_numeric', 0.0)),
-                'date': str(check_data.get('date')) if check_data.get('date') else None,
-                'bank_code': str(check_data.get('bank_code', '')),
-                'account_number': str(check_data.get('account_number', '')),
-                'check_number': str(check_data.get('check_number', '')),
-                'fraud_detected': bool(check_data.get('fraud_detected', False)),
-                'signature_verified': bool(check_data.get('signature_verified', False))
-            }
+            check_data = serialize_check_data(check_data)
             
             # Save to database
-            db = next(get_db())
-            check = Check(**check_data)
-            db.add(check)
-            db.commit()
+            with span('db.commit', table='checks'):
+                db = next(get_db())
+                check = Check(**check_data)
+                db.add(check)
+                db.commit()
+            
+            save_artifacts(check.id, artifacts, raw=file_bytes)
             
             # Get the data after save to include generated check number
             saved_data = check.to_dict()
+            saved_data.update(metadata)
             
             logger.debug("Check processed successfully: %s", saved_data)
             return jsonify({
@@ -75,6 +171,10 @@ def upload_check():
                 'check_data': saved_data
             }), 200
             
+        except ImageQualityError as e:
+            # Rejected before any OCR; the client should rescan
+            logger.info("Rejected by quality gate: %s", e.reasons)
+            return jsonify({'error': str(e), 'reasons': e.reasons, 'quality': e.quality}), 422
         except Exception as e:
             logger.error("Error processing file: %s", str(e))
             return jsonify({'error': f'Error processing file: {str(e)}'}), 500
@@ -83,28 +183,326 @@ def upload_check():
         logger.error("Unexpected error: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
+@api.route('/checks/sheet', methods=['POST'])
+def upload_sheet():
+    """Handle a scanned sheet holding several checks"""
+    try:
+        if 'file' not in request.files:
+            logger.error("No file part in request")
+            return jsonify({'error': 'No file provided'}), 400
+            
+        file = request.files['file']
+        if file.filename == '':
+            logger.error("No selected file")
+            return jsonify({'error': 'No selected file'}), 400
+            
+        if not allowed_file(file.filename):
+            logger.error("Invalid file type: %s", file.filename)
+            return jsonify({'error': f'Invalid file type. Allowed types are: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+            
+        try:
+            profile = requested_profile()
+            deadline = requested_deadline()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        try:
+            results = check_parser.parse_sheet(file.read(), capture_artifacts=artifact_store is not None,
+                                               profile=profile, deadline=deadline)
+            
+            # Save every parsed check in one transaction
+            with span('db.commit', table='checks'):
+                db = next(get_db())
+                saved = []
+                for result in results:
+                    if result['error'] is None:
+                        check = Check(**serialize_check_data(result['check_data']))
+                        db.add(check)
+                        saved.append((result, check))
+                db.commit()
+            for result, check in saved:
+                artifacts = result.pop('artifacts', None)
+                save_artifacts(check.id, artifacts, raw=artifacts.get('raw') if artifacts else None)
+                metadata = parse_metadata(result['check_data'])
+                result['check_data'] = check.to_dict()
+                result['check_data'].update(metadata)
+            for result in results:
+                result.pop('artifacts', None)
+            
+            logger.debug("Sheet processed: %d checks detected, %d saved", len(results), len(saved))
+            return jsonify({
+                'message': f'{len(saved)} of {len(results)} checks processed successfully',
+                'checks': results
+            }), 200
+            
+        except Exception as e:
+            logger.error("Error processing sheet: %s", str(e))
+            return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+            
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+def _raise(error):
+    raise error
+
+def job_items(files):
+    """(source, loader) per check image: one per image file and one per check found on a PDF page"""
+    for name, data in files:
+        if not name.lower().endswith('.pdf'):
+            yield {'file': name}, lambda data=data: (check_parser.decode_image(data), data)
+            continue
+        try:
+            pages = check_parser.image_processor.pdf_pages(data, settings.JOB_PDF_DPI)
+            for page, image in enumerate(pages, 1):
+                for number, (bbox, crop) in enumerate(check_parser.crop_checks(image), 1):
+                    yield ({'file': name, 'page': page, 'check': number, 'bbox': bbox},
+                           lambda crop=crop: (crop, None))
+        except Exception as e:
+            # An unreadable PDF fails as one item; the other files still run
+            yield {'file': name}, lambda error=e: _raise(error)
+
+def parse_and_save(loaded, profile):
+    """Parse one batch item and store it, returning the saved check"""
+    image, raw = loaded
+    artifacts = {} if artifact_store is not None else None
+    check_data = check_parser.parse_image(image, artifacts, profile)
+    metadata = parse_metadata(check_data)
+    
+    db = SessionLocal()
+    try:
+        check = Check(**serialize_check_data(check_data))
+        db.add(check)
+        db.commit()
+        saved_data = check.to_dict()
+    finally:
+        db.close()
+    
+    if raw is None and artifacts and settings.ARTIFACT_STORE_RAW:
+        raw = cv2.imencode('.png', image)[1].tobytes()
+    save_artifacts(saved_data['id'], artifacts, raw=raw)
+    saved_data.update(metadata)
+    return saved_data
+
+@api.route('/checks/batch', methods=['POST'])
+def upload_batch():
+    """Queue several check images or PDFs; progress streams from /jobs/<job_id>/events"""
+    try:
+        uploads = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+        if not uploads:
+            logger.error("No files in batch request")
+            return jsonify({'error': 'No files provided'}), 400
+        if len(uploads) > settings.JOB_MAX_FILES:
+            return jsonify({'error': f'Too many files. At most {settings.JOB_MAX_FILES} per batch'}), 400
+        
+        invalid = [file.filename for file in uploads if not allowed_file(file.filename)]
+        if invalid:
+            logger.error("Invalid file types: %s", invalid)
+            return jsonify({'error': f'Invalid file type: {", ".join(invalid)}. '
+                                     f'Allowed types are: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+        
+        try:
+            profile = requested_profile()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        files = [(secure_filename(file.filename) or file.filename, file.read()) for file in uploads]
+        job_id, log = job_store.create()
+        job_runner.submit(log, job_items(files), lambda loaded: parse_and_save(loaded, profile),
+                          [name for name, _ in files])
+        
+        logger.debug("Batch job %s queued with %d files", job_id, len(files))
+        return jsonify({
+            'job_id': job_id,
+            'files': len(files),
+            'status_url': url_for('api.get_job', job_id=job_id),
+            'events_url': url_for('api.stream_job_events', job_id=job_id)
+        }), 202
+        
+    except Exception as e:
+        logger.error("Error queuing batch: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, counts and finished items of a batch job"""
+    try:
+        log = job_store.open(job_id)
+        if log is None:
+            return jsonify({'error': 'Job not found'}), 404
+        events, _ = log.read()
+        return jsonify(dict(summarize(events, log.is_stale(settings.JOB_STALE_S)), job_id=job_id,
+                            results=[event['data'] for event in events if event['event'] == JOB_ITEM])), 200
+    except Exception as e:
+        logger.error("Error retrieving job: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Server-Sent Events of a batch job, resuming after Last-Event-ID"""
+    log = job_store.open(job_id)
+    if log is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or '0'
+    if not last_event_id.isdigit():
+        return jsonify({'error': f'Invalid Last-Event-ID: {last_event_id}'}), 400
+    
+    events = stream_events(
+        log, int(last_event_id),
+        poll_interval=settings.JOB_STREAM_POLL_S,
+        max_duration=settings.JOB_STREAM_MAX_S,
+        keepalive=settings.JOB_STREAM_KEEPALIVE_S,
+        stale_after=settings.JOB_STALE_S
+    )
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api.route('/signatures/<account_number>', methods=['POST'])
+def enroll_signature(account_number):
+    """Enroll the signature on an uploaded check as a reference for the account"""
+    try:
+        if 'file' not in request.files or request.files['file'].filename == '':
+            logger.error("No file part in request")
+            return jsonify({'error': 'No file provided'}), 400
+            
+        file = request.files['file']
+        if not allowed_file(file.filename):
+            logger.error("Invalid file type: %s", file.filename)
+            return jsonify({'error': f'Invalid file type. Allowed types are: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+            
+        if check_parser.fraud_detector.signature_index is None:
+            return jsonify({'error': 'Signature verification is not configured'}), 503
+            
+        try:
+            references = check_parser.enroll_signature(file.read(), account_number, requested_profile())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        logger.debug("Enrolled signature for account %s (%d references)", account_number, references)
+        return jsonify({
+            'message': 'Signature enrolled successfully',
+            'account_number': account_number,
+            'references': references
+        }), 200
+        
+    except Exception as e:
+        logger.error("Error enrolling signature: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/checks/export', methods=['GET'])
+def export_checks():
+    """Stream checks as CSV or Parquet with optional column projection and date range"""
+    try:
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in EXPORT_MIMETYPES:
+            return jsonify({'error': f'Invalid format. Allowed formats are: {", ".join(EXPORT_MIMETYPES)}'}), 400
+        try:
+            columns = resolve_columns(request.args.get('columns'))
+            start = parse_date_bound(request.args.get('start'))
+            end = parse_date_bound(request.args.get('end'), inclusive_end=True)
+            chunk_size = parse_chunk_size(request.args.get('chunk_size'), settings.EXPORT_CHUNK_SIZE)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        def generate():
+            # The session lives as long as the response is streaming
+            db = SessionLocal()
+            try:
+                yield from stream_export(iter_check_chunks(db, columns, start, end, chunk_size, check_archive),
+                                         fmt, columns)
+            except Exception as e:
+                logger.error("Error streaming export: %s", str(e))
+                raise
+            finally:
+                db.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype=EXPORT_MIMETYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename=checks.{fmt}'}
+        )
+    except Exception as e:
+        logger.error("Error exporting checks: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+def load_check_record(check_id):
+    """Serialized check for the cache, or None if it does not exist"""
+    with span('db.query', table='checks'):
+        db = next(get_db())
+        check = db.query(Check).filter(Check.id == check_id).first()
+    if not check and check_archive is not None and str(check_id).isdigit():
+        with span('archive.query'):
+            row = check_archive.get(int(check_id))
+        if row:
+            check = Check(**row)
+            return CachedRecord(check.to_dict(), last_modified=check.created_at, version=ARCHIVED_VERSION)
+    if not check:
+        return None
+    return CachedRecord(check.to_dict(), last_modified=check.updated_at or check.created_at,
+                        version=check.updated_at)
+
+def check_record_is_current(key, record):
+    return record.version == ARCHIVED_VERSION or check_row_is_current(key, record)
+
 @api.route('/checks/<check_id>', methods=['GET'])
 def get_check(check_id):
     """Retrieve check details"""
     try:
-        db = next(get_db())
-        check = db.query(Check).filter(Check.id == check_id).first()
+        # Cache keys match the primary keys used for invalidation ("007" -> "7")
+        key = str(int(check_id)) if check_id.isdigit() else check_id
+        record = check_cache.get_or_load(key, lambda: load_check_record(check_id),
+                                         check_record_is_current if key.isdigit() else None)
         
-        if not check:
+        if not record:
             return jsonify({'error': 'Check not found'}), 404
             
-        return jsonify(check.to_dict()), 200
+        # Pollers revalidate with If-None-Match; a match is answered from the cache
+        if request.if_none_match.contains(record.etag):
+            response = Response(status=304)
+        else:
+            response = Response(record.body, status=200, mimetype='application/json')
+        response.set_etag(record.etag)
+        response.last_modified = record.last_modified
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
         logger.error("Error retrieving check: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
 @api.route('/checks', methods=['GET'])
 def get_all_checks():
-    """Retrieve all checks"""
+    """Retrieve all checks, archived months included, optionally within a date range"""
     try:
-        db = next(get_db())
-        checks = db.query(Check).all()
-        return jsonify([check.to_dict() for check in checks]), 200
+        try:
+            start = parse_date_bound(request.args.get('start'))
+            end = parse_date_bound(request.args.get('end'), inclusive_end=True)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with span('db.query', table='checks'):
+            db = next(get_db())
+            checks = [Check(**row).to_dict()
+                      for rows in iter_check_chunks(db, list(CHECK_EXPORT_SCHEMA), start, end, archive=check_archive)
+                      for row in rows]
+        return jsonify(checks), 200
     except Exception as e:
         logger.error("Error retrieving checks: %s", str(e))
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500 
+@api.route('/checks/summary', methods=['GET'])
+def get_checks_summary():
+    """Check count, amount total and fraud count per month, archived months included"""
+    try:
+        with span('db.query', table='checks'):
+            db = next(get_db())
+            return jsonify(monthly_summary(db, check_archive)), 200
+    except Exception as e:
+        logger.error("Error summarizing checks: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Counters of this process in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,77 @@
+"""Roll closed months of the checks table into the Parquet archive.
+
+Usage:
+    python run_archive.py [--hot-months 1] [--vacuum] [--dry-run]
+
+Checks created before the first hot month are written to ARCHIVE_PATH, one
+directory of Parquet parts per month, and deleted from the checks table. The
+API, exports and summaries keep reading them from the archive. Run it monthly,
+e.g. from cron.
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, select, text
+
+from ..config.config import settings
+from ..core.archive import CheckArchive, add_months, month_start
+from ..database import SessionLocal, engine, init_db
+from ..models.check import Check
+
+logger = logging.getLogger(__name__)
+
+
+def archive_cutoff(hot_months: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the oldest month that stays in the checks table"""
+    return add_months(month_start(now or datetime.utcnow()), -(max(hot_months, 1) - 1))
+
+
+def run_archive(archive: CheckArchive, before: datetime, chunk_size: int = 5000,
+                dry_run: bool = False) -> List[dict]:
+    """Archive checks created before the cutoff and return the written parts"""
+    db = SessionLocal()
+    try:
+        if dry_run:
+            count = db.execute(select(func.count(Check.id)).where(Check.created_at < before)).scalar()
+            print(f"{count} checks created before {before:%Y-%m-%d} would be archived")
+            return []
+        return archive.roll(db, before, chunk_size)
+    finally:
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Move closed months of checks into the Parquet archive")
+    parser.add_argument('--path', default=settings.ARCHIVE_PATH, help="Archive directory")
+    parser.add_argument('--hot-months', type=int, default=settings.ARCHIVE_HOT_MONTHS,
+                        help="Months kept in the checks table, including the current one")
+    parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE,
+                        help="Rows fetched per chunk")
+    parser.add_argument('--vacuum', action='store_true', help="Reclaim the space freed in the database file")
+    parser.add_argument('--dry-run', action='store_true', help="Only count the checks that would be archived")
+    args = parser.parse_args(argv)
+
+    if not args.path:
+        parser.error("No archive path; set ARCHIVE_PATH or pass --path")
+
+    init_db()
+    archive = CheckArchive(args.path, settings.ARCHIVE_COMPRESSION, settings.ARCHIVE_ROW_GROUP_SIZE)
+    before = archive_cutoff(args.hot_months)
+    parts = run_archive(archive, before, args.chunk_size, args.dry_run)
+    for part in parts:
+        print(f"{part['month']}: {part['rows']} checks -> {part['path']}")
+    if not args.dry_run:
+        print(f"Archived {sum(part['rows'] for part in parts)} checks created before {before:%Y-%m-%d}")
+
+    if args.vacuum and not args.dry_run:
+        # VACUUM cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('VACUUM'))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
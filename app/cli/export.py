@@ -0,0 +1,72 @@
+"""Export the checks table to CSV or Parquet without loading it into memory.
+
+Usage:
+    python run_export.py --output checks.parquet [--columns id,amount_numeric] [--start 2024-01-01] [--end 2024-01-31]
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import List, Optional
+
+from ..config.config import settings
+from ..core.archive import CheckArchive
+from ..database import SessionLocal
+from ..utils.export import CHECK_EXPORT_SCHEMA, iter_check_chunks, parse_date_bound, resolve_columns
+from ..utils.writers import open_file_writer
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet'}
+
+
+def run_export(output: str, fmt: str, columns: List[str], start=None, end=None,
+               chunk_size: int = 5000, archive: Optional[CheckArchive] = None) -> int:
+    """Write matching checks (archived months included) to output chunk by chunk and return the row count"""
+    schema = {column: CHECK_EXPORT_SCHEMA[column] for column in columns}
+    writer = open_file_writer(output, fmt, schema)
+    db = SessionLocal()
+    rows = 0
+    try:
+        for chunk in iter_check_chunks(db, columns, start, end, chunk_size, archive):
+            writer.write_rows(chunk)
+            rows += len(chunk)
+            logger.debug(f"Exported {rows} rows")
+    finally:
+        db.close()
+        writer.close()
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export processed checks to CSV or Parquet")
+    parser.add_argument('-o', '--output', required=True, help="Output file (.csv or .parquet)")
+    parser.add_argument('--format', choices=sorted(set(EXPORT_FORMATS.values())),
+                        help="Output format (inferred from the output extension by default)")
+    parser.add_argument('--columns', help=f"Comma-separated columns (default: all of {', '.join(CHECK_EXPORT_SCHEMA)})")
+    parser.add_argument('--start', help="Only checks processed on or after this date (YYYY-MM-DD)")
+    parser.add_argument('--end', help="Only checks processed on or before this date (YYYY-MM-DD)")
+    parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE,
+                        help="Rows fetched and written per chunk")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or EXPORT_FORMATS.get(os.path.splitext(args.output)[1].lower())
+    if not fmt:
+        parser.error("Cannot infer output format from extension; pass --format")
+    try:
+        columns = resolve_columns(args.columns)
+        start = parse_date_bound(args.start)
+        end = parse_date_bound(args.end, inclusive_end=True)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be a positive integer")
+
+    archive = CheckArchive(settings.ARCHIVE_PATH) if settings.ARCHIVE_PATH else None
+    rows = run_export(args.output, fmt, columns, start, end, args.chunk_size, archive)
+    print(f"Exported {rows} checks to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""Bulk ingestion of check images from directories and archives.
+
+Usage:
+    python run_ingest.py SCANS_DIR [MORE_DIRS_OR_ARCHIVES ...] --output results.csv
+
+Images are parsed across a process pool and written in chunks. A checkpoint file
+records every chunk whose results have been written, so re-running the same command
+after a crash skips the work that is already done without duplicating rows.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..config.config import settings
+from ..utils.writers import CHECK_RESULT_SCHEMA, open_file_writer, output_position, truncate_output
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+OUTPUT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.db': 'sqlite', '.sqlite': 'sqlite'}
+
+# Parser owned by each worker process, created once by _init_worker
+_worker_parser = None
+_worker_profile = None
+
+
+def _is_image(name: str) -> bool:
+    return '.' in name and name.rsplit('.', 1)[1].lower() in settings.ALLOWED_EXTENSIONS
+
+
+def _is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _iter_archive(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Yield (source, bytes) for every image inside a zip or tar archive"""
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for member in sorted(archive.namelist()):
+                if not member.endswith('/') and _is_image(member):
+                    yield f"{path}::{member}", archive.read(member)
+    else:
+        # Stream mode reads members in archive order without seeking back
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and _is_image(member.name):
+                    yield f"{path}::{member.name}", archive.extractfile(member).read()
+
+
+def iter_sources(paths: Iterable[str]) -> Iterator[Tuple[str, bytes]]:
+    """Walk files, directories and archives, yielding (source, bytes) one image at a time"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield from iter_sources([os.path.join(root, name)])
+        elif _is_archive(path):
+            yield from _iter_archive(path)
+        elif _is_image(path):
+            with open(path, 'rb') as f:
+                yield path, f.read()
+        else:
+            logger.debug(f"Skipping unsupported file: {path}")
+
+
+class IngestCheckpoint:
+    """Append-only record of written chunks: their sources and the output position after them.
+
+    One JSON line per chunk. A line cut short by a crash is ignored, and so are
+    rows written after the last complete line: resuming truncates the output
+    back to that line's position before appending again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        self.position: Optional[int] = None
+        self.started = False
+        if os.path.exists(path):
+            valid = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        chunk = json.loads(line) if line.endswith(b'\n') else None
+                    except ValueError:
+                        chunk = None
+                    if chunk is None:
+                        break
+                    self.done.update(chunk['sources'])
+                    self.position = chunk['position']
+                    self.started = True
+                    valid += len(line)
+            # Drop a torn last line so the next chunk starts on a line of its own
+            if os.path.getsize(path) > valid:
+                os.truncate(path, valid)
+            logger.info(f"Resuming from checkpoint with {len(self.done)} completed sources")
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __contains__(self, source: str) -> bool:
+        return source in self.done
+
+    def mark_done(self, sources: List[str], position: Optional[int]):
+        """Record a chunk as committed; call only once its rows are durable"""
+        self._file.write(json.dumps({'sources': sources, 'position': position}) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.update(sources)
+        self.position = position
+        self.started = True
+
+    def close(self):
+        self._file.close()
+
+
+class ThroughputReporter:
+    """Print live progress and throughput to stderr"""
+
+    def __init__(self, interval: float = 5.0, stream=None):
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.processed = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def update(self, processed: int = 0, errors: int = 0, skipped: int = 0):
+        self.processed += processed
+        self.errors += errors
+        self.skipped += skipped
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rate = self.processed / elapsed
+        label = "Done" if final else "Progress"
+        self.stream.write(
+            f"{label}: {self.processed} processed, {self.errors} errors, {self.skipped} skipped "
+            f"in {elapsed:.1f}s ({rate:.1f} images/s, {rate * 3600:.0f} images/h)\n"
+        )
+        self.stream.flush()
+
+
+def _init_worker(profile: Optional[str] = None):
+    """Create the parser once per worker process"""
+    global _worker_parser, _worker_profile
+    from ..core.check_parser import CheckParser
+    from ..core.workspace import Workspace
+    _worker_parser = CheckParser(workspace=Workspace() if settings.IMAGE_WORKSPACE_ENABLED else None)
+    _worker_profile = profile
+
+
+def _to_row(source: str, check_data: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+    """Convert parser output to a flat, serializable result row"""
+    check_data = check_data or {}
+    return {
+        'source': source,
+        'amount_numeric': float(check_data.get('amount_numeric', 0.0) or 0.0),
+        'date': str(check_data.get('date')) if check_data.get('date') else None,
+        'bank_code': str(check_data.get('bank_code', '')),
+        'account_number': str(check_data.get('account_number', '')),
+        'check_number': str(check_data.get('check_number', '')),
+        'fraud_detected': bool(check_data.get('fraud_detected', False)),
+        'signature_verified': bool(check_data.get('signature_verified', False)),
+        'processing_profile': check_data.get('processing_profile'),
+        'partial': bool(check_data.get('partial', False)),
+        'error': error
+    }
+
+
+def _parse_one(source: str, image_data: bytes) -> Dict[str, Any]:
+    """Parse a single image inside a worker process"""
+    try:
+        return _to_row(source, _worker_parser.parse_check(image_data, profile=_worker_profile), None)
+    except Exception as e:
+        return _to_row(source, None, str(e))
+
+
+def _parse_with_pool(sources: Iterable[Tuple[str, bytes]], workers: int,
+                     max_in_flight: int, profile: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Parse sources across a process pool, pickling image bytes to the workers"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(profile,)) as executor:
+        in_flight = set()
+        for source, image_data in sources:
+            in_flight.add(executor.submit(_parse_one, source, image_data))
+            # Bound memory by not reading ahead of the workers
+            if len(in_flight) >= workers * max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in in_flight:
+            yield future.result()
+
+
+def _parse_with_shared_memory(sources: Iterable[Tuple[str, bytes]], workers: int,
+                              max_in_flight: int, profile: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Parse sources with the shared-memory pipeline, handing off images by descriptor"""
+    from ..core.shared_pipeline import SharedMemoryPipeline
+
+    with SharedMemoryPipeline(workers=workers, max_in_flight=workers * max_in_flight,
+                              profile=profile) as pipeline:
+        for source, check_data, error in pipeline.parse_many(sources):
+            yield _to_row(source, check_data, error)
+
+
+def run_ingest(paths: List[str], output: str, fmt: str, checkpoint_path: str,
+               workers: int = 0, chunk_size: int = 500, max_in_flight: int = 8,
+               progress_interval: float = 5.0, shared_memory: bool = False,
+               profile: Optional[str] = None) -> Dict[str, int]:
+    """Parse every image under paths and write results to output, resuming from the checkpoint"""
+    workers = workers or os.cpu_count() or 1
+    checkpoint = IngestCheckpoint(checkpoint_path)
+    resuming = checkpoint.started
+    if resuming:
+        # Rows of a chunk that was written but not checkpointed are written again below
+        truncate_output(output, fmt, checkpoint.position)
+    else:
+        # Record where this run starts, so a crash before the first chunk is undone too
+        checkpoint.mark_done([], output_position(output, fmt))
+    writer = open_file_writer(output, fmt, CHECK_RESULT_SCHEMA, append=True)
+    reporter = ThroughputReporter(progress_interval)
+    pending_rows: List[Dict[str, Any]] = []
+
+    def flush_rows():
+        if pending_rows:
+            writer.write_rows(pending_rows)
+            writer.sync()
+            checkpoint.mark_done([row['source'] for row in pending_rows], output_position(output, fmt))
+            pending_rows.clear()
+
+    def remaining_sources():
+        for source, image_data in iter_sources(paths):
+            if source in checkpoint:
+                reporter.update(skipped=1)
+                continue
+            yield source, image_data
+
+    parse = _parse_with_shared_memory if shared_memory else _parse_with_pool
+    logger.info(f"Ingesting with {workers} workers into {output} ({fmt})"
+                f"{' (resumed)' if resuming else ''}")
+    try:
+        for row in parse(remaining_sources(), workers, max_in_flight, profile):
+            pending_rows.append(row)
+            reporter.update(processed=1, errors=1 if row['error'] else 0)
+            if len(pending_rows) >= chunk_size:
+                flush_rows()
+        flush_rows()
+    finally:
+        writer.close()
+        checkpoint.close()
+        reporter.report(final=True)
+
+    return {
+        'processed': reporter.processed,
+        'errors': reporter.errors,
+        'skipped': reporter.skipped
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk-parse check images from directories and archives")
+    parser.add_argument('paths', nargs='+', help="Image files, directories or zip/tar archives")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Output file (.csv, .db/.sqlite) or directory of Parquet parts (.parquet)")
+    parser.add_argument('--format', choices=sorted(set(OUTPUT_FORMATS.values())),
+                        help="Output format (inferred from the output extension by default)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument('--workers', type=int, default=settings.INGEST_WORKERS,
+                        help="Worker processes (default: one per CPU core)")
+    parser.add_argument('--chunk-size', type=int, default=settings.INGEST_CHUNK_SIZE,
+                        help="Results written per chunk")
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        help="Seconds between throughput reports")
+    parser.add_argument('--shared-memory', action='store_true',
+                        help="Hand images to workers through shared memory instead of pickling")
+    parser.add_argument('--profile', choices=['auto'] + sorted(settings.PROCESSING_PROFILES),
+                        help="Processing profile (default: DEFAULT_PROCESSING_PROFILE)")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or OUTPUT_FORMATS.get(os.path.splitext(args.output)[1].lower())
+    if not fmt:
+        parser.error("Cannot infer output format from extension; pass --format")
+
+    summary = run_ingest(
+        args.paths, args.output, fmt,
+        checkpoint_path=args.checkpoint or f"{args.output}.checkpoint",
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        max_in_flight=settings.INGEST_MAX_IN_FLIGHT,
+        progress_interval=args.progress_interval,
+        shared_memory=args.shared_memory,
+        profile=args.profile
+    )
+    # Fail only when nothing could be parsed at all
+    all_failed = summary['processed'] > 0 and summary['errors'] == summary['processed']
+    return 1 if all_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
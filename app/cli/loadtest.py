@@ -0,0 +1,338 @@
+"""Load generator for the check upload API.
+
+Usage:
+    python run_loadtest.py --concurrency 8 --duration 60              # closed loop, in-process
+    python run_loadtest.py --rate 20 --duration 60 --url http://localhost:5000 --server-pid 1234
+
+Closed-loop mode keeps --concurrency requests in flight; fixed-rate mode starts
+requests at --rate per second regardless of how fast the server answers, and
+measures latency from the scheduled start so queueing delay is not hidden. The
+report (JSON) holds latency percentiles, throughput, error rates, a per-second
+timeline and server CPU/RSS samples.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config.config import settings
+from ..utils.synthetic import make_check_file, parse_mix
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PATH = '/checks/upload'
+
+
+class InProcessTarget:
+    """Send uploads to the Flask app through a test client per thread"""
+
+    def __init__(self, app=None):
+        if app is None:
+            from .. import create_app
+            app = create_app()
+        self.app = app
+        self.url = settings.API_V1_PREFIX + UPLOAD_PATH
+        self._local = threading.local()
+
+    def upload(self, filename: str, data: bytes) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self.app.test_client(use_cookies=False)
+            self._local.client = client
+        response = client.post(self.url, data={'file': (BytesIO(data), filename)},
+                               content_type='multipart/form-data')
+        return response.status_code
+
+
+class HTTPTarget:
+    """Send uploads to a running server with a requests session per thread"""
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        import requests
+        self._requests = requests
+        self.url = base_url.rstrip('/') + settings.API_V1_PREFIX + UPLOAD_PATH
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def upload(self, filename: str, data: bytes) -> int:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._requests.Session()
+            self._local.session = session
+        response = session.post(self.url, files={'file': (filename, data)}, timeout=self.timeout)
+        return response.status_code
+
+
+def _process_tree(pid: int) -> List[int]:
+    """pid and its descendants (for preforked servers), from /proc"""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def _read_process(pid: int) -> Tuple[float, int]:
+    """(CPU seconds, RSS bytes) of a process"""
+    with open(f'/proc/{pid}/stat') as f:
+        # Fields after the command name, which may contain spaces
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    rss_bytes = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+    return cpu_seconds, rss_bytes
+
+
+class ResourceSampler:
+    """Sample CPU and RSS of a process tree at a fixed interval (Linux /proc only)"""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self.available = os.path.exists(f'/proc/{pid}/stat')
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+
+    def _read(self) -> Tuple[float, int]:
+        cpu_total, rss_total = 0.0, 0
+        for pid in _process_tree(self.pid):
+            try:
+                cpu, rss = _read_process(pid)
+            except (OSError, IndexError, ValueError):
+                continue
+            cpu_total += cpu
+            rss_total += rss
+        return cpu_total, rss_total
+
+    def _run(self):
+        start = time.monotonic()
+        last_time, last_cpu = start, self._read()[0]
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            cpu, rss = self._read()
+            self.samples.append({
+                't': round(now - start, 3),
+                'cpu_percent': round(100.0 * (cpu - last_cpu) / max(now - last_time, 1e-9), 1),
+                'rss_mb': round(rss / (1024 * 1024), 1)
+            })
+            last_time, last_cpu = now, cpu
+
+    def start(self):
+        if self.available:
+            self._thread.start()
+        else:
+            logger.warning(f"Cannot sample resources of pid {self.pid}; /proc is not available")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class LoadTest:
+    """Drive a target with a weighted mix of synthetic checks and record every request"""
+
+    def __init__(self, target, mix: List[Tuple[str, float]], distinct: int = 4, seed: int = 0):
+        self.target = target
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.variants = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        # Payloads are encoded up front so the generator does not compete with the server
+        self.payloads = {
+            name: [make_check_file(name, seed=seed + i) for i in range(distinct)]
+            for name in self.variants
+        }
+        # (start offset, latency seconds, status or None, variant)
+        self.records: List[Tuple[float, float, Optional[int], str]] = []
+        self._start = 0.0
+
+    def _pick(self) -> Tuple[str, str, bytes]:
+        with self._lock:
+            variant = self._random.choices(self.variants, self.weights)[0]
+            filename, data = self._random.choice(self.payloads[variant])
+        return variant, filename, data
+
+    def _send(self, scheduled: Optional[float] = None):
+        variant, filename, data = self._pick()
+        started = scheduled if scheduled is not None else time.monotonic()
+        try:
+            status = self.target.upload(filename, data)
+        except Exception as e:
+            logger.debug(f"Request failed: {str(e)}")
+            status = None
+        finished = time.monotonic()
+        with self._lock:
+            self.records.append((started - self._start, finished - started, status, variant))
+
+    def warm_up(self, requests: int):
+        """Send requests that are not recorded (first-request setup, caches)"""
+        for _ in range(requests):
+            self._send()
+        self.records.clear()
+
+    def run_closed_loop(self, concurrency: int, duration: float):
+        """Each of concurrency workers sends its next request as soon as the last one returns"""
+        self._start = time.monotonic()
+        stop_at = self._start + duration
+
+        def worker():
+            while time.monotonic() < stop_at:
+                self._send()
+
+        threads = [threading.Thread(target=worker, name=f'load-{i}') for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_fixed_rate(self, rate: float, duration: float, max_concurrency: int):
+        """Start requests at a fixed arrival rate; late requests queue in the client pool"""
+        self._start = time.monotonic()
+        interval = 1.0 / rate
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            for i in range(int(rate * duration)):
+                scheduled = self._start + i * interval
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, scheduled)
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    values = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 2), 'p95': round(float(p95), 2), 'p99': round(float(p99), 2),
+            'mean': round(float(values.mean()), 2), 'max': round(float(values.max()), 2)}
+
+
+def build_report(records: List[Tuple[float, float, Optional[int], str]], elapsed: float,
+                 samples: List[Dict[str, float]], config: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize request records into the machine-readable report"""
+    def is_error(status):
+        return status is None or status >= 400
+
+    errors = sum(1 for record in records if is_error(record[2]))
+    status_codes: Dict[str, int] = {}
+    for _, _, status, _ in records:
+        key = str(status) if status is not None else 'connection_error'
+        status_codes[key] = status_codes.get(key, 0) + 1
+
+    variants = {}
+    for variant in sorted({record[3] for record in records}):
+        subset = [record for record in records if record[3] == variant]
+        variants[variant] = {
+            'requests': len(subset),
+            'errors': sum(1 for record in subset if is_error(record[2])),
+            'latency_ms': _latency_summary([record[1] for record in subset])
+        }
+
+    timeline = []
+    for second in range(int(np.ceil(elapsed)) if records else 0):
+        window = [record for record in records if second <= record[0] < second + 1]
+        timeline.append({
+            't': second,
+            'requests': len(window),
+            'errors': sum(1 for record in window if is_error(record[2])),
+            'latency_ms': _latency_summary([record[1] for record in window])
+        })
+
+    return {
+        'config': config,
+        'requests': len(records),
+        'errors': errors,
+        'error_rate': round(errors / len(records), 4) if records else 0.0,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(records) / elapsed, 2) if elapsed > 0 else 0.0,
+        'latency_ms': _latency_summary([record[1] for record in records]),
+        'status_codes': status_codes,
+        'variants': variants,
+        'timeline': timeline,
+        'resources': samples
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test the check upload API")
+    parser.add_argument('--url', help="Base URL of a running server (default: drive the app in-process)")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="Closed-loop clients, or the client pool size with --rate")
+    parser.add_argument('--rate', type=float, help="Fixed arrival rate in requests per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument('--warmup', type=int, default=2, help="Requests sent before measuring")
+    parser.add_argument('--mix', default='clean=3,noisy=1',
+                        help="Weighted synthetic check variants (small, clean, noisy, large)")
+    parser.add_argument('--distinct', type=int, default=4, help="Distinct images per variant")
+    parser.add_argument('--server-pid', type=int,
+                        help="Server process to sample for CPU/RSS (default: this process when in-process)")
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+
+    target = HTTPTarget(args.url) if args.url else InProcessTarget()
+    load = LoadTest(target, mix, args.distinct, args.seed)
+    load.warm_up(args.warmup)
+
+    pid = args.server_pid or (None if args.url else os.getpid())
+    sampler = ResourceSampler(pid, args.sample_interval) if pid else None
+    if sampler:
+        sampler.start()
+
+    started = time.monotonic()
+    if args.rate:
+        print(f"Sending {args.rate:g} req/s for {args.duration:g}s", file=sys.stderr)
+        load.run_fixed_rate(args.rate, args.duration, args.concurrency)
+    else:
+        print(f"Running {args.concurrency} closed-loop clients for {args.duration:g}s", file=sys.stderr)
+        load.run_closed_loop(args.concurrency, args.duration)
+    elapsed = time.monotonic() - started
+    if sampler:
+        sampler.stop()
+
+    report = build_report(load.records, elapsed, sampler.samples if sampler else [], {
+        'target': args.url or 'in-process',
+        'mode': 'fixed-rate' if args.rate else 'closed-loop',
+        'rate': args.rate,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'mix': dict(mix)
+    })
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    latency = report['latency_ms']
+    print(f"{report['requests']} requests, {report['throughput_rps']} req/s, "
+          f"p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, "
+          f"error rate {report['error_rate']:.2%}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
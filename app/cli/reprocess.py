@@ -0,0 +1,125 @@
+"""Rerun changed pipeline stages on stored check artifacts.
+
+Usage:
+    python run_reprocess.py [--ids 12,15] [--limit 1000] [--dry-run]
+
+Each stored check's manifest is compared with the current stage versions and
+parameters (for example after tuning OCREngine settings). Only stale stages run,
+starting from the stored region crops, and the updated results are written back
+to the checks table and the artifact store. Partial results (a field timed out
+or an optional stage was skipped) are stored without the unfinished stages, so
+they are completed here. Checks already moved to the Parquet archive are skipped
+and counted as archived.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import Dict, List, Optional
+
+from ..config.config import settings
+from ..core.artifacts import STAGE_VERSIONS, ArtifactStore, stale_stages
+from ..core.check_parser import CheckParser
+from ..core.workspace import Workspace
+from ..database import SessionLocal
+from ..models.check import Check
+
+logger = logging.getLogger(__name__)
+
+
+def run_reprocess(store: ArtifactStore, parser: CheckParser, ids: Optional[List[str]] = None,
+                  limit: Optional[int] = None, dry_run: bool = False, commit_every: int = 100) -> Dict[str, int]:
+    """Reprocess stored checks and return counts per stage and outcome"""
+    counts = {'checks': 0, 'updated': 0, 'unchanged': 0, 'archived': 0, 'errors': 0}
+    counts.update({stage: 0 for stage in STAGE_VERSIONS})
+    # Current stage records per processing profile
+    current: Dict[Optional[str], Dict] = {}
+    db = None if dry_run else SessionLocal()
+    pending = 0
+
+    try:
+        for check_id in (ids if ids is not None else store.ids()):
+            if limit is not None and counts['checks'] >= limit:
+                break
+            counts['checks'] += 1
+            try:
+                manifest = store.load_manifest(check_id)
+                profile = manifest.get('processing_profile')
+                if profile not in current:
+                    current[profile] = parser.stage_records(profile)
+                stale = stale_stages(manifest, current[profile])
+                if not stale:
+                    counts['unchanged'] += 1
+                    continue
+                if dry_run:
+                    for stage in stale:
+                        counts[stage] += 1
+                    continue
+
+                # Checks rolled into the Parquet archive are immutable; keep their
+                # manifest stale rather than record results no row reflects
+                check = db.query(Check).filter(Check.id == int(check_id)).first()
+                if check is None:
+                    counts['archived'] += 1
+                    continue
+
+                raw = store.load_raw(check_id) if 'preprocess' in stale else None
+                check_data, arrays, manifest, rerun = parser.reprocess(manifest, store.load_arrays(check_id), raw)
+                for stage in rerun:
+                    counts[stage] += 1
+                if not rerun:
+                    counts['unchanged'] += 1
+                    continue
+
+                for key, value in check_data.items():
+                    if key == 'field_status':
+                        value = json.dumps(value)
+                    if key in Check.__table__.columns:
+                        setattr(check, key, value)
+                pending += 1
+                store.save(check_id, arrays, manifest)
+                counts['updated'] += 1
+
+                if pending >= commit_every:
+                    db.commit()
+                    pending = 0
+            except Exception as e:
+                logger.error(f"Error reprocessing check {check_id}: {str(e)}")
+                counts['errors'] += 1
+        if db is not None:
+            db.commit()
+    finally:
+        if db is not None:
+            db.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Rerun changed pipeline stages on stored check artifacts")
+    parser.add_argument('--store', default=settings.ARTIFACT_STORE_PATH,
+                        help="Artifact store directory (default: ARTIFACT_STORE_PATH)")
+    parser.add_argument('--ids', help="Comma-separated check ids (default: every stored check)")
+    parser.add_argument('--limit', type=int, help="Process at most this many checks")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which stages are stale")
+    args = parser.parse_args(argv)
+
+    if not args.store:
+        parser.error("No artifact store configured; set ARTIFACT_STORE_PATH or pass --store")
+
+    store = ArtifactStore(args.store)
+    ids = [check_id.strip() for check_id in args.ids.split(',') if check_id.strip()] if args.ids else None
+
+    started = time.monotonic()
+    counts = run_reprocess(store, CheckParser(workspace=Workspace()), ids, args.limit, args.dry_run)
+    elapsed = time.monotonic() - started
+
+    stages = ', '.join(f"{stage} {counts[stage]}" for stage in STAGE_VERSIONS)
+    verb = "would rerun" if args.dry_run else "reran"
+    print(f"{counts['checks']} checks in {elapsed:.1f}s: {counts['unchanged']} up to date, "
+          f"{verb} {stages}; {counts['archived']} archived (skipped), {counts['errors']} errors")
+    return 1 if counts['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 class Settings(BaseSettings):
     # Application Settings
@@ -9,29 +9,142 @@ class Settings(BaseSettings):
     API_V1_PREFIX: str = "/api/v1"
     API_URL: str = "http://localhost:5000"
     
+    # Production server (run_server.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 5000
+    SERVER_WORKERS: int = 0  # 0 = one worker process per CPU core
+    SERVER_THREADS: int = 4  # Request threads per worker
+    SERVER_MAX_REQUESTS: int = 1000  # Recycle a worker after this many requests (0 = never)
+    SERVER_MAX_REQUESTS_JITTER: int = 100
+    SERVER_WARMUP: bool = True  # Parse a synthetic check in each worker before serving
+    
+    # Tracing
+    TRACING_ENABLED: bool = True
+    TRACE_SAMPLE_RATE: float = 0.1  # Fraction of requests whose spans are exported
+    TRACE_EXPORTER: str = "ndjson"  # 'ndjson', 'otlp' or 'none'
+    TRACE_FILE: str = "logs/traces.ndjson"
+    OTLP_ENDPOINT: str = "http://localhost:4318"
+    
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./checks.db")
+    CHECK_CACHE_SIZE: int = 10000  # Checks kept by the single-check lookup cache (0 disables it)
+    CHECK_CACHE_REVALIDATE_S: float = 2.0  # Cached checks are re-read from the row this often (0 = every hit)
     
     # OCR Settings
     TESSERACT_CMD: str = os.getenv("TESSERACT_CMD", "tesseract")
     SUPPORTED_LANGUAGES: List[str] = ["eng", "fra", "spa"]
+    OCR_LOCALE: str = "eng"  # Amount/date conventions: "eng" (1,234.56, month first), "fra" or "spa" (1.234,56, day first)
+    # Backend per field: 'tesseract' or 'onnx_digits' (fields not listed use Tesseract)
+    OCR_BACKENDS: Dict[str, str] = {"amount": "tesseract", "date": "tesseract", "micr": "tesseract"}
+    OCR_FALLBACK_TO_TESSERACT: bool = True  # Retry with Tesseract when another backend's text does not parse
+    OCR_ONNX_MODEL_PATH: str = "models/digits.onnx"
+    OCR_ONNX_CHARSET: str = "0123456789$.,/-"  # Model class i + 1 is character i
+    OCR_ONNX_INPUT_HEIGHT: int = 32
+    OCR_ONNX_THREADS: int = 1
+    OCR_BATCH_SIZE: int = 32  # Field crops per model call, gathered across concurrent checks
+    OCR_BATCH_WAIT_MS: float = 2.0  # Longest a crop waits for others to join its batch
     
     # Image Processing
     MAX_IMAGE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: List[str] = ["jpg", "jpeg", "png", "pdf"]
+    IMAGE_WORKSPACE_ENABLED: bool = True  # Reuse per-thread image buffers between checks
+    
+    # Processing profiles: which preprocessing ('image') and OCR crop ('ocr') steps run
+    PROCESSING_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+        "fast": {
+            "image": {"threshold": "otsu", "denoise": False, "deskew": False},
+            "ocr": {"open": False}
+        },
+        "balanced": {
+            "image": {"threshold": "adaptive", "denoise": True, "denoise_search_window": 11,
+                      "deskew": True, "interpolation": "linear"},
+            "ocr": {"open": True}
+        },
+        "accurate": {
+            "image": {"threshold": "adaptive", "denoise": True, "denoise_search_window": 21,
+                      "deskew": True, "interpolation": "cubic"},
+            "ocr": {"open": True}
+        }
+    }
+    DEFAULT_PROCESSING_PROFILE: str = "auto"  # A profile name, or 'auto' to pick from image quality
+    PROFILE_THUMBNAIL_MAX_DIM: int = 512  # Thumbnail for quality estimates (profile choice and quality gate)
+    AUTO_PROFILE_FAST_MAX_NOISE: float = 1.5  # Estimated noise sigma (gray levels)
+    AUTO_PROFILE_FAST_MAX_SKEW: float = 0.5  # Degrees
+    AUTO_PROFILE_FAST_MIN_SHARPNESS: float = 500.0  # Variance of the Laplacian on the thumbnail
+    AUTO_PROFILE_BALANCED_MAX_NOISE: float = 4.0
+    
+    # Quality gate: scans failing any check are rejected before preprocessing and OCR
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_MIN_SHARPNESS: float = 100.0  # Variance of the Laplacian on the thumbnail
+    QUALITY_MIN_BRIGHTNESS: float = 60.0  # Mean gray level
+    QUALITY_MAX_BRIGHTNESS: float = 252.0
+    QUALITY_MIN_CONTRAST: float = 40.0  # Gray levels between paper and ink
+    QUALITY_MIN_MICR_INK: float = 0.01  # Fraction of ink pixels in the MICR band
+    QUALITY_ASPECT_RANGE: Tuple[float, float] = (1.6, 3.2)  # Width / height
+    
+    # Time budgets: a parse returns partial results instead of running past its deadline
+    PARSE_DEADLINE_S: float = 15.0  # Per check; 0 disables the deadline
+    PARSE_DEADLINE_MAX_S: float = 60.0  # Upper bound for budgets requested with X-Request-Timeout-Ms
+    DEADLINE_OCR_RESERVE_S: float = 3.0  # Denoise/deskew are skipped unless this is left after their estimated cost
+    PREPROCESS_DENOISE_S_PER_MPX: float = 1.0  # Estimated denoising time per megapixel (21px search window, one core)
+    PREPROCESS_DESKEW_S_PER_MPX: float = 0.1  # Estimated deskew time per megapixel
+    DEADLINE_OPTIONAL_STAGE_RESERVE_S: float = 0.5  # Fraud/signature are skipped when less than this is left
+    OCR_TESSERACT_TIMEOUT_S: float = 10.0  # Per Tesseract call; 0 means no limit
+    
+    # Batch jobs with progress streamed as Server-Sent Events
+    JOB_STORE_PATH: str = "data/jobs"  # One event log per job, readable by every server worker
+    JOB_WORKERS: int = 2  # Jobs processed concurrently per server process
+    JOB_MAX_FILES: int = 500
+    JOB_PDF_DPI: int = 200
+    JOB_RETENTION_S: float = 86400.0
+    JOB_STREAM_MAX_S: float = 30.0  # A stream then ends and the client resumes with Last-Event-ID
+    JOB_STREAM_POLL_S: float = 0.25
+    JOB_STREAM_KEEPALIVE_S: float = 15.0
+    JOB_HEARTBEAT_S: float = 30.0  # The owning process touches logs of its queued and running jobs
+    JOB_STALE_S: float = 600.0  # A job without events or heartbeats for this long is reported as abandoned
+    
+    # Image validation rules: minimum fraction of ink pixels in a region
+    VALIDATION_MIN_SIGNATURE_INK: float = 0.005
+    VALIDATION_MIN_MICR_INK: float = 0.005
+    
+    # Multi-check sheets
+    SHEET_DETECTION_MAX_DIM: int = 1200  # Detection runs on a copy downscaled to this size
+    SHEET_MIN_CHECK_AREA: float = 0.05  # Minimum check area as a fraction of the sheet
+    SHEET_CHECK_ASPECT_RANGE: Tuple[float, float] = (1.6, 3.5)  # Width / height
+    SHEET_MAX_WORKERS: int = 4
     
     # AI Model Settings
     MODEL_PATH: str = "models/fraud_detection_model.h5"
     CONFIDENCE_THRESHOLD: float = 0.7
+    SIGNATURE_INDEX_PATH: Optional[str] = "models/signatures"  # Reference signatures per account
     
     # Validation Settings
     MAX_CHECK_AGE_DAYS: int = 180
     MAX_AMOUNT: float = 10000000.0
+
+    # Bulk Ingestion
+    INGEST_WORKERS: int = 0  # 0 = one worker per CPU core
+    INGEST_CHUNK_SIZE: int = 500
+    INGEST_MAX_IN_FLIGHT: int = 8  # Images queued per worker before reading more input
+    SHARED_MEMORY_BUFFER_MB: int = 512  # Ring buffer for the shared-memory pipeline
     
+    # Artifacts for incremental reprocessing (run_reprocess.py)
+    ARTIFACT_STORE_PATH: Optional[str] = None  # e.g. "data/artifacts"; None disables the store
+    ARTIFACT_STORE_RAW: bool = False  # Also keep the uploaded image, so preprocessing can be rerun
+    
+    # Export
+    EXPORT_CHUNK_SIZE: int = 5000  # Rows fetched and written per chunk / Parquet row group
+    
+    # Archive of closed months (run_archive.py), read together with the checks table
+    ARCHIVE_PATH: Optional[str] = "data/archive"  # None disables the archive
+    ARCHIVE_HOT_MONTHS: int = 1  # Months kept in the checks table, including the current one
+    ARCHIVE_COMPRESSION: str = "zstd"
+    ARCHIVE_ROW_GROUP_SIZE: int = 10000
+
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,253 @@
+"""Month-partitioned Parquet archive of the checks table.
+
+Closed months are rolled out of the hot SQLite table into compact columnar
+files under ARCHIVE_PATH, one directory per month:
+
+    manifest.json
+    2024-01/part-00000.parquet
+    2024-02/part-00000.parquet
+
+Parts are sorted by id and zstd-compressed, with dictionary-encoded strings and
+per-row-group min/max statistics, so a lookup by id or a date-range scan only
+decodes the row groups it needs. The manifest lists every part with its id and
+created_at ranges and a few totals, which lets readers skip whole partitions
+and answer monthly summaries without opening the files.
+
+A roll writes the part, then the manifest, then deletes the archived rows from
+the hot table. If it is interrupted after the manifest was written, readers
+ignore hot rows the manifest already covers and the next roll deletes them.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import and_, func, not_, select
+
+from ..models.check import Check
+from ..utils.export import CHECK_EXPORT_SCHEMA
+from ..utils.writers import ParquetRowWriter
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def next_month(moment: datetime) -> datetime:
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+class CheckArchive:
+    """Archived checks: Parquet parts per month and the manifest describing them"""
+
+    def __init__(self, path: str, compression: str = 'zstd', row_group_size: int = 10000):
+        self.path = path
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self._lock = threading.Lock()
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._manifest_mtime: Optional[float] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, 'manifest.json')
+
+    def manifest(self) -> Dict[str, Any]:
+        """The manifest, reread only when another process has rewritten it"""
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except FileNotFoundError:
+            return {'version': MANIFEST_VERSION, 'partitions': []}
+        with self._lock:
+            if self._manifest is None or mtime != self._manifest_mtime:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+            return self._manifest
+
+    def partitions(self) -> List[Dict[str, Any]]:
+        """Archived parts in id order"""
+        return sorted(self.manifest()['partitions'], key=lambda part: part['min_id'])
+
+    def _save_manifest(self, partitions: List[Dict[str, Any]]):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'partitions': partitions}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        # Two saves within one mtime tick would otherwise leave the cached copy stale
+        with self._lock:
+            self._manifest = {'version': MANIFEST_VERSION, 'partitions': partitions}
+            self._manifest_mtime = os.path.getmtime(self.manifest_path)
+
+    def archived_months(self) -> Dict[str, int]:
+        """Highest archived id per month ('YYYY-MM')"""
+        months: Dict[str, int] = {}
+        for part in self.partitions():
+            months[part['month']] = max(months.get(part['month'], 0), part['max_id'])
+        return months
+
+    def hot_filter(self):
+        """Condition excluding hot rows the archive already holds, or None.
+
+        Such rows only exist between the manifest update and the delete of a roll.
+        """
+        conditions = []
+        for month, max_id in self.archived_months().items():
+            start = datetime.strptime(month, '%Y-%m')
+            conditions.append(not_(and_(Check.created_at >= start, Check.created_at < next_month(start),
+                                        Check.id <= max_id)))
+        return and_(*conditions) if conditions else None
+
+    # Rolling
+
+    def roll(self, db, before: datetime, chunk_size: int = 5000) -> List[Dict[str, Any]]:
+        """Move checks created before a month boundary into the archive; returns the new parts.
+
+        The newest check always stays in the hot table: SQLite reuses the highest
+        rowid once it is deleted, and a reused id would collide with the archive.
+        """
+        self.delete_archived(db)
+        newest = db.execute(select(func.max(Check.id))).scalar()
+        if newest is None:
+            return []
+
+        written = []
+        end = None
+        while True:
+            statement = select(func.min(Check.created_at)).where(Check.created_at < before, Check.id < newest)
+            if end is not None:
+                statement = statement.where(Check.created_at >= end)
+            oldest = db.execute(statement).scalar()
+            if oldest is None:
+                break
+            start = month_start(oldest)
+            end = min(next_month(start), before)
+            part = self._write_part(db, start, end, newest, chunk_size)
+            if part is None:
+                break
+            written.append(part)
+            self._save_manifest(self.manifest()['partitions'] + [part])
+            self.delete_archived(db)
+            logger.info(f"Archived {part['rows']} checks of {part['month']} to {part['path']}")
+        return written
+
+    def _write_part(self, db, start: datetime, end: datetime, newest: int,
+                    chunk_size: int) -> Optional[Dict[str, Any]]:
+        month = start.strftime('%Y-%m')
+        directory = os.path.join(self.path, month)
+        os.makedirs(directory, exist_ok=True)
+        existing = [name for name in os.listdir(directory) if name.endswith('.parquet')]
+        relative = f'{month}/part-{len(existing):05d}.parquet'
+        path = os.path.join(self.path, relative)
+        tmp_path = path + '.tmp'
+
+        statement = select(*[getattr(Check, column) for column in CHECK_EXPORT_SCHEMA]).where(
+            Check.created_at >= start, Check.created_at < end, Check.id < newest
+        ).order_by(Check.id).execution_options(yield_per=chunk_size)
+
+        stats = {'rows': 0, 'min_id': None, 'max_id': None, 'min_created_at': None, 'max_created_at': None,
+                 'amount_total': 0.0, 'fraud_detected': 0}
+        writer = ParquetRowWriter(tmp_path, CHECK_EXPORT_SCHEMA, compression=self.compression)
+        pending: List[Dict[str, Any]] = []
+        try:
+            for partition in db.execute(statement).partitions():
+                for row in partition:
+                    row = dict(row._mapping)
+                    stats['rows'] += 1
+                    stats['min_id'] = row['id'] if stats['min_id'] is None else stats['min_id']
+                    stats['max_id'] = row['id']
+                    created = row['created_at']
+                    if stats['min_created_at'] is None or created < stats['min_created_at']:
+                        stats['min_created_at'] = created
+                    if stats['max_created_at'] is None or created > stats['max_created_at']:
+                        stats['max_created_at'] = created
+                    stats['amount_total'] += row['amount_numeric'] or 0.0
+                    stats['fraud_detected'] += 1 if row['fraud_detected'] else 0
+                    pending.append(row)
+                    if len(pending) >= self.row_group_size:
+                        writer.write_rows(pending)
+                        pending = []
+            writer.write_rows(pending)
+        finally:
+            writer.close()
+
+        if stats['rows'] == 0:
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+        stats['min_created_at'] = stats['min_created_at'].isoformat()
+        stats['max_created_at'] = stats['max_created_at'].isoformat()
+        stats['amount_total'] = round(stats['amount_total'], 2)
+        return {'month': month, 'path': relative, **stats}
+
+    def delete_archived(self, db) -> int:
+        """Delete hot rows that the manifest shows are archived"""
+        deleted = 0
+        for month, max_id in self.archived_months().items():
+            start = datetime.strptime(month, '%Y-%m')
+            deleted += db.query(Check).filter(
+                Check.created_at >= start, Check.created_at < next_month(start), Check.id <= max_id
+            ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    # Reading
+
+    def iter_chunks(self, columns: List[str], start: Optional[datetime] = None,
+                    end: Optional[datetime] = None, chunk_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+        """Archived checks as lists of row dicts, in id order, within [start, end)"""
+        for part in self.partitions():
+            first = datetime.fromisoformat(part['min_created_at'])
+            last = datetime.fromisoformat(part['max_created_at'])
+            if (start is not None and last < start) or (end is not None and first >= end):
+                continue
+            # Whole part inside the range: no row filter needed
+            needs_filter = (start is not None and first < start) or (end is not None and last >= end)
+            yield from self._read_part(part['path'], columns, start if needs_filter else None,
+                                       end if needs_filter else None, chunk_size)
+
+    def _read_part(self, relative: str, columns: List[str], start: Optional[datetime],
+                   end: Optional[datetime], chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(os.path.join(self.path, relative))
+        # Parts written before a column was added to the schema read it as null
+        available = set(parquet_file.schema_arrow.names)
+        present = [column for column in columns if column in available]
+        missing = [column for column in columns if column not in available]
+        read_columns = list(present)
+        if (start is not None or end is not None) and 'created_at' not in read_columns:
+            read_columns.append('created_at')
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=read_columns):
+            if start is not None:
+                batch = batch.filter(pc.greater_equal(batch.column('created_at'), start))
+            if end is not None:
+                batch = batch.filter(pc.less(batch.column('created_at'), end))
+            if batch.num_rows:
+                rows = batch.select(present).to_pylist()
+                if missing:
+                    rows = [{column: row.get(column) for column in columns} for row in rows]
+                yield rows
+
+    def get(self, check_id: int) -> Optional[Dict[str, Any]]:
+        """One archived check, reading only the row groups whose id range contains it"""
+        import pyarrow.parquet as pq
+
+        for part in self.partitions():
+            if part['min_id'] <= check_id <= part['max_id']:
+                table = pq.read_table(os.path.join(self.path, part['path']), filters=[('id', '==', check_id)])
+                if table.num_rows:
+                    return table.to_pylist()[0]
+        return None
@@ -0,0 +1,139 @@
+"""Persisted intermediate results of the check pipeline.
+
+For every check the store keeps the preprocessed region crops (compressed npz),
+optionally the raw upload, and a manifest recording which version and parameters
+of each stage produced the stored results. Reprocessing compares the manifest
+with the current stage fingerprints and reruns only the stages that changed,
+starting from the stored crops instead of the raw image.
+"""
+import hashlib
+import io
+import json
+import os
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump a stage's version when its code changes in a way that alters its output;
+# parameter changes are picked up from the fingerprint automatically
+STAGE_VERSIONS = {
+    'preprocess': 1,
+    'ocr': 1,
+    'fraud': 1,
+    'signature': 1
+}
+
+# Stages whose inputs are produced by other stages; a rerun stage forces its dependents
+STAGE_DEPENDENCIES = {
+    'preprocess': [],
+    'ocr': ['preprocess'],
+    'fraud': [],
+    'signature': ['preprocess', 'ocr']
+}
+
+
+def stage_record(stage: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Version, parameters and fingerprint of a stage as recorded in manifests"""
+    version = STAGE_VERSIONS[stage]
+    encoded = json.dumps({'version': version, 'params': params}, sort_keys=True, default=str)
+    return {
+        'version': version,
+        'params': params,
+        'fingerprint': hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+    }
+
+
+def record_stage(stages: Dict[str, Dict[str, Any]], stage: str, current: Dict[str, Dict[str, Any]]):
+    """Record that a stage ran with its current settings on its inputs' recorded outputs"""
+    stages[stage] = dict(current[stage], inputs={
+        dependency: stages.get(dependency, {}).get('fingerprint')
+        for dependency in STAGE_DEPENDENCIES[stage]
+    })
+
+
+def is_stale(stage: str, stages: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]) -> bool:
+    """A stage is stale if its own settings changed or an input was produced again since it ran"""
+    recorded = stages.get(stage)
+    if not recorded or recorded.get('fingerprint') != current[stage]['fingerprint']:
+        return True
+    return any(
+        recorded.get('inputs', {}).get(dependency) != stages.get(dependency, {}).get('fingerprint')
+        for dependency in STAGE_DEPENDENCIES[stage]
+    )
+
+
+def stale_stages(manifest: Dict[str, Any], current: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Stages a reprocessing run would execute, in pipeline order"""
+    stages = {stage: dict(record) for stage, record in manifest.get('stages', {}).items()}
+    stale = []
+    for stage in STAGE_VERSIONS:
+        if is_stale(stage, stages, current):
+            stale.append(stage)
+            record_stage(stages, stage, current)
+    return stale
+
+
+class ArtifactStore:
+    """Directory of per-check artifacts: <path>/<check_id>/{manifest.json, arrays.npz, raw}"""
+
+    MANIFEST_FILE = 'manifest.json'
+    ARRAYS_FILE = 'arrays.npz'
+    RAW_FILE = 'raw'
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def _dir(self, check_id) -> str:
+        return os.path.join(self.path, str(check_id))
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def __contains__(self, check_id) -> bool:
+        return os.path.exists(os.path.join(self._dir(check_id), self.MANIFEST_FILE))
+
+    def ids(self) -> Iterator[str]:
+        """Ids of all stored checks, in numeric order where possible"""
+        names = [name for name in os.listdir(self.path) if name in self]
+        return iter(sorted(names, key=lambda name: (not name.isdigit(), int(name) if name.isdigit() else 0, name)))
+
+    def save(self, check_id, arrays: Optional[Dict[str, np.ndarray]], manifest: Dict[str, Any],
+             raw: Optional[bytes] = None):
+        """Store arrays (None keeps the stored ones), the manifest and optionally the raw bytes"""
+        directory = self._dir(check_id)
+        os.makedirs(directory, exist_ok=True)
+        if arrays is not None:
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **arrays)
+            self._write_atomic(os.path.join(directory, self.ARRAYS_FILE), buffer.getvalue())
+        if raw is not None:
+            self._write_atomic(os.path.join(directory, self.RAW_FILE), raw)
+        manifest = dict(manifest, check_id=str(check_id), updated_at=datetime.utcnow().isoformat())
+        # The manifest goes last, so a stored manifest always describes complete arrays
+        self._write_atomic(os.path.join(directory, self.MANIFEST_FILE),
+                           json.dumps(manifest, indent=2, default=str).encode('utf-8'))
+
+    def load_manifest(self, check_id) -> Dict[str, Any]:
+        with open(os.path.join(self._dir(check_id), self.MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load_arrays(self, check_id) -> Dict[str, np.ndarray]:
+        with np.load(os.path.join(self._dir(check_id), self.ARRAYS_FILE)) as data:
+            return {name: data[name] for name in data.files}
+
+    def load_raw(self, check_id) -> Optional[bytes]:
+        path = os.path.join(self._dir(check_id), self.RAW_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
@@ -1,75 +1,439 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import numpy as np
 import cv2
 from PIL import Image
 import io
 import logging
-from .image_processor import ImageProcessor
+from .image_processor import ImageProcessor, ImageQualityError, REGION_LAYOUT
 from .ocr_engine import OCREngine
-from .fraud_detector import FraudDetector
+from .features import CheckFeatures
+from .fraud_detector import FraudDetector, FRAUD_INPUT_SIZE
+from .signature_index import (FEATURE_DIM, MATCH_DISTANCE_RANGE, MATCH_SPREAD_MARGIN, SIGNATURE_MATCH_DISTANCE,
+                              SIGNATURE_VERIFIED_THRESHOLD, SignatureIndex, extract_signature_features)
+from .artifacts import STAGE_DEPENDENCIES, STAGE_VERSIONS, is_stale, record_stage, stage_record
+from .deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope, default_deadline
+from .workspace import Workspace
+from ..config.config import settings
+from ..utils.metrics import metrics
+from ..utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# Per-field status codes returned with every parse
+FIELD_OK = 'ok'
+FIELD_NOT_FOUND = 'not_found'  # Recognized, but nothing parseable was read
+FIELD_TIMEOUT = 'timeout'  # The time budget ran out while reading the field
+FIELD_SKIPPED = 'skipped'  # Optional stage skipped to stay within the time budget
+
+# Fields read by the OCR stage
+OCR_FIELDS = ('amount', 'date', 'micr')
+
+# Pipeline stage producing each field or stage status
+STATUS_STAGES = {'amount': 'ocr', 'date': 'ocr', 'micr': 'ocr', 'fraud': 'fraud', 'signature': 'signature'}
+
+def incomplete_stages(status: Dict[str, str]) -> Tuple[str, ...]:
+    """Stages that timed out or were skipped, according to a parse's field status"""
+    return tuple(sorted({STATUS_STAGES[name] for name, code in status.items()
+                         if code in (FIELD_TIMEOUT, FIELD_SKIPPED)}))
+
+def select_profile(quality: Dict[str, float]) -> str:
+    """Processing profile for an image quality estimate (see ImageProcessor.estimate_quality)"""
+    if (quality['noise'] <= settings.AUTO_PROFILE_FAST_MAX_NOISE
+            and abs(quality['skew']) <= settings.AUTO_PROFILE_FAST_MAX_SKEW
+            and quality['sharpness'] >= settings.AUTO_PROFILE_FAST_MIN_SHARPNESS):
+        return 'fast'
+    if quality['noise'] <= settings.AUTO_PROFILE_BALANCED_MAX_NOISE:
+        return 'balanced'
+    return 'accurate'
+
 class CheckParser:
-    def __init__(self):
-        self.image_processor = ImageProcessor()
-        self.ocr_engine = OCREngine()
-        self.fraud_detector = FraudDetector()
+    def __init__(self, workspace=None):
+        # A Workspace (single thread) or ThreadLocalWorkspace lets the image and OCR
+        # steps reuse their output buffers instead of allocating on every check
+        self.workspace = workspace
+        self.image_processor = ImageProcessor(workspace=workspace)
+        self.ocr_engine = OCREngine(workspace=workspace)
+        self.fraud_detector = FraudDetector(
+            signature_index=SignatureIndex(settings.SIGNATURE_INDEX_PATH) if settings.SIGNATURE_INDEX_PATH else None
+        )
+        
+    def decode_image(self, image_data: bytes) -> np.ndarray:
+        """Decode raw image bytes to a BGR array"""
+        # Convert bytes to numpy array
+        nparr = np.frombuffer(image_data, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        if image is None:
+            raise ValueError("Failed to decode image")
+        return image
         
-    def parse_check(self, image_data: bytes) -> Dict[str, Any]:
+    @staticmethod
+    def build_result(amount: float, date_str: Optional[str], micr_data: Dict[str, str],
+                     is_fraudulent: bool, signature_analysis: Dict[str, float]) -> Dict[str, Any]:
+        """Assemble the check data returned by the parser"""
+        return {
+            'amount_numeric': amount,
+            'date': date_str,
+            'bank_code': micr_data['bank_code'],
+            'account_number': micr_data['account_number'],
+            'check_number': micr_data['check_number'],
+            'fraud_detected': is_fraudulent,
+            'signature_verified': signature_analysis['confidence'] > SIGNATURE_VERIFIED_THRESHOLD
+        }
+        
+    def check_quality(self, image: np.ndarray) -> Dict[str, float]:
+        """Quality gate: raise ImageQualityError for unusable scans, else return the measurements"""
+        with span('quality_gate') as current:
+            assessment = self.image_processor.assess_quality(image)
+            current.set_attributes(passed=assessment['passed'], **assessment['quality'])
+        if assessment['passed']:
+            metrics.increment('quality_gate_total', decision='accepted')
+            return assessment['quality']
+        metrics.increment('quality_gate_total', decision='rejected')
+        for reason in assessment['reasons']:
+            metrics.increment('quality_gate_rejections_total', reason=reason['code'])
+        raise ImageQualityError(assessment['reasons'], assessment['quality'])
+        
+    def resolve_profile(self, profile: Optional[str], image: np.ndarray,
+                        quality: Optional[Dict[str, float]] = None) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+        """Name and options of the processing profile for an image.
+        
+        None means DEFAULT_PROCESSING_PROFILE; 'auto' picks a profile from a quick
+        quality estimate (reusing the quality gate's measurements if given), so clean
+        scans skip denoising and deskewing.
+        """
+        name = profile or settings.DEFAULT_PROCESSING_PROFILE
+        if name == 'auto':
+            with span('profile_selection') as current:
+                quality = quality or self.image_processor.estimate_quality(image)
+                name = select_profile(quality)
+                current.set_attributes(profile=name, **quality)
+            logger.debug(f"Selected processing profile '{name}' for image quality {quality}")
+        if name not in settings.PROCESSING_PROFILES:
+            raise ValueError(f"Unknown processing profile: {name}")
+        return name, settings.PROCESSING_PROFILES[name]
+        
+    def parse_check(self, image_data: bytes, artifacts: Optional[Dict[str, Any]] = None,
+                    profile: Optional[str] = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """Parse check image and extract information"""
+        deadline = deadline or default_deadline()
         try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                raise ValueError("Failed to decode image")
-            
-            # Preprocess image
-            logger.debug("Preprocessing image...")
-            processed_image = self.image_processor.preprocess_image(image)
+            with span('decode', image_bytes=len(image_data)) as current:
+                image = self.decode_image(image_data)
+                current.set_attributes(**{'image.width': image.shape[1], 'image.height': image.shape[0]})
+        except Exception as e:
+            logger.error(f"Error parsing check: {str(e)}")
+            raise
+        return self.parse_image(image, artifacts, profile, deadline)
+        
+    def extract_check_regions(self, image: np.ndarray, options: Optional[Dict[str, Any]] = None) -> Dict[str, np.ndarray]:
+        """Preprocess stage: denoise and deskew the check and crop its regions"""
+        logger.debug("Preprocessing image...")
+        with span('preprocess', **{'image.width': image.shape[1], 'image.height': image.shape[0]}):
+            processed_image = self.image_processor.preprocess_image(image, options)
+        
+        logger.debug("Extracting regions...")
+        return self.image_processor.extract_regions(processed_image)
+        
+    def read_field(self, field: str, region: np.ndarray,
+                   options: Optional[Dict[str, Any]] = None) -> Tuple[Any, str]:
+        """OCR of one field ('amount', 'date' or 'micr'): its value and status code.
+        
+        A field whose OCR runs out of time budget keeps its empty value with FIELD_TIMEOUT.
+        """
+        logger.debug(f"Extracting {field}...")
+        try:
+            with span(f'ocr.{field}'):
+                if field == 'amount':
+                    value = self.ocr_engine.extract_amount(region, options)
+                    found = bool(value)
+                elif field == 'date':
+                    date = self.ocr_engine.extract_date(region, options)
+                    value, found = date.strftime('%Y-%m-%d') if date else None, bool(date)
+                else:
+                    value = self.ocr_engine.extract_micr(self.image_processor.enhance_micr(region))
+                    found = bool(value['account_number'])
+        except DeadlineExceeded:
+            empty = {'amount': 0.0, 'date': None,
+                     'micr': {'bank_code': '', 'account_number': '', 'check_number': ''}}
+            return empty[field], FIELD_TIMEOUT
+        return value, FIELD_OK if found else FIELD_NOT_FOUND
+        
+    def read_fields(self, regions: Dict[str, np.ndarray], options: Optional[Dict[str, Any]] = None,
+                    status: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """OCR stage: amount, date and MICR fields from the region crops.
+        
+        Each field's status code (FIELD_OK, FIELD_NOT_FOUND or FIELD_TIMEOUT) is
+        written to status.
+        """
+        status = status if status is not None else {}
+        values = {}
+        for field in OCR_FIELDS:
+            values[field], status[field] = self.read_field(field, regions[field], options)
+        return {
+            'amount_numeric': values['amount'],
+            'date': values['date'],
+            **values['micr']
+        }
+        
+    def score_fraud(self, image: np.ndarray, features: Optional[CheckFeatures] = None) -> Tuple[bool, float]:
+        """Fraud stage"""
+        logger.debug("Running fraud detection...")
+        with span('fraud_detection') as current:
+            is_fraudulent, fraud_confidence = self.fraud_detector.detect_fraud(image, features)
+            current.set_attributes(fraud_detected=is_fraudulent, fraud_confidence=fraud_confidence)
+        return is_fraudulent, fraud_confidence
+        
+    def verify_signature(self, signature_region: np.ndarray, account_number: str,
+                         features: Optional[CheckFeatures] = None) -> Dict[str, float]:
+        """Signature stage"""
+        logger.debug("Analyzing signature...")
+        with span('signature_verification') as current:
+            signature_analysis = self.fraud_detector.analyze_signature(signature_region, account_number, features)
+            current.set_attributes(confidence=signature_analysis['confidence'],
+                                   references=signature_analysis.get('references', 0))
+        return signature_analysis
+        
+    def run_checks(self, image: np.ndarray, signature_region: np.ndarray, account_number: str,
+                   features: Optional[CheckFeatures] = None,
+                   status: Optional[Dict[str, str]] = None) -> Tuple[bool, Optional[float], Dict[str, float]]:
+        """Fraud and signature stages, each skipped (FIELD_SKIPPED in status) when the
+        current deadline leaves too little time.
+        
+        Returns the fraud decision, its confidence (None if skipped) and the signature analysis.
+        """
+        status = status if status is not None else {}
+        is_fraudulent, fraud_confidence = False, None
+        if self._skip_optional_stage('fraud'):
+            status['fraud'] = FIELD_SKIPPED
+        else:
+            is_fraudulent, fraud_confidence = self.score_fraud(image, features)
+            status['fraud'] = FIELD_OK
+        
+        signature_analysis = {'confidence': 0.0}
+        if self._skip_optional_stage('signature'):
+            status['signature'] = FIELD_SKIPPED
+        else:
+            signature_analysis = self.verify_signature(signature_region, account_number, features)
+            status['signature'] = FIELD_OK
+        return is_fraudulent, fraud_confidence, signature_analysis
+        
+    def parse_image(self, image: np.ndarray, artifacts: Optional[Dict[str, Any]] = None,
+                    profile: Optional[str] = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Parse a decoded check image and extract information.
+        
+        Scans failing the quality gate raise ImageQualityError before any
+        preprocessing or OCR. The result records the processing profile used and a
+        status code per field and stage. Within the deadline (PARSE_DEADLINE_S by default) the parse returns
+        partial results rather than running over: fields whose OCR times out stay
+        empty and fraud and signature checks are skipped when little time is left.
+        If an artifacts dict is given it is filled with the region crops and a
+        manifest of stage settings and results, ready for ArtifactStore.save.
+        """
+        try:
+            with deadline_scope(deadline or default_deadline()):
+                quality = self.check_quality(image) if settings.QUALITY_GATE_ENABLED else None
+                profile, options = self.resolve_profile(profile, image, quality)
+                regions = self.extract_check_regions(image, options.get('image'))
+                status: Dict[str, str] = {}
+                fields = self.read_fields(regions, options.get('ocr'), status)
+                
+                # Image features computed once and shared by the stages below
+                features = CheckFeatures(image, regions)
+                is_fraudulent, fraud_confidence, signature_analysis = self.run_checks(
+                    image, regions['signature'], fields['account_number'], features, status)
             
-            # Extract regions
-            logger.debug("Extracting regions...")
-            regions = self.image_processor.extract_regions(processed_image)
+            # Prepare results
+            check_data = self.build_result(fields['amount_numeric'], fields['date'], fields,
+                                           is_fraudulent, signature_analysis)
+            partial = bool(incomplete_stages(status))
+            check_data['processing_profile'] = profile
+            check_data['field_status'] = status
+            check_data['partial'] = partial
             
-            # Extract amount
-            logger.debug("Extracting amount...")
-            amount = self.ocr_engine.extract_amount(regions['amount'])
+            if partial:
+                metrics.increment('partial_results_total')
+                logger.warning(f"Returning partial results: {status}")
+            if artifacts is not None:
+                # Stages that did not complete are left out of the manifest, so
+                # reprocessing finishes them from the stored crops
+                artifacts['arrays'] = self.capture_arrays(image, regions, features)
+                artifacts['manifest'] = {
+                    'processing_profile': profile,
+                    'stages': self.stage_manifest(profile, incomplete_stages(status)),
+                    'field_status': status,
+                    'results': {
+                        'ocr': fields,
+                        'fraud': {'fraud_detected': is_fraudulent, 'fraud_confidence': fraud_confidence},
+                        'signature': signature_analysis
+                    }
+                }
             
-            # Extract date
-            logger.debug("Extracting date...")
-            date = self.ocr_engine.extract_date(regions['date'])
-            date_str = date.strftime('%Y-%m-%d') if date else None
+            logger.info(f"Successfully parsed check: {check_data}")
+            return check_data
             
-            # Extract MICR data
-            logger.debug("Processing MICR region...")
-            enhanced_micr = self.image_processor.enhance_micr(regions['micr'])
-            micr_data = self.ocr_engine.extract_micr(enhanced_micr)
+        except Exception as e:
+            logger.error(f"Error parsing check: {str(e)}")
+            raise
             
-            # Fraud detection
-            logger.debug("Running fraud detection...")
-            is_fraudulent, fraud_confidence = self.fraud_detector.detect_fraud(image)
+    def _skip_optional_stage(self, stage: str) -> bool:
+        """Whether the current deadline leaves too little time for an optional stage"""
+        deadline = current_deadline()
+        if deadline is None or deadline.remaining() >= settings.DEADLINE_OPTIONAL_STAGE_RESERVE_S:
+            return False
+        logger.warning(f"Skipping {stage}: {deadline.remaining():.2f}s left of the time budget")
+        metrics.increment('stages_skipped_total', stage=stage)
+        return True
             
-            # Signature verification
-            logger.debug("Analyzing signature...")
-            signature_analysis = self.fraud_detector.analyze_signature(regions['signature'])
+    def stage_records(self, profile: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Current version and parameters of every pipeline stage under a processing profile"""
+        options = settings.PROCESSING_PROFILES.get(profile, {}) if profile else {}
+        return {
+            'preprocess': stage_record('preprocess', {'region_layout': REGION_LAYOUT,
+                                                      'options': options.get('image', {})}),
+            'ocr': stage_record('ocr', dict(self.ocr_engine.params(), options=options.get('ocr', {}))),
+            'fraud': stage_record('fraud', {'input_size': FRAUD_INPUT_SIZE}),
+            'signature': stage_record('signature', {'feature_dim': FEATURE_DIM,
+                                                    'verified_threshold': SIGNATURE_VERIFIED_THRESHOLD,
+                                                    'match_distance': SIGNATURE_MATCH_DISTANCE,
+                                                    'match_distance_range': MATCH_DISTANCE_RANGE,
+                                                    'match_spread_margin': MATCH_SPREAD_MARGIN})
+        }
+        
+    def stage_manifest(self, profile: Optional[str] = None,
+                       incomplete: Tuple[str, ...] = ()) -> Dict[str, Dict[str, Any]]:
+        """Stage records for a parsed check; incomplete stages and their dependents are not recorded"""
+        current = self.stage_records(profile)
+        stages: Dict[str, Dict[str, Any]] = {}
+        for stage in STAGE_VERSIONS:
+            if stage in incomplete or any(dependency not in stages for dependency in STAGE_DEPENDENCIES[stage]):
+                continue
+            record_stage(stages, stage, current)
+        return stages
+        
+    def capture_arrays(self, image: np.ndarray, regions: Dict[str, np.ndarray],
+                       features: Optional[CheckFeatures] = None) -> Dict[str, np.ndarray]:
+        """Copies of the stage inputs worth persisting (regions may live in workspace buffers)"""
+        arrays = {name: np.ascontiguousarray(region).copy() for name, region in regions.items()}
+        arrays['fraud_input'] = self.fraud_detector.preprocess_for_fraud_detection(image, features).copy()
+        return arrays
+        
+    def reprocess(self, manifest: Dict[str, Any], arrays: Dict[str, np.ndarray],
+                  raw: Optional[bytes] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, np.ndarray]], Dict[str, Any], List[str]]:
+        """Rerun only the stale stages of a stored check.
+        
+        Later stages start from the stored crops; the preprocess stage needs the raw
+        image and is skipped (keeping the stored crops) without it. Returns the check
+        data, the new arrays (None if unchanged), the updated manifest and the stages run.
+        """
+        profile = manifest.get('processing_profile')
+        if profile and profile not in settings.PROCESSING_PROFILES:
+            logger.warning(f"Processing profile '{profile}' no longer exists; using default options")
+            profile = None
+        options = settings.PROCESSING_PROFILES.get(profile, {}) if profile else {}
+        current = self.stage_records(profile)
+        stages = {stage: dict(record) for stage, record in manifest.get('stages', {}).items()}
+        results = {stage: dict(result) for stage, result in manifest.get('results', {}).items()}
+        status = dict(manifest.get('field_status', {}))
+        new_arrays = None
+        rerun = []
+        
+        for stage in STAGE_VERSIONS:
+            if not is_stale(stage, stages, current):
+                continue
+            if stage == 'preprocess':
+                if raw is None:
+                    logger.warning("Preprocess stage changed but the raw image is not stored; keeping stored regions")
+                    continue
+                image = self.decode_image(raw)
+                new_arrays = self.capture_arrays(image, self.extract_check_regions(image, options.get('image')))
+                arrays = new_arrays
+            elif stage == 'ocr':
+                results['ocr'] = self.read_fields(arrays, options.get('ocr'), status)
+            elif stage == 'fraud':
+                is_fraudulent, fraud_confidence = self.score_fraud(arrays['fraud_input'])
+                results['fraud'] = {'fraud_detected': is_fraudulent, 'fraud_confidence': fraud_confidence}
+                status['fraud'] = FIELD_OK
+            elif stage == 'signature':
+                results['signature'] = self.verify_signature(arrays['signature'], results['ocr']['account_number'])
+                status['signature'] = FIELD_OK
+            record_stage(stages, stage, current)
+            rerun.append(stage)
+        
+        fields = results['ocr']
+        check_data = self.build_result(fields['amount_numeric'], fields['date'], fields,
+                                       results['fraud']['fraud_detected'], results['signature'])
+        check_data['processing_profile'] = manifest.get('processing_profile')
+        check_data['field_status'] = status
+        check_data['partial'] = bool(incomplete_stages(status))
+        manifest = dict(manifest, stages=stages, results=results, field_status=status)
+        return check_data, new_arrays, manifest, rerun
             
-            # Prepare results
-            check_data = {
-                'amount_numeric': amount,
-                'date': date_str,
-                'bank_code': micr_data['bank_code'],
-                'account_number': micr_data['account_number'],
-                'check_number': micr_data['check_number'],
-                'fraud_detected': is_fraudulent,
-                'signature_verified': signature_analysis['confidence'] > 0.7
-            }
+    def parse_sheet(self, image_data: bytes, max_workers: Optional[int] = None,
+                    capture_artifacts: bool = False, profile: Optional[str] = None,
+                    deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+        """Locate every check on a scanned sheet and parse them in parallel.
+        
+        Returns one entry per detected check, top to bottom, with its bounding box in
+        sheet coordinates and either the parsed check data or the error it raised.
+        With capture_artifacts each entry also carries the artifacts of its check.
+        A deadline is shared by the whole sheet; without one each check gets its own.
+        """
+        checks = self.crop_checks(self.decode_image(image_data))
+        
+        def parse_box(check):
+            bbox, crop = check
+            result = {'bbox': bbox, 'check_data': None, 'error': None}
+            with span('parse_sheet_check', **bbox):
+                try:
+                    if capture_artifacts:
+                        result['artifacts'] = {}
+                        if settings.ARTIFACT_STORE_RAW:
+                            # The sheet holds several checks, so each keeps its own crop as raw image
+                            result['artifacts']['raw'] = cv2.imencode('.png', crop)[1].tobytes()
+                    result['check_data'] = self.parse_image(crop, result.get('artifacts'), profile, deadline)
+                except ImageQualityError as e:
+                    result['error'] = str(e)
+                    result['quality_reasons'] = e.reasons
+                except Exception as e:
+                    result['error'] = str(e)
+            return result
+        
+        max_workers = max_workers or settings.SHEET_MAX_WORKERS
+        if isinstance(self.workspace, Workspace) or len(checks) < 2:
+            # A plain Workspace is single-threaded
+            max_workers = 1
+        if max_workers == 1:
+            return [parse_box(check) for check in checks]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(checks))) as executor:
+            # Each task runs in a copy of the caller's context so its spans join the request trace
+            futures = [executor.submit(contextvars.copy_context().run, parse_box, check) for check in checks]
+            return [future.result() for future in futures]
             
-            logger.info(f"Successfully parsed check: {check_data}")
-            return check_data
+    def crop_checks(self, image: np.ndarray) -> List[Tuple[Dict[str, int], np.ndarray]]:
+        """Bounding box and crop of every check on a sheet or PDF page, top to bottom.
+        
+        Crops are views of the image; nothing is copied. Parsing the crops rather
+        than the whole page keeps the page margins out of the quality gate.
+        """
+        boxes = self.image_processor.detect_checks(image)
+        logger.debug(f"Detected {len(boxes)} checks on sheet")
+        return [({'x': x, 'y': y, 'width': w, 'height': h}, image[y:y + h, x:x + w]) for x, y, w, h in boxes]
             
-        except Exception as e:
-            logger.error(f"Error parsing check: {str(e)}")
-            raise
\ No newline at end of file
+    def enroll_signature(self, image_data: bytes, account_number: str, profile: Optional[str] = None) -> int:
+        """Add the signature on a check image to the account's references.
+        
+        The crop goes through the same processing profile as parse_image would use
+        for the image, so references and probes come from the same pipeline.
+        """
+        if self.fraud_detector.signature_index is None:
+            raise RuntimeError("Signature index is not configured")
+        image = self.decode_image(image_data)
+        _, options = self.resolve_profile(profile, image)
+        regions = self.extract_check_regions(image, options.get('image'))
+        features = extract_signature_features(regions['signature'])
+        if not np.any(features):
+            raise ValueError("No signature found on the check")
+        return self.fraud_detector.signature_index.add(account_number, features)
@@ -0,0 +1,74 @@
+"""Per-request time budgets.
+
+A Deadline is opened around a parse with `deadline_scope()`; code further down
+(ImageProcessor, OCREngine, OCR backends) reads it with `current_deadline()` to
+bound subprocess timeouts, skip optional work and give up once it has passed.
+The deadline lives in a context variable, so it follows the request into the
+threads of a sheet parse just like tracing spans.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from ..config.config import settings
+from ..utils.metrics import metrics
+
+_current_deadline: ContextVar[Optional['Deadline']] = ContextVar('current_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The time budget ran out before a stage could finish"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """A point in time, measured on the monotonic clock, by which work must finish"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Seconds a blocking call may take: the time left, at most cap"""
+        remaining = self.remaining()
+        return min(remaining, cap) if cap else remaining
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if the budget is spent"""
+        if self.expired():
+            raise exceeded(stage)
+
+
+def exceeded(stage: str) -> DeadlineExceeded:
+    """A DeadlineExceeded for the stage, counted in the deadline_exceeded metric"""
+    metrics.increment('deadline_exceeded_total', stage=stage)
+    return DeadlineExceeded(stage)
+
+
+def default_deadline() -> Optional[Deadline]:
+    """A deadline of PARSE_DEADLINE_S from now, or None when budgets are disabled"""
+    return Deadline(settings.PARSE_DEADLINE_S) if settings.PARSE_DEADLINE_S > 0 else None
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make deadline the current one for the enclosed block (None leaves work unbounded)"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
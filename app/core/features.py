@@ -0,0 +1,123 @@
+"""Per-check image features shared by fraud scoring, signature analysis and validation.
+
+A CheckFeatures object wraps one decoded check and computes each feature the
+first time a consumer asks for it: the grayscale image, a Gaussian pyramid, the
+integral images, thumbnails and per-region statistics. Later consumers reuse
+the result, so adding a rule does not add another pass over the pixels.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .image_processor import REGION_LAYOUT
+
+
+class CheckFeatures:
+    """Lazily computed, memoized features of one check image.
+
+    image is the decoded check (BGR or grayscale); regions optionally holds the
+    region crops cut from the preprocessed image (see ImageProcessor.extract_regions).
+    Not thread-safe: use one instance per check.
+    """
+
+    def __init__(self, image: np.ndarray, regions: Optional[Dict[str, np.ndarray]] = None):
+        self.image = image
+        self.regions = regions or {}
+        self._cache: Dict[Any, Any] = {}
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def gray(self) -> np.ndarray:
+        def compute():
+            if len(self.image.shape) == 3:
+                return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+            return self.image
+        return self._memo('gray', compute)
+
+    def pyramid_level(self, level: int) -> np.ndarray:
+        """Grayscale image halved level times (level 0 is the full image)"""
+        levels: List[np.ndarray] = self._memo('pyramid', lambda: [self.gray])
+        while len(levels) <= level:
+            previous = levels[-1]
+            if min(previous.shape[:2]) < 2:
+                return previous
+            levels.append(cv2.pyrDown(previous))
+        return levels[level]
+
+    def thumbnail(self, size: Tuple[int, int]) -> np.ndarray:
+        """Grayscale image resized to (width, height), from the smallest pyramid level still larger"""
+        def compute():
+            width, height = size
+            level = 0
+            while True:
+                smaller = self.pyramid_level(level + 1)
+                if smaller is self.pyramid_level(level) or smaller.shape[1] < width or smaller.shape[0] < height:
+                    break
+                level += 1
+            source = self.pyramid_level(level)
+            if source.shape[1] == width and source.shape[0] == height:
+                return source
+            return cv2.resize(source, (width, height), interpolation=cv2.INTER_AREA)
+        return self._memo(('thumbnail', tuple(size)), compute)
+
+    def thumbnail_stats(self, size: Tuple[int, int]) -> Tuple[float, float]:
+        """Mean and standard deviation of a thumbnail's intensities"""
+        def compute():
+            mean, std = cv2.meanStdDev(self.thumbnail(size))
+            return float(mean[0][0]), float(std[0][0])
+        return self._memo(('thumbnail_stats', tuple(size)), compute)
+
+    @property
+    def integrals(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Integral images of the intensities and squared intensities"""
+        return self._memo('integrals', lambda: cv2.integral2(self.gray, sdepth=cv2.CV_64F))
+
+    def region_box(self, name: str) -> Tuple[int, int, int, int]:
+        """Region bounds (top, bottom, left, right) in the full image"""
+        height, width = self.gray.shape[:2]
+        top, bottom, left, right = REGION_LAYOUT[name]
+        return int(height * top), int(height * bottom), int(width * left), int(width * right)
+
+    def box_stats(self, top: int, bottom: int, left: int, right: int) -> Tuple[float, float]:
+        """Mean and standard deviation of the intensities in a box, from the integral images"""
+        total, squared = self.integrals
+        area = max((bottom - top) * (right - left), 1)
+        box_sum = total[bottom, right] - total[top, right] - total[bottom, left] + total[top, left]
+        box_squared = squared[bottom, right] - squared[top, right] - squared[bottom, left] + squared[top, left]
+        mean = box_sum / area
+        return float(mean), float(np.sqrt(max(box_squared / area - mean * mean, 0.0)))
+
+    def region(self, name: str) -> np.ndarray:
+        """Region crop: the preprocessed one if given, else cut from the grayscale image"""
+        if name in self.regions:
+            return self.regions[name]
+        top, bottom, left, right = self.region_box(name)
+        return self.gray[top:bottom, left:right]
+
+    def region_ink(self, name: str) -> np.ndarray:
+        """Ink mask of a region: 255 where there is ink, 0 on paper (Otsu threshold)"""
+        def compute():
+            crop = self.region(name)
+            if len(crop.shape) == 3:
+                crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+            return cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+        return self._memo(('region_ink', name), compute)
+
+    def region_stats(self, name: str) -> Dict[str, Any]:
+        """Intensity mean and spread of a region of the original image, and its ink coverage"""
+        def compute():
+            mean, std = self.box_stats(*self.region_box(name))
+            ink = self.region_ink(name)
+            points = cv2.findNonZero(ink)
+            return {
+                'mean': mean,
+                'std': std,
+                'ink_ratio': float(np.count_nonzero(ink)) / max(ink.size, 1),
+                'ink_bbox': tuple(int(v) for v in cv2.boundingRect(points)) if points is not None else None
+            }
+        return self._memo(('region_stats', name), compute)
@@ -0,0 +1,173 @@
+"""Amount and date parsing of OCR text, per locale.
+
+Each FieldParser compiles its patterns once. A date is read in a single pass:
+one regex finds numeric (12/03/2024, 2024-03-12, 12.03.24) and written
+(12 mars 2024, March 12, 2024) dates alike, and the day/month order is inferred
+from the values (a part above 12 must be the day), falling back to the locale's
+convention when both orders are valid. Nothing is retried through a list of
+strptime formats.
+
+parse_amounts and parse_dates apply a parser to lists of strings, parsing each
+distinct string once, for bulk re-parsing of OCR output.
+"""
+import re
+import unicodedata
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+# Number and date conventions per OCR language (Settings.SUPPORTED_LANGUAGES)
+FIELD_LOCALES: Dict[str, Dict[str, Any]] = {
+    'eng': {
+        'decimal': '.',
+        'group': ',',
+        'day_first': False,
+        'months': ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+                   'september', 'october', 'november', 'december']
+    },
+    'fra': {
+        'decimal': ',',
+        'group': ' .\u00a0\u202f',  # Spaces (also non-breaking) or dots
+        'day_first': True,
+        'months': ['janvier', 'février', 'mars', 'avril', 'mai', 'juin', 'juillet', 'août',
+                   'septembre', 'octobre', 'novembre', 'décembre']
+    },
+    'spa': {
+        'decimal': ',',
+        'group': '. \u00a0',
+        'day_first': True,
+        'months': ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio', 'agosto',
+                   'septiembre', 'octubre', 'noviembre', 'diciembre']
+    }
+}
+
+
+def _strip_accents(text: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+
+
+def _expand_year(year: str) -> int:
+    # Two-digit years follow strptime's %y: 69-99 are 19xx, 00-68 are 20xx
+    value = int(year)
+    if len(year) == 2:
+        return value + (1900 if value >= 69 else 2000)
+    return value
+
+
+class FieldParser:
+    """Parse amounts and dates out of OCR text for one locale"""
+
+    def __init__(self, locale: str = 'eng'):
+        if locale not in FIELD_LOCALES:
+            raise ValueError(f"Unknown locale '{locale}'. Available locales are: {', '.join(FIELD_LOCALES)}")
+        self.locale = locale
+        conventions = FIELD_LOCALES[locale]
+        self.day_first = conventions['day_first']
+        self.decimal = conventions['decimal']
+        self.group = conventions['group']
+
+        group = re.escape(self.group)
+        decimal = re.escape(self.decimal)
+        self.amount_pattern = re.compile(
+            rf'(?<!\d)(?P<integer>\d{{1,3}}(?:[{group}]\d{{3}})+|\d+)(?:{decimal}(?P<fraction>\d{{1,2}}))?(?!\d)'
+        )
+
+        # Month names, unaccented spellings and unambiguous abbreviations (sep, sept, juil) -> month number
+        self.months: Dict[str, int] = {}
+        abbreviations: Dict[str, set] = {}
+        for number, name in enumerate(conventions['months'], 1):
+            for spelling in (name, _strip_accents(name)):
+                self.months[spelling] = number
+                for length in range(3, len(spelling)):
+                    abbreviations.setdefault(spelling[:length], set()).add(number)
+        for abbreviation, numbers in abbreviations.items():
+            if len(numbers) == 1:
+                self.months.setdefault(abbreviation, numbers.pop())
+        names = '|'.join(sorted((re.escape(name) for name in self.months), key=len, reverse=True))
+        self.date_pattern = re.compile(
+            r'(?<!\d)(?P<a>\d{1,4})(?P<sep>[-/.])(?P<b>\d{1,2})(?P=sep)(?P<c>\d{2,4})(?!\d)'
+            rf'|(?<!\d)(?P<day>\d{{1,2}})(?:er|st|nd|rd|th)?[\s./-]*(?:de\s+)?(?P<month>{names})\b[\s.,/-]*(?:de\s+)?(?P<year>\d{{4}})'
+            rf'|\b(?P<month_us>{names})\b[\s./-]*(?P<day_us>\d{{1,2}})(?:st|nd|rd|th)?[\s,/-]+(?P<year_us>\d{{4}})',
+            re.IGNORECASE
+        )
+
+    def params(self) -> Dict[str, str]:
+        """Settings that determine the parsed values, recorded with stored artifacts"""
+        return {
+            'locale': self.locale,
+            'amount_pattern': self.amount_pattern.pattern,
+            'date_pattern': self.date_pattern.pattern
+        }
+
+    def parse_amount(self, text: str) -> Optional[float]:
+        """First amount in the text, or None"""
+        match = self.amount_pattern.search(text)
+        if not match:
+            return None
+        integer = match.group('integer')
+        for separator in self.group:
+            integer = integer.replace(separator, '')
+        fraction = match.group('fraction')
+        return float(f'{integer}.{fraction}' if fraction else integer)
+
+    def parse_date(self, text: str) -> Optional[datetime]:
+        """First valid date in the text, or None"""
+        for match in self.date_pattern.finditer(text):
+            date = self._match_to_date(match)
+            if date is not None:
+                return date
+        return None
+
+    def _match_to_date(self, match) -> Optional[datetime]:
+        try:
+            if match.group('a') is not None:
+                a, b, c = match.group('a', 'b', 'c')
+                if len(a) == 4:
+                    # ISO order: year-month-day
+                    if len(c) > 2:
+                        return None
+                    return datetime(int(a), int(b), int(c))
+                if len(a) == 3 or len(c) == 3:
+                    return None
+                first, second, year = int(a), int(b), _expand_year(c)
+                if first > 12:
+                    day_first = True
+                elif second > 12:
+                    day_first = False
+                else:
+                    day_first = self.day_first
+                return datetime(year, second, first) if day_first else datetime(year, first, second)
+
+            if match.group('month') is not None:
+                day, month, year = match.group('day', 'month', 'year')
+            else:
+                day, month, year = match.group('day_us', 'month_us', 'year_us')
+            return datetime(int(year), self.months[month.lower()], int(day))
+        except (KeyError, ValueError):
+            # Impossible dates (31/02) and month-name look-alikes
+            return None
+
+    def parse_amounts(self, texts: Iterable[str]) -> List[Optional[float]]:
+        """parse_amount of each string; repeated strings are parsed once"""
+        return _parse_batch(self.parse_amount, texts)
+
+    def parse_dates(self, texts: Iterable[str]) -> List[Optional[datetime]]:
+        """parse_date of each string; repeated strings are parsed once"""
+        return _parse_batch(self.parse_date, texts)
+
+
+def _parse_batch(parse, texts: Iterable[str]) -> List[Any]:
+    parsed: Dict[str, Any] = {}
+    results = []
+    append = results.append
+    for text in texts:
+        if text not in parsed:
+            parsed[text] = parse(text) if text else None
+        append(parsed[text])
+    return results
+
+
+@lru_cache(maxsize=None)
+def get_field_parser(locale: str = 'eng') -> FieldParser:
+    """Shared parser per locale; parsers hold only compiled patterns and are thread-safe"""
+    return FieldParser(locale)
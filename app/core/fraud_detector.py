@@ -1,36 +1,39 @@
 import numpy as np
 import cv2
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 import logging
 import random
+from .features import CheckFeatures
+from .signature_index import SignatureIndex, extract_signature_features
 
 logger = logging.getLogger(__name__)
 
+# Size (width, height) images are reduced to before fraud analysis
+FRAUD_INPUT_SIZE = (224, 224)
+
 class FraudDetector:
-    def __init__(self):
+    def __init__(self, signature_index: Optional[SignatureIndex] = None):
         self.logger = logging.getLogger(__name__)
+        # Reference signatures per account; without it no signature can be verified
+        self.signature_index = signature_index
         
-    def preprocess_for_fraud_detection(self, image: np.ndarray) -> np.ndarray:
-        """Preprocess image for fraud detection"""
-        # Resize image to standard size
-        image = cv2.resize(image, (224, 224))
-        # Convert to grayscale
-        if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        return image
+    def preprocess_for_fraud_detection(self, image: np.ndarray,
+                                       features: Optional[CheckFeatures] = None) -> np.ndarray:
+        """Grayscale image at FRAUD_INPUT_SIZE, the input of fraud detection"""
+        return (features or CheckFeatures(image)).thumbnail(FRAUD_INPUT_SIZE)
         
-    def detect_fraud(self, image: np.ndarray) -> Tuple[bool, float]:
+    def detect_fraud(self, image: np.ndarray, features: Optional[CheckFeatures] = None) -> Tuple[bool, float]:
         """
         Simple fraud detection based on image analysis
         Returns: (is_fraudulent: bool, confidence_score: float)
+        
+        Statistics come from the check's shared features when given.
         """
         try:
-            # Process image
-            processed_image = self.preprocess_for_fraud_detection(image)
+            features = features or CheckFeatures(image)
             
             # Calculate basic image statistics
-            mean_intensity = np.mean(processed_image)
-            std_intensity = np.std(processed_image)
+            mean_intensity, std_intensity = features.thumbnail_stats(FRAUD_INPUT_SIZE)
             
             # Simple rule-based detection (for demonstration)
             # In a real system, this would use more sophisticated analysis
@@ -44,32 +47,33 @@ class FraudDetector:
             logger.error(f"Error in fraud detection: {str(e)}")
             return False, 0.0
         
-    def analyze_signature(self, signature_region: np.ndarray) -> Dict[str, float]:
-        """Simple signature analysis"""
+    def analyze_signature(self, signature_region: np.ndarray, account_number: Optional[str] = None,
+                          features: Optional[CheckFeatures] = None) -> Dict[str, float]:
+        """Verify a signature against the references enrolled for the account"""
         try:
-            # Convert to grayscale if needed
-            if len(signature_region.shape) == 3:
-                signature_region = cv2.cvtColor(signature_region, cv2.COLOR_BGR2GRAY)
-            
-            # Calculate basic signature metrics
-            mean_intensity = float(np.mean(signature_region))
-            std_intensity = float(np.std(signature_region))
+            ink = features.region_ink('signature') if features is not None else None
+            features = extract_signature_features(signature_region, ink)
             
-            # Simple metrics (for demonstration)
-            confidence = float(0.5 + random.random() * 0.5)
-            consistency = float(0.6 + random.random() * 0.4)
-            authenticity = float(0.7 + random.random() * 0.3)
+            if self.signature_index is None:
+                return {
+                    'confidence': 0.0,
+                    'consistency_score': 0.0,
+                    'authenticity_score': 0.0,
+                    'references': 0
+                }
             
+            match = self.signature_index.verify(account_number, features)
             return {
-                'confidence': confidence,
-                'consistency_score': consistency,
-                'authenticity_score': authenticity
+                'confidence': match['confidence'],
+                'consistency_score': match['consistency_score'],
+                'authenticity_score': match['confidence'],
+                'references': match['references']
             }
         except Exception as e:
             logger.error(f"Error in signature analysis: {str(e)}")
             return {
                 'confidence': 0.0,
                 'consistency_score': 0.0,
-                'authenticity_score': 0.0
+                'authenticity_score': 0.0,
+                'references': 0
             }
-        
\ No newline at end of file
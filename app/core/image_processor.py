@@ -1,43 +1,136 @@
 import cv2
 import numpy as np
 from PIL import Image
-from pdf2image import convert_from_bytes
-from typing import Union, List, Tuple, Dict
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from typing import Any, Union, Iterator, List, Tuple, Dict, Optional
 import logging
+from ..config.config import settings
+from ..utils.metrics import metrics
+from ..utils.tracing import current_span
+from .deadline import current_deadline
 
 logger = logging.getLogger(__name__)
 
+# Regions based on typical check layout, as (top, bottom, left, right) fractions of the image
+REGION_LAYOUT = {
+    # Amount is usually in the top right quadrant
+    'amount': (0.1, 0.3, 0.65, 0.95),
+    # Date is usually in the top right corner
+    'date': (0.05, 0.15, 0.7, 0.95),
+    # Signature is usually in the bottom right quadrant
+    'signature': (0.6, 0.8, 0.6, 0.95),
+    # MICR is always at the bottom
+    'micr': (0.8, 1.0, 0.1, 0.9)
+}
+
+# Preprocessing steps and parameters of the 'accurate' profile, used when none is given
+DEFAULT_PREPROCESS_OPTIONS = {
+    'threshold': 'adaptive',  # 'adaptive' or 'otsu'
+    'adaptive_block_size': 11,
+    'adaptive_c': 2,
+    'denoise': True,  # Non-local means denoising
+    'denoise_h': 3,
+    'denoise_search_window': 21,
+    'deskew': True,
+    'interpolation': 'cubic'  # Deskew warp: 'cubic' or 'linear'
+}
+
+_INTERPOLATION = {'cubic': cv2.INTER_CUBIC, 'linear': cv2.INTER_LINEAR}
+
+# Kernel of Immerkaer's fast noise variance estimate
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+class ImageQualityError(Exception):
+    """A scan rejected by the quality gate; reasons lists the failed checks"""
+    
+    def __init__(self, reasons: List[Dict[str, Any]], quality: Optional[Dict[str, float]] = None):
+        super().__init__("Image quality too low: " + ", ".join(reason['code'] for reason in reasons))
+        self.reasons = reasons
+        self.quality = quality or {}
+    
+    def __reduce__(self):
+        # Rebuilt from the reasons when raised in a worker process
+        return type(self), (self.reasons, self.quality)
+
 class ImageProcessor:
-    def __init__(self):
+    def __init__(self, workspace=None):
         self.supported_formats = ['.jpg', '.jpeg', '.png', '.pdf']
+        # Optional Workspace/ThreadLocalWorkspace that owns reusable output buffers
+        self.workspace = workspace
+        
+    def _dst(self, key: str, shape: Tuple[int, ...], dtype=np.uint8) -> Optional[np.ndarray]:
+        """Reusable output buffer from the workspace, or None to let OpenCV allocate"""
+        if self.workspace is None:
+            return None
+        return self.workspace.buffer(f'image_processor.{key}', shape, dtype)
+        
+    def _skip_for_deadline(self, step: str, cost: float) -> bool:
+        """Whether an optional preprocessing step, estimated to take cost seconds,
+        would eat into the time reserved for OCR"""
+        deadline = current_deadline()
+        if deadline is None or deadline.remaining() >= cost + settings.DEADLINE_OCR_RESERVE_S:
+            return False
+        logger.warning(f"Skipping {step} (about {cost:.2f}s): {deadline.remaining():.2f}s left of the time budget")
+        metrics.increment('stages_skipped_total', stage=f'preprocess.{step}')
+        return True
         
-    def preprocess_image(self, image: np.ndarray) -> np.ndarray:
-        """Preprocess image for better OCR results"""
+    def preprocess_image(self, image: np.ndarray, options: Optional[Dict] = None) -> np.ndarray:
+        """Preprocess image for better OCR results.
+        
+        options selects the steps and their parameters (see DEFAULT_PREPROCESS_OPTIONS);
+        processing profiles use it to skip denoising and deskewing on clean images.
+        Denoising and deskewing are also skipped when the current deadline cannot
+        fit their estimated cost (per megapixel, see PREPROCESS_*_S_PER_MPX) on
+        top of DEADLINE_OCR_RESERVE_S.
+        """
         try:
+            options = {**DEFAULT_PREPROCESS_OPTIONS, **(options or {})}
+            (h, w) = image.shape[:2]
+            megapixels = h * w / 1e6
+            
             # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._dst('gray', (h, w)))
             
-            # Apply adaptive thresholding
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY, 11, 2
-            )
+            # Binarize
+            if options['threshold'] == 'otsu':
+                thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                                       dst=self._dst('thresh', (h, w)))[1]
+            else:
+                thresh = cv2.adaptiveThreshold(
+                    gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                    cv2.THRESH_BINARY, options['adaptive_block_size'], options['adaptive_c'],
+                    dst=self._dst('thresh', (h, w))
+                )
             
             # Noise reduction
-            denoised = cv2.fastNlMeansDenoising(thresh)
+            # Denoising time grows roughly linearly with the search window
+            denoise_cost = (megapixels * settings.PREPROCESS_DENOISE_S_PER_MPX
+                            * options['denoise_search_window'] / DEFAULT_PREPROCESS_OPTIONS['denoise_search_window'])
+            if options['denoise'] and not self._skip_for_deadline('denoise', denoise_cost):
+                denoised = cv2.fastNlMeansDenoising(
+                    thresh, dst=self._dst('denoised', (h, w)), h=options['denoise_h'],
+                    templateWindowSize=7, searchWindowSize=options['denoise_search_window']
+                )
+            else:
+                denoised = thresh
+            
+            if not options['deskew'] or self._skip_for_deadline('deskew', megapixels * settings.PREPROCESS_DESKEW_S_PER_MPX):
+                logger.debug("Image preprocessing completed successfully (no deskew)")
+                return denoised
             
             # Deskew image
             coords = np.column_stack(np.where(denoised > 0))
             angle = cv2.minAreaRect(coords)[-1]
             if angle < -45:
                 angle = 90 + angle
+            current_span().set_attribute('deskew_angle', float(angle))
                 
-            (h, w) = image.shape[:2]
             center = (w // 2, h // 2)
             M = cv2.getRotationMatrix2D(center, angle, 1.0)
             rotated = cv2.warpAffine(
                 denoised, M, (w, h),
-                flags=cv2.INTER_CUBIC,
+                dst=self._dst('rotated', (h, w)),
+                flags=_INTERPOLATION[options['interpolation']],
                 borderMode=cv2.BORDER_REPLICATE
             )
             
@@ -48,28 +141,208 @@ class ImageProcessor:
             logger.error(f"Error in image preprocessing: {str(e)}")
             return image
     
+    def estimate_quality(self, image: np.ndarray) -> Dict[str, float]:
+        """Quick quality measurements, used to pick a processing profile and by assess_quality.
+        
+        Noise is estimated on a full-resolution window at the center (downscaling
+        would average it away). Everything else is measured on a thumbnail:
+        sharpness (variance of the Laplacian), skew of the ink bounding box, mean
+        brightness, contrast (mean gray level of paper minus that of ink), the ink
+        fraction of the MICR band and the aspect ratio.
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        height, width = gray.shape[:2]
+        
+        window = gray[max(0, height // 2 - 128):height // 2 + 128,
+                      max(0, width // 2 - 256):width // 2 + 256].astype(np.float32)
+        wh, ww = window.shape[:2]
+        if wh > 2 and ww > 2:
+            response = np.abs(cv2.filter2D(window, -1, _NOISE_KERNEL))[1:-1, 1:-1]
+            noise = float(np.sqrt(np.pi / 2) * response.sum() / (6 * (ww - 2) * (wh - 2)))
+        else:
+            noise = 0.0
+        
+        scale = min(1.0, settings.PROFILE_THUMBNAIL_MAX_DIM / max(height, width))
+        thumbnail = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        sharpness = float(cv2.Laplacian(thumbnail, cv2.CV_64F).var())
+        
+        ink = cv2.threshold(thumbnail, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+        points = cv2.findNonZero(ink)
+        skew = 0.0
+        if points is not None:
+            # minAreaRect angle folded into [-45, 45)
+            skew = float((cv2.minAreaRect(points)[-1] + 45) % 90 - 45)
+        
+        # Exposure: overall level, and the gap between paper and ink (the two Otsu classes)
+        brightness = float(cv2.mean(thumbnail)[0])
+        ink_pixels = cv2.countNonZero(ink)
+        if 0 < ink_pixels < ink.size:
+            contrast = float(cv2.mean(thumbnail, mask=cv2.bitwise_not(ink))[0] - cv2.mean(thumbnail, mask=ink)[0])
+        else:
+            contrast = 0.0
+        
+        top, bottom, left, right = REGION_LAYOUT['micr']
+        th, tw = thumbnail.shape[:2]
+        band = ink[int(th * top):int(th * bottom), int(tw * left):int(tw * right)]
+        micr_ink = float(cv2.countNonZero(band)) / max(band.size, 1)
+        
+        return {
+            'noise': noise,
+            'sharpness': sharpness,
+            'skew': skew,
+            'brightness': brightness,
+            'contrast': contrast,
+            'micr_ink': micr_ink,
+            'aspect_ratio': width / float(max(height, 1))
+        }
+    
+    def assess_quality(self, image: np.ndarray, quality: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Decide whether a scan is usable before any denoising or OCR runs.
+        
+        Returns {'passed', 'reasons', 'quality'}, where each reason names the failed
+        check with its measured value and the configured threshold.
+        """
+        quality = quality or self.estimate_quality(image)
+        min_aspect, max_aspect = settings.QUALITY_ASPECT_RANGE
+        checks = [
+            ('blurry', quality['sharpness'] < settings.QUALITY_MIN_SHARPNESS,
+             "Image is too blurry", 'sharpness', settings.QUALITY_MIN_SHARPNESS),
+            ('underexposed', quality['brightness'] < settings.QUALITY_MIN_BRIGHTNESS,
+             "Image is too dark", 'brightness', settings.QUALITY_MIN_BRIGHTNESS),
+            ('overexposed', quality['brightness'] > settings.QUALITY_MAX_BRIGHTNESS,
+             "Image is washed out", 'brightness', settings.QUALITY_MAX_BRIGHTNESS),
+            ('low_contrast', quality['contrast'] < settings.QUALITY_MIN_CONTRAST,
+             "Image has too little contrast", 'contrast', settings.QUALITY_MIN_CONTRAST),
+            ('micr_missing', quality['micr_ink'] < settings.QUALITY_MIN_MICR_INK,
+             "No MICR line found at the bottom of the check; the scan may be truncated",
+             'micr_ink', settings.QUALITY_MIN_MICR_INK),
+            ('aspect_ratio', not min_aspect <= quality['aspect_ratio'] <= max_aspect,
+             "Image does not have the proportions of a check", 'aspect_ratio', settings.QUALITY_ASPECT_RANGE)
+        ]
+        reasons = [
+            {'code': code, 'message': message, 'value': round(quality[metric], 4), 'threshold': threshold}
+            for code, failed, message, metric, threshold in checks if failed
+        ]
+        return {'passed': not reasons, 'reasons': reasons, 'quality': quality}
+    
+    def pdf_pages(self, pdf_bytes: bytes, dpi: int = 200) -> Iterator[np.ndarray]:
+        """Render the pages of a PDF one at a time as BGR images"""
+        pages = int(pdfinfo_from_bytes(pdf_bytes)['Pages'])
+        for number in range(1, pages + 1):
+            page = convert_from_bytes(pdf_bytes, dpi=dpi, first_page=number, last_page=number)[0]
+            yield cv2.cvtColor(np.array(page.convert('RGB')), cv2.COLOR_RGB2BGR)
+    
+    def detect_checks(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Locate individual checks on a scanned sheet.
+        
+        Works on a downscaled copy: paper edges are found with contour analysis and,
+        if that finds nothing usable, ink bands are split on blank rows of the
+        horizontal projection. Returns (x, y, width, height) boxes at full
+        resolution, top to bottom; the whole image is one box if nothing is found.
+        """
+        height, width = image.shape[:2]
+        try:
+            scale = min(1.0, settings.SHEET_DETECTION_MAX_DIM / max(height, width))
+            small = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+            if len(small.shape) == 3:
+                small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            
+            boxes = self._detect_check_contours(small) or self._detect_check_bands(small)
+            if not boxes:
+                logger.debug("No separate checks detected; treating image as a single check")
+                return [(0, 0, width, height)]
+            
+            # Scale back to full resolution
+            full_boxes = []
+            for x, y, w, h in boxes:
+                x0, y0 = int(x / scale), int(y / scale)
+                x1, y1 = min(width, int(np.ceil((x + w) / scale))), min(height, int(np.ceil((y + h) / scale)))
+                full_boxes.append((x0, y0, x1 - x0, y1 - y0))
+            return sorted(full_boxes, key=lambda box: (box[1], box[0]))
+            
+        except Exception as e:
+            logger.error(f"Error detecting checks: {str(e)}")
+            return [(0, 0, width, height)]
+    
+    def _is_check_shaped(self, w: int, h: int, sheet_area: int) -> bool:
+        min_aspect, max_aspect = settings.SHEET_CHECK_ASPECT_RANGE
+        return (w * h >= settings.SHEET_MIN_CHECK_AREA * sheet_area
+                and min_aspect <= w / max(h, 1) <= max_aspect)
+    
+    def _detect_check_contours(self, gray: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Check rectangles from the outer contours of paper edges"""
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 30, 100)
+        edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE,
+                                 cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        sheet_area = gray.shape[0] * gray.shape[1]
+        boxes = [
+            cv2.boundingRect(contour) for contour in contours
+            if self._is_check_shaped(*cv2.boundingRect(contour)[2:], sheet_area)
+        ]
+        # Drop boxes nested inside another (printed borders inside a check)
+        return [
+            (x, y, w, h) for x, y, w, h in boxes
+            if not any(ox <= x and oy <= y and x + w <= ox + ow and y + h <= oy + oh
+                       and (ox, oy, ow, oh) != (x, y, w, h)
+                       for ox, oy, ow, oh in boxes)
+        ]
+    
+    def _detect_check_bands(self, gray: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Check rectangles from ink bands separated by blank rows"""
+        ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+        rows = ink.sum(axis=1) > max(2, int(0.005 * gray.shape[1]))
+        
+        # Runs of inked rows (text lines) and the blank gaps between them
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.astype(np.int8), [0]))))
+        runs = list(zip(edges[::2], edges[1::2]))
+        if len(runs) < 2:
+            return []
+        gaps = np.array([start - end for (_, end), (start, _) in zip(runs, runs[1:])])
+        # Line spacing inside a check is the typical gap; checks are separated by wider ones
+        split_gap = max(3, gray.shape[0] // 100, 1.5 * np.median(gaps))
+        
+        bands = []
+        top = runs[0][0]
+        for (_, end), (start, _), gap in zip(runs, runs[1:], gaps):
+            if gap >= split_gap:
+                bands.append((top, end))
+                top = start
+        bands.append((top, runs[-1][1]))
+        if len(bands) < 2:
+            return []
+        
+        # Ink bands are tighter than the paper, so pad them by half the separating gap
+        # and only require a plausible size rather than a check-like aspect ratio
+        height, width = gray.shape[:2]
+        margin = int(split_gap // 2)
+        boxes = []
+        for top, bottom in bands:
+            columns = np.flatnonzero(ink[top:bottom].sum(axis=0))
+            x0, x1 = max(0, int(columns[0]) - margin), min(width, int(columns[-1]) + 1 + margin)
+            y0, y1 = max(0, int(top) - margin), min(height, int(bottom) + margin)
+            if (x1 - x0) * (y1 - y0) >= settings.SHEET_MIN_CHECK_AREA * height * width:
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes if len(boxes) > 1 else []
+    
+    def region_boxes(self, height: int, width: int) -> Dict[str, Tuple[int, int, int, int]]:
+        """Region bounds (top, bottom, left, right) for an image of the given size"""
+        return {
+            name: (int(height*top), int(height*bottom), int(width*left), int(width*right))
+            for name, (top, bottom, left, right) in REGION_LAYOUT.items()
+        }
+
     def extract_regions(self, image: np.ndarray) -> Dict[str, np.ndarray]:
         """Extract different regions from the check image using relative positioning"""
         try:
             height, width = image.shape[:2]
             
-            # Define regions based on typical check layout
             regions = {
-                # Amount is usually in the top right quadrant
-                'amount': image[int(height*0.1):int(height*0.3),
-                              int(width*0.65):int(width*0.95)],
-                              
-                # Date is usually in the top right corner
-                'date': image[int(height*0.05):int(height*0.15),
-                            int(width*0.7):int(width*0.95)],
-                            
-                # Signature is usually in the bottom right quadrant
-                'signature': image[int(height*0.6):int(height*0.8),
-                                 int(width*0.6):int(width*0.95)],
-                                 
-                # MICR is always at the bottom
-                'micr': image[int(height*0.8):,
-                            int(width*0.1):int(width*0.9)]
+                name: image[top:bottom, left:right]
+                for name, (top, bottom, left, right) in self.region_boxes(height, width).items()
             }
             
             # Validate extracted regions
@@ -94,27 +367,38 @@ class ImageProcessor:
     def enhance_micr(self, micr_region: np.ndarray) -> np.ndarray:
         """Enhance MICR code region for better recognition"""
         try:
+            shape = micr_region.shape[:2]
+            
             # Convert to grayscale if needed
             if len(micr_region.shape) == 3:
-                micr_region = cv2.cvtColor(micr_region, cv2.COLOR_BGR2GRAY)
+                micr_region = cv2.cvtColor(micr_region, cv2.COLOR_BGR2GRAY,
+                                           dst=self._dst('micr_gray', shape))
             
             # Apply specific preprocessing for MICR
             # 1. Increase contrast
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(micr_region)
+            if self.workspace is not None:
+                clahe = self.workspace.clahe(2.0, (8, 8))
+            else:
+                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+            enhanced = clahe.apply(micr_region, dst=self._dst('micr_clahe', shape))
             
             # 2. Remove noise
-            enhanced = cv2.GaussianBlur(enhanced, (3, 3), 0)
+            enhanced = cv2.GaussianBlur(enhanced, (3, 3), 0, dst=self._dst('micr_blur', shape))
             
-            # 3. Binarization
+            # 3. Binarization (in place)
             enhanced = cv2.threshold(
                 enhanced, 0, 255,
-                cv2.THRESH_BINARY + cv2.THRESH_OTSU
+                cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                dst=enhanced
             )[1]
             
             # 4. Remove small noise
-            kernel = np.ones((2,2), np.uint8)
-            enhanced = cv2.morphologyEx(enhanced, cv2.MORPH_OPEN, kernel)
+            if self.workspace is not None:
+                kernel = self.workspace.kernel(cv2.MORPH_RECT, (2, 2))
+            else:
+                kernel = np.ones((2,2), np.uint8)
+            enhanced = cv2.morphologyEx(enhanced, cv2.MORPH_OPEN, kernel,
+                                        dst=self._dst('micr_opened', shape))
             
             logger.debug("MICR region enhanced successfully")
             return enhanced
@@ -0,0 +1,275 @@
+"""Batch jobs whose progress is streamed to clients as Server-Sent Events.
+
+Every job has an append-only event log in JOB_STORE_PATH, one JSON line per event
+with a sequence id. Only the process that accepted the batch writes to it: a
+queued event at once, then an event as each check finishes, and it touches the
+logs of its queued and running jobs every JOB_HEARTBEAT_S so readers can tell a
+waiting job from one whose process died. Any process can stream the log, which
+matters behind the preforking server where the events request may land on
+another worker. Clients that reconnect send the last id they received
+(Last-Event-ID) and the stream resumes right after it.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Event types, in the order a job emits them
+JOB_QUEUED = 'queued'
+JOB_STARTED = 'started'
+JOB_ITEM = 'item'
+JOB_DONE = 'done'
+# Reported to readers of a log that stopped changing; never written to the log
+JOB_ABANDONED = 'abandoned'
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobEventLog:
+    """Append-only event log of one job"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_id: Optional[int] = None
+
+    def append(self, event: str, data: Dict[str, Any]) -> int:
+        """Write an event and return its id; readers see it once the line is complete"""
+        with self._lock:
+            if self._last_id is None:
+                events, _ = self.read()
+                self._last_id = events[-1]['id'] if events else 0
+            self._last_id += 1
+            line = json.dumps({'id': self._last_id, 'event': event, 'data': data}, default=str)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            return self._last_id
+
+    def read(self, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Complete events from a byte offset, and the offset to continue from"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return [], offset
+        # A line still being written has no newline yet; leave it for the next read
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        events = [json.loads(line) for line in complete.splitlines() if line.strip()]
+        return events, offset + len(complete)
+
+    def modified(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return 0.0
+
+    def touch(self):
+        """Heartbeat of the owning process: bump the modification time without writing"""
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            pass
+
+    def is_stale(self, stale_after: float) -> bool:
+        """Whether neither an event nor a heartbeat reached the log for stale_after seconds"""
+        return time.time() - self.modified() > stale_after
+
+
+class JobStore:
+    """Directory of job event logs"""
+
+    def __init__(self, path: str, retention: float = 86400.0):
+        self.path = path
+        self.retention = retention
+
+    def _log_path(self, job_id: str) -> str:
+        return os.path.join(self.path, f'{job_id}.ndjson')
+
+    def create(self) -> Tuple[str, JobEventLog]:
+        os.makedirs(self.path, exist_ok=True)
+        self.prune()
+        job_id = uuid.uuid4().hex
+        log = JobEventLog(self._log_path(job_id))
+        open(log.path, 'a').close()
+        return job_id, log
+
+    def open(self, job_id: str) -> Optional[JobEventLog]:
+        """The job's log, or None for an unknown (or malformed) id"""
+        if not _JOB_ID.match(job_id) or not os.path.exists(self._log_path(job_id)):
+            return None
+        return JobEventLog(self._log_path(job_id))
+
+    def prune(self):
+        """Delete logs of jobs that finished longer than the retention period ago"""
+        cutoff = time.time() - self.retention
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                if name.endswith('.ndjson') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+def summarize(events: List[Dict[str, Any]], stale: bool = False) -> Dict[str, Any]:
+    """Status and counts of a job from its events; an unfinished stale job is abandoned"""
+    items = [event['data'] for event in events if event['event'] == JOB_ITEM]
+    if any(event['event'] == JOB_DONE for event in events):
+        status = JOB_DONE
+    elif stale:
+        status = JOB_ABANDONED
+    elif any(event['event'] == JOB_STARTED for event in events):
+        status = 'running'
+    else:
+        status = JOB_QUEUED
+    return {
+        'status': status,
+        'items': len(items),
+        'succeeded': sum(1 for item in items if item.get('error') is None),
+        'failed': sum(1 for item in items if item.get('error') is not None),
+        'last_event_id': events[-1]['id'] if events else 0
+    }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """One Server-Sent Events message; without an id the client's Last-Event-ID is kept"""
+    message = f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+    return f"id: {event['id']}\n{message}" if event.get('id') is not None else message
+
+
+def stream_events(log: JobEventLog, last_event_id: int = 0, poll_interval: float = 0.25,
+                  max_duration: float = 300.0, keepalive: float = 15.0, stale_after: float = 600.0,
+                  retry_ms: int = 2000) -> Iterator[str]:
+    """SSE messages of the events after last_event_id, as they are appended.
+
+    Ends after the job's last event, or after max_duration so a long job does not
+    hold a server thread; EventSource clients then reconnect with Last-Event-ID.
+    A job whose log has not changed for stale_after seconds without finishing
+    (its process died, so heartbeats stopped) is reported as abandoned. That
+    event has no id and is not written: only the owning process writes the log.
+    """
+    yield f"retry: {retry_ms}\n\n"
+    started = time.monotonic()
+    last_sent = started
+    offset = 0
+    while True:
+        events, offset = log.read(offset)
+        for event in events:
+            if event['id'] <= last_event_id:
+                continue
+            yield format_sse(event)
+            last_event_id = event['id']
+            last_sent = time.monotonic()
+            if event['event'] == JOB_DONE:
+                return
+
+        now = time.monotonic()
+        if now - started >= max_duration:
+            return
+        if log.is_stale(stale_after):
+            yield format_sse({'event': JOB_ABANDONED, 'data': {'reason': f"no progress for {stale_after:.0f}s"}})
+            return
+        if now - last_sent >= keepalive:
+            # Comment line, so proxies do not close an idle connection
+            yield ": keepalive\n\n"
+            last_sent = now
+        time.sleep(poll_interval)
+
+
+# An item is (source description, zero-argument loader of the decoded image)
+JobItem = Tuple[Dict[str, Any], Callable[[], Any]]
+
+
+def run_job(log: JobEventLog, items: Iterable[JobItem], process: Callable[[Any], Dict[str, Any]],
+            files: Optional[List[str]] = None):
+    """Process items one by one, appending an event as each finishes"""
+    started = time.monotonic()
+    log.append(JOB_STARTED, {'files': files or []})
+    index = succeeded = failed = 0
+    try:
+        for index, (source, load) in enumerate(items, 1):
+            item_started = time.monotonic()
+            event = {'index': index, 'source': source, 'check_data': None, 'error': None}
+            try:
+                event['check_data'] = process(load())
+                succeeded += 1
+            except Exception as e:
+                logger.error(f"Error processing job item {source}: {str(e)}")
+                event['error'] = str(e)
+                failed += 1
+            event['elapsed_ms'] = round((time.monotonic() - item_started) * 1000.0, 1)
+            log.append(JOB_ITEM, event)
+    except Exception as e:
+        # The items iterator itself failed (e.g. an unreadable PDF); report what was done
+        logger.error(f"Error reading job items: {str(e)}")
+        log.append(JOB_ITEM, {'index': index + 1, 'source': None, 'check_data': None,
+                              'error': str(e), 'elapsed_ms': 0.0})
+        failed += 1
+    log.append(JOB_DONE, {'items': succeeded + failed, 'succeeded': succeeded, 'failed': failed,
+                          'elapsed_ms': round((time.monotonic() - started) * 1000.0, 1)})
+
+
+class JobRunner:
+    """Background threads that run batch jobs in the process that accepted them"""
+
+    def __init__(self, workers: int = 2, heartbeat: float = 30.0):
+        self.workers = workers
+        self.heartbeat = heartbeat
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._active: Set[JobEventLog] = set()
+        self._stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> ThreadPoolExecutor:
+        # Created lazily, and again after a fork, since threads do not survive fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+                self._pid = os.getpid()
+                # Jobs of the parent are not ours to keep alive
+                self._active = set()
+                self._stop = threading.Event()
+                self._heartbeat_thread = threading.Thread(target=self._beat, args=(self._stop,),
+                                                          name='job-heartbeat', daemon=True)
+                self._heartbeat_thread.start()
+            return self._executor
+
+    def _beat(self, stop: threading.Event):
+        while not stop.wait(self.heartbeat):
+            with self._lock:
+                logs = list(self._active)
+            for log in logs:
+                log.touch()
+
+    def _finished(self, log: JobEventLog):
+        with self._lock:
+            self._active.discard(log)
+
+    def submit(self, log: JobEventLog, items: Iterable[JobItem], process: Callable[[Any], Dict[str, Any]],
+               files: Optional[List[str]] = None):
+        executor = self._ensure_started()
+        log.append(JOB_QUEUED, {'files': files or []})
+        with self._lock:
+            self._active.add(log)
+        future = executor.submit(run_job, log, items, process, files)
+        future.add_done_callback(lambda _: self._finished(log))
+        return future
+
+    def shutdown(self):
+        """Wait for running and queued jobs"""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+            self._stop.set()
+            self._heartbeat_thread.join()
+            self._executor = None
+            self._pid = None
@@ -0,0 +1,252 @@
+"""OCR backends used by OCREngine, selected per field through settings.OCR_BACKENDS.
+
+- tesseract: general-purpose OCR through pytesseract
+- onnx_digits: a small CRNN-style sequence model for numeric fields (amount, date,
+  MICR digits) run on the CPU with onnxruntime. Crops from concurrent requests are
+  grouped into batches so one model call serves several checks.
+"""
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import pytesseract
+
+from ..config.config import settings
+from ..utils.tracing import span
+from .deadline import current_deadline, exceeded
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime
+except ImportError:  # Optional dependency, only needed for the onnx_digits backend
+    onnxruntime = None
+
+
+class OCRBackend:
+    """Turns a preprocessed field crop into text"""
+
+    name = 'base'
+
+    def recognize(self, image: np.ndarray, field: str, config: Optional[str] = None) -> str:
+        raise NotImplementedError
+
+    def recognize_batch(self, images: List[np.ndarray], field: str, config: Optional[str] = None) -> List[str]:
+        return [self.recognize(image, field, config) for image in images]
+
+    def params(self) -> Dict[str, Any]:
+        """Settings that determine the output, recorded with stored artifacts"""
+        return {'backend': self.name}
+
+    def close(self):
+        pass
+
+
+class TesseractBackend(OCRBackend):
+    """pytesseract with the page segmentation config chosen by OCREngine per field"""
+
+    name = 'tesseract'
+
+    def __init__(self, default_config: str = '--oem 3 --psm 6'):
+        self.default_config = default_config
+
+    def recognize(self, image: np.ndarray, field: str, config: Optional[str] = None) -> str:
+        # The Tesseract process is killed at OCR_TESSERACT_TIMEOUT_S or when the request's
+        # deadline passes, whichever comes first
+        deadline = current_deadline()
+        timeout = deadline.timeout(settings.OCR_TESSERACT_TIMEOUT_S) if deadline else settings.OCR_TESSERACT_TIMEOUT_S
+        if deadline is not None and timeout <= 0:
+            raise exceeded(f'ocr.{field}')
+        with span('tesseract', field=field, **{'image.width': image.shape[1], 'image.height': image.shape[0]}) as current:
+            started = time.perf_counter()
+            try:
+                text = pytesseract.image_to_string(image, config=config or self.default_config, timeout=timeout or 0)
+            except RuntimeError as e:
+                if 'timeout' not in str(e).lower():
+                    raise
+                raise exceeded(f'ocr.{field}') from e
+            current.set_attributes(tesseract_ms=round((time.perf_counter() - started) * 1000, 3),
+                                   text_length=len(text.strip()))
+            return text
+
+
+class _MicroBatcher:
+    """Collect single requests from many threads into batches for one callable.
+
+    A batch is dispatched when it holds max_batch items or when the oldest item has
+    waited max_wait seconds, so an isolated request is delayed by at most max_wait.
+    """
+
+    def __init__(self, run_batch, max_batch: int, max_wait: float):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: 'queue.Queue[Optional[Tuple[Any, Future]]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self):
+        # Started lazily and again after a fork, since threads do not survive fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='ocr-batcher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, item) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _run(self, requests: 'queue.Queue'):
+        while True:
+            first = requests.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    entry = requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    requests.put(None)
+                    break
+                batch.append(entry)
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.run_batch(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+    def close(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def ctc_greedy_decode(logits: np.ndarray, charset: str, blank: int = 0) -> List[str]:
+    """Decode (batch, time, classes) scores: best class per step, merge repeats, drop blanks"""
+    best = logits.argmax(axis=2)
+    texts = []
+    for sequence in best:
+        chars = []
+        previous = blank
+        for index in sequence:
+            if index != blank and index != previous:
+                chars.append(charset[index - 1] if index - 1 < len(charset) else '')
+            previous = index
+        texts.append(''.join(chars))
+    return texts
+
+
+class ONNXDigitBackend(OCRBackend):
+    """CPU sequence recognizer for numeric fields exported to ONNX.
+
+    The model takes (batch, 1, height, width) float32 crops scaled to [0, 1], dark
+    text on white, and returns (batch, time, classes) scores with class 0 as the CTC
+    blank and class i standing for charset[i - 1].
+    """
+
+    name = 'onnx_digits'
+
+    def __init__(self, model_path: str, charset: str, input_height: int = 32, max_width: int = 256,
+                 max_batch: int = 32, max_wait_ms: float = 2.0, threads: int = 1):
+        if onnxruntime is None:
+            raise RuntimeError("onnxruntime is not installed")
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"ONNX model not found: {model_path}")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_path = model_path
+        self.charset = charset
+        self.input_height = input_height
+        self.max_width = max_width
+        self._model_stat = os.stat(model_path)
+        self._batcher = _MicroBatcher(self._run_model, max_batch, max_wait_ms / 1000.0)
+
+    def _normalize(self, image: np.ndarray) -> np.ndarray:
+        if len(image.shape) == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        h, w = image.shape[:2]
+        width = max(1, min(self.max_width, int(round(w * self.input_height / max(h, 1)))))
+        resized = cv2.resize(image, (width, self.input_height), interpolation=cv2.INTER_AREA)
+        return resized.astype(np.float32) / 255.0
+
+    def _run_model(self, images: List[np.ndarray]) -> List[str]:
+        crops = [self._normalize(image) for image in images]
+        # Pad to the widest crop with white so one tensor holds the whole batch
+        width = max(crop.shape[1] for crop in crops)
+        batch = np.ones((len(crops), 1, self.input_height, width), dtype=np.float32)
+        for i, crop in enumerate(crops):
+            batch[i, 0, :, :crop.shape[1]] = crop
+        with span('onnx_digits', batch_size=len(crops), width=width):
+            logits = self.session.run(None, {self.input_name: batch})[0]
+        return ctc_greedy_decode(logits, self.charset)
+
+    def recognize(self, image: np.ndarray, field: str, config: Optional[str] = None) -> str:
+        # Batched with concurrent requests from other threads
+        deadline = current_deadline()
+        if deadline is None:
+            return self._batcher.submit(image).result()
+        deadline.check(f'ocr.{field}')
+        try:
+            return self._batcher.submit(image).result(timeout=deadline.remaining())
+        except FutureTimeout:
+            raise exceeded(f'ocr.{field}')
+
+    def recognize_batch(self, images: List[np.ndarray], field: str, config: Optional[str] = None) -> List[str]:
+        return self._run_model(images) if images else []
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'model': os.path.basename(self.model_path),
+            'model_size': self._model_stat.st_size,
+            'model_mtime': int(self._model_stat.st_mtime),
+            'charset': self.charset,
+            'input_height': self.input_height
+        }
+
+    def close(self):
+        self._batcher.close()
+
+
+def create_backend(name: str) -> OCRBackend:
+    """Build a backend by name from settings"""
+    if name == 'tesseract':
+        return TesseractBackend()
+    if name == 'onnx_digits':
+        return ONNXDigitBackend(
+            settings.OCR_ONNX_MODEL_PATH,
+            settings.OCR_ONNX_CHARSET,
+            input_height=settings.OCR_ONNX_INPUT_HEIGHT,
+            max_batch=settings.OCR_BATCH_SIZE,
+            max_wait_ms=settings.OCR_BATCH_WAIT_MS,
+            threads=settings.OCR_ONNX_THREADS
+        )
+    raise ValueError(f"Unknown OCR backend: {name}")
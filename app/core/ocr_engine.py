@@ -2,25 +2,46 @@ import pytesseract
 import cv2
 import numpy as np
 from typing import Dict, Any, Optional
-import re
 from datetime import datetime
 import os
 import logging
 import sys
 import subprocess
+import time
+from ..config.config import settings
+from .ocr_backends import OCRBackend, TesseractBackend, create_backend
+from .deadline import DeadlineExceeded
+from .field_parser import get_field_parser
 
 logger = logging.getLogger(__name__)
 
 class OCREngine:
-    def __init__(self):
+    def __init__(self, workspace=None):
+        # Optional Workspace/ThreadLocalWorkspace that owns reusable output buffers
+        self.workspace = workspace
+        
         # Set Tesseract path directly since we know it's installed
         pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
         logger.info(f"Using Tesseract from: {pytesseract.pytesseract.tesseract_cmd}")
         
         # OCR Configuration
         self.config = '--oem 3 --psm 6'
-        self.amount_pattern = r'\$?\d{1,3}(?:,\d{3})*(?:\.\d{2})?'
-        self.date_pattern = r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}'
+        self.micr_config = '--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789'
+        # Amount and date conventions (decimal comma, day-first dates) of the branch
+        self.field_parser = get_field_parser(settings.OCR_LOCALE)
+        
+        # Recognizer per field; Tesseract serves every field without another backend
+        # and is the fallback when another backend's text does not parse
+        self.tesseract = TesseractBackend(self.config)
+        self.backends: Dict[str, OCRBackend] = {}
+        for field, name in settings.OCR_BACKENDS.items():
+            if name == 'tesseract':
+                continue
+            try:
+                self.backends[field] = create_backend(name)
+                logger.info(f"Using OCR backend '{name}' for {field}")
+            except Exception as e:
+                logger.warning(f"OCR backend '{name}' for {field} unavailable, using Tesseract: {str(e)}")
         
         # Test OCR functionality
         self._test_ocr()
@@ -42,66 +63,102 @@ class OCREngine:
             logger.error(f"OCR test failed: {str(e)}")
             raise RuntimeError("Failed to perform OCR test. Please check Tesseract installation.")
         
-    def extract_text(self, image: np.ndarray, preprocess: bool = True) -> str:
-        """Extract text from image using Tesseract"""
+    def params(self) -> Dict[str, str]:
+        """Settings that determine the OCR output, recorded with stored artifacts"""
+        return {
+            'config': self.config,
+            'micr_config': self.micr_config,
+            'fields': self.field_parser.params(),
+            'backends': {field: backend.params() for field, backend in sorted(self.backends.items())}
+        }
+        
+    def _dst(self, key: str, shape, dtype=np.uint8) -> Optional[np.ndarray]:
+        """Reusable output buffer from the workspace, or None to let OpenCV allocate"""
+        if self.workspace is None:
+            return None
+        return self.workspace.buffer(f'ocr_engine.{key}', shape, dtype)
+        
+    def _image_to_string(self, image: np.ndarray, config: str, field: str,
+                         backend: Optional[OCRBackend] = None) -> str:
+        """Recognize a field crop with the field's backend (Tesseract by default)"""
+        backend = backend or self.backends.get(field, self.tesseract)
+        return backend.recognize(image, field, config)
+        
+    def _use_fallback(self, field: str) -> bool:
+        return field in self.backends and settings.OCR_FALLBACK_TO_TESSERACT
+        
+    def prepare_crop(self, image: np.ndarray, options: Optional[Dict[str, Any]] = None,
+                     field: str = 'text') -> np.ndarray:
+        """Binarize and denoise a field crop before recognition.
+        
+        options['open'] = False skips the morphological opening (fast profile).
+        Buffers are kept per field, since the amount, date and MICR crops differ in shape.
+        """
+        shape = image.shape[:2]
+        if len(image.shape) == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._dst(f'{field}.gray', shape))
+        else:
+            gray = image
+        thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                               dst=self._dst(f'{field}.thresh', shape))[1]
+        if options is not None and not options.get('open', True):
+            return thresh
+        
+        # Remove noise
+        if self.workspace is not None:
+            kernel = self.workspace.kernel(cv2.MORPH_RECT, (3, 3))
+        else:
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
+        return cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=1,
+                                dst=self._dst(f'{field}.opening', shape))
+        
+    def extract_text(self, image: np.ndarray, preprocess: bool = True, field: str = 'text',
+                     backend: Optional[OCRBackend] = None, options: Optional[Dict[str, Any]] = None) -> str:
+        """Extract text from image with the field's OCR backend"""
         try:
             if preprocess:
                 # Additional preprocessing for better OCR
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-                
-                # Remove noise
-                kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
-                opening = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=1)
-                
-                # Perform OCR on cleaned image
-                text = pytesseract.image_to_string(opening, config=self.config)
-            else:
-                text = pytesseract.image_to_string(image, config=self.config)
+                image = self.prepare_crop(image, options, field)
+            text = self._image_to_string(image, self.config, field, backend)
                 
             logger.debug(f"Extracted text: {text.strip()}")
             return text.strip()
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error in OCR text extraction: {str(e)}")
             raise
             
-    def extract_amount(self, amount_region: np.ndarray) -> float:
+    def extract_amount(self, amount_region: np.ndarray, options: Optional[Dict[str, Any]] = None) -> float:
         """Extract and parse amount from check"""
         try:
-            text = self.extract_text(amount_region)
+            text = self.extract_text(amount_region, field='amount', options=options)
             logger.debug(f"Amount region text: {text}")
             
-            matches = re.findall(self.amount_pattern, text)
-            if matches:
-                # Clean and convert to float
-                amount_str = matches[0].replace('$', '').replace(',', '')
-                try:
-                    return float(amount_str)
-                except ValueError:
-                    logger.error(f"Failed to convert amount: {amount_str}")
-                    return 0.0
-            return 0.0
+            amount = self.field_parser.parse_amount(text)
+            if amount is None and self._use_fallback('amount'):
+                text = self.extract_text(amount_region, field='amount', backend=self.tesseract, options=options)
+                amount = self.field_parser.parse_amount(text)
+            return amount if amount is not None else 0.0
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error extracting amount: {str(e)}")
             return 0.0
         
-    def extract_date(self, date_region: np.ndarray) -> Optional[datetime]:
+    def extract_date(self, date_region: np.ndarray, options: Optional[Dict[str, Any]] = None) -> Optional[datetime]:
         """Extract and parse date from check"""
         try:
-            text = self.extract_text(date_region)
+            text = self.extract_text(date_region, field='date', options=options)
             logger.debug(f"Date region text: {text}")
             
-            matches = re.findall(self.date_pattern, text)
-            if matches:
-                date_str = matches[0]
-                # Try different date formats
-                for fmt in ['%m/%d/%Y', '%m-%d-%Y', '%d/%m/%Y', '%d-%m-%Y',
-                           '%m/%d/%y', '%m-%d-%y', '%d/%m/%y', '%d-%m-%y']:
-                    try:
-                        return datetime.strptime(date_str, fmt)
-                    except ValueError:
-                        continue
-            return None
+            date = self.field_parser.parse_date(text)
+            if date is None and self._use_fallback('date'):
+                text = self.extract_text(date_region, field='date', backend=self.tesseract, options=options)
+                date = self.field_parser.parse_date(text)
+            return date
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error extracting date: {str(e)}")
             return None
@@ -110,12 +167,14 @@ class OCREngine:
         """Extract MICR code components"""
         try:
             # Use specific OCR config for MICR
-            config = '--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789'
-            text = pytesseract.image_to_string(micr_region, config=config)
+            text = self._image_to_string(micr_region, self.micr_config, 'micr')
             logger.debug(f"MICR region text: {text}")
             
             # Clean and parse MICR text
             micr_text = ''.join(filter(str.isdigit, text))
+            if len(micr_text) < 9 and self._use_fallback('micr'):
+                text = self._image_to_string(micr_region, self.micr_config, 'micr', self.tesseract)
+                micr_text = ''.join(filter(str.isdigit, text))
             
             if len(micr_text) >= 9:  # Minimum length for valid MICR
                 return {
@@ -130,6 +189,8 @@ class OCREngine:
                     'account_number': '',
                     'check_number': ''
                 }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error extracting MICR: {str(e)}")
             return {
@@ -0,0 +1,447 @@
+"""Multi-process parsing with images handed off through shared memory.
+
+Decoded images and preprocessed images live in a single shared-memory block managed
+by a ring-buffer allocator owned by the coordinating process. Worker processes only
+receive small SharedArrayRef descriptors (block name, shape, dtype, offset, strides)
+and attach to the block to read or write pixels in place, so no image is ever
+pickled between the decode, preprocess, OCR and scoring stages.
+
+Each check gets a time budget (PARSE_DEADLINE_S) like CheckParser.parse_check.
+Stages of several checks share the worker queue, so only the time a check's own
+stages run is charged to it: decode, preprocess, MICR and scoring in sequence,
+with the amount and date fields read alongside the MICR line. Results carry the
+same field_status and partial flag as the in-process parser.
+"""
+import io
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from ..config.config import settings
+from ..utils.metrics import metrics
+from .deadline import Deadline, deadline_scope
+from .features import CheckFeatures
+
+logger = logging.getLogger(__name__)
+
+OCR_FIELDS = ('amount', 'date', 'micr')
+
+# Stages that run one after another for a check; their run times add up against its budget
+SEQUENTIAL_STAGES = ('decode', 'preprocess', 'micr', 'score')
+
+
+class SharedArrayRef(NamedTuple):
+    """Descriptor of an array stored in a shared-memory block"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+    offset: int
+    strides: Optional[Tuple[int, ...]] = None
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+    def crop(self, top: int, bottom: int, left: int, right: int) -> 'SharedArrayRef':
+        """Descriptor of a 2-D sub-region, sharing the parent's memory"""
+        strides = self.strides or _contiguous_strides(self.shape, self.dtype)
+        return SharedArrayRef(
+            name=self.name,
+            shape=(bottom - top, right - left) + tuple(self.shape[2:]),
+            dtype=self.dtype,
+            offset=self.offset + top * strides[0] + left * strides[1],
+            strides=strides
+        )
+
+
+class BufferFull(Exception):
+    """Raised when the ring buffer has no room for an allocation"""
+    pass
+
+
+def _contiguous_strides(shape: Tuple[int, ...], dtype: str) -> Tuple[int, ...]:
+    strides = []
+    step = np.dtype(dtype).itemsize
+    for size in reversed(shape):
+        strides.append(step)
+        step *= size
+    return tuple(reversed(strides))
+
+
+class SharedRingBuffer:
+    """Ring-buffer allocator over one shared-memory block.
+
+    Allocations are carved from the head of the ring and space is reclaimed from the
+    tail once the oldest allocation is released, so releases may happen in any order
+    but memory is only reused in allocation order. Only the owning process may
+    allocate or release; other processes attach through the descriptors.
+    """
+
+    ALIGNMENT = 64
+
+    def __init__(self, capacity: int):
+        self.shm = shared_memory.SharedMemory(create=True, size=capacity)
+        self.name = self.shm.name
+        self.capacity = capacity
+        # offset -> [size, released], in allocation (ring) order
+        self._allocations: 'OrderedDict[int, List]' = OrderedDict()
+        self._head = 0
+        self._tail = 0
+        self.used_bytes = 0
+        self.peak_bytes = 0
+        logger.debug(f"Created shared ring buffer {self.name} ({capacity} bytes)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def live_allocations(self) -> int:
+        return sum(1 for _, released in self._allocations.values() if not released)
+
+    def _find_space(self, size: int) -> Optional[int]:
+        if not self._allocations:
+            self._head = self._tail = 0
+            return 0
+        if self._head > self._tail:
+            # Free space is [head, capacity) followed by [0, tail)
+            if self._head + size <= self.capacity:
+                return self._head
+            if size <= self._tail:
+                return 0
+        elif self._head < self._tail:
+            # Wrapped: free space is [head, tail)
+            if self._head + size <= self._tail:
+                return self._head
+        return None
+
+    def allocate(self, shape: Tuple[int, ...], dtype: str = 'uint8') -> SharedArrayRef:
+        """Reserve space for an array, raising BufferFull if the ring has no room"""
+        shape = tuple(int(dim) for dim in shape)
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        size = max(-(-nbytes // self.ALIGNMENT) * self.ALIGNMENT, self.ALIGNMENT)
+        if size > self.capacity:
+            raise ValueError(f"Array of {nbytes} bytes exceeds shared buffer capacity of {self.capacity} bytes")
+
+        offset = self._find_space(size)
+        if offset is None:
+            raise BufferFull(f"No room for {nbytes} bytes ({self.used_bytes}/{self.capacity} bytes in use)")
+
+        self._allocations[offset] = [size, False]
+        self._head = offset + size
+        self.used_bytes += size
+        self.peak_bytes = max(self.peak_bytes, self.used_bytes)
+        return SharedArrayRef(self.name, shape, np.dtype(dtype).str, offset)
+
+    def release(self, ref: SharedArrayRef):
+        """Release an allocation; its space is reclaimed once all older ones are released"""
+        allocation = self._allocations.get(ref.offset)
+        if allocation is None or allocation[1]:
+            raise ValueError(f"Allocation at offset {ref.offset} is not live")
+        allocation[1] = True
+
+        while self._allocations:
+            offset, (size, released) = next(iter(self._allocations.items()))
+            if not released:
+                self._tail = offset
+                break
+            del self._allocations[offset]
+            self.used_bytes -= size
+        if not self._allocations:
+            self._head = self._tail = 0
+
+    def view(self, ref: SharedArrayRef) -> np.ndarray:
+        """Array view of an allocation in the owning process"""
+        return np.ndarray(ref.shape, dtype=ref.dtype, buffer=self.shm.buf,
+                          offset=ref.offset, strides=ref.strides)
+
+    def close(self):
+        """Free the shared-memory block; all views must have been dropped"""
+        if self.shm is None:
+            return
+        if self.live_allocations:
+            logger.warning(f"Closing shared ring buffer {self.name} with "
+                           f"{self.live_allocations} live allocations")
+        try:
+            self.shm.close()
+        except BufferError:
+            logger.warning(f"Views of shared ring buffer {self.name} are still referenced")
+        self.shm.unlink()
+        self.shm = None
+
+
+# Blocks attached by this process, keyed by name
+_attached_blocks: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    block = _attached_blocks.get(name)
+    if block is None:
+        # Pool workers share the owner's resource tracker, so attaching does not
+        # add a second registration and the owner's unlink stays authoritative
+        block = shared_memory.SharedMemory(name=name)
+        _attached_blocks[name] = block
+    return block
+
+
+def attach_array(ref: SharedArrayRef) -> np.ndarray:
+    """Array view of a shared allocation from any process"""
+    block = _attach_block(ref.name)
+    return np.ndarray(ref.shape, dtype=ref.dtype, buffer=block.buf,
+                      offset=ref.offset, strides=ref.strides)
+
+
+# Parser components owned by each worker process, created once by _init_worker
+_worker_parser = None
+
+
+def _init_worker():
+    global _worker_parser
+    from .check_parser import CheckParser
+    from .workspace import Workspace
+    _worker_parser = CheckParser(workspace=Workspace() if settings.IMAGE_WORKSPACE_ENABLED else None)
+
+
+def _region_array(ref: SharedArrayRef) -> np.ndarray:
+    if int(np.prod(ref.shape)) == 0:
+        logger.warning("Empty region extracted")
+        return np.zeros((100, 100), dtype=np.uint8)
+    return attach_array(ref)
+
+
+def _decode_stage(image_data: bytes, image_ref: SharedArrayRef) -> Optional[Tuple[int, ...]]:
+    """Decode into the shared image slot; returns the real shape if the slot does not fit"""
+    image = _worker_parser.decode_image(image_data)
+    if image.shape != tuple(image_ref.shape):
+        return image.shape
+    np.copyto(attach_array(image_ref), image)
+    return None
+
+
+def _preprocess_stage(image_ref: SharedArrayRef, processed_ref: SharedArrayRef,
+                      profile: Optional[str] = None) -> Tuple[Dict[str, Tuple[int, int, int, int]], str]:
+    """Preprocess the shared image into the shared processed slot.
+
+    Scans failing the quality gate raise ImageQualityError, as in
+    CheckParser.parse_image. Returns the region boxes and the name of the
+    processing profile used.
+    """
+    image = attach_array(image_ref)
+    quality = _worker_parser.check_quality(image) if settings.QUALITY_GATE_ENABLED else None
+    profile, options = _worker_parser.resolve_profile(profile, image, quality)
+    processed = _worker_parser.image_processor.preprocess_image(image, options.get('image'))
+    if processed.ndim == 3:
+        # Preprocessing fell back to the original image
+        processed = cv2.cvtColor(processed, cv2.COLOR_BGR2GRAY)
+    np.copyto(attach_array(processed_ref), processed)
+    height, width = processed_ref.shape[:2]
+    return _worker_parser.image_processor.region_boxes(height, width), profile
+
+
+def _run_stage(budget: Optional[float], fn, *args) -> Tuple[Any, float]:
+    """Run a stage under a deadline of budget seconds (None for no limit).
+
+    Returns the stage's result and how long it ran.
+    """
+    started = time.monotonic()
+    with deadline_scope(Deadline(budget) if budget is not None else None):
+        result = fn(*args)
+    return result, time.monotonic() - started
+
+
+def _ocr_stage(field: str, region_ref: SharedArrayRef, profile: str) -> Tuple[Any, str]:
+    """Value and status code of one field"""
+    options = settings.PROCESSING_PROFILES[profile].get('ocr')
+    return _worker_parser.read_field(field, _region_array(region_ref), options)
+
+
+def _score_stage(image_ref: SharedArrayRef, region_refs: Dict[str, SharedArrayRef],
+                 account_number: str) -> Tuple[bool, Dict[str, float], Dict[str, str]]:
+    """Fraud decision, signature analysis and their status codes"""
+    image = attach_array(image_ref)
+    regions = {name: _region_array(ref) for name, ref in region_refs.items()}
+    status: Dict[str, str] = {}
+    is_fraudulent, _, signature_analysis = _worker_parser.run_checks(
+        image, regions['signature'], account_number, CheckFeatures(image, regions), status)
+    return is_fraudulent, signature_analysis, status
+
+
+class _Job:
+    """Coordinator-side state of one check moving through the pipeline"""
+
+    def __init__(self, key: Any, image_data: bytes):
+        self.key = key
+        self.image_data = image_data
+        self.refs: List[SharedArrayRef] = []
+        self.regions: Dict[str, SharedArrayRef] = {}
+        self.results: Dict[str, Any] = {}
+        self.profile: Optional[str] = None
+        self.status: Dict[str, str] = {}
+        # Seconds its sequential stages have run, charged against the time budget
+        self.spent = 0.0
+        self.pending = 0
+        self.error: Optional[str] = None
+
+
+class SharedMemoryPipeline:
+    """Parse checks across worker processes, passing only shared-memory descriptors"""
+
+    def __init__(self, workers: int = 0, buffer_bytes: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, profile: Optional[str] = None,
+                 budget: Optional[float] = None):
+        self.workers = workers or settings.INGEST_WORKERS or 1
+        self.buffer = SharedRingBuffer(buffer_bytes or settings.SHARED_MEMORY_BUFFER_MB * 1024 * 1024)
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.profile = profile
+        # Seconds of work per check (PARSE_DEADLINE_S by default); None disables the deadline
+        budget = settings.PARSE_DEADLINE_S if budget is None else budget
+        self.budget = budget if budget > 0 else None
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.buffer.close()
+
+    def _probe_shape(self, image_data: bytes) -> Tuple[int, int]:
+        """Read image dimensions from the header without decoding pixels"""
+        with Image.open(io.BytesIO(image_data)) as image:
+            width, height = image.size
+        return height, width
+
+    def _allocate(self, job: _Job, shape: Tuple[int, int]):
+        height, width = shape
+        image_ref = self.buffer.allocate((height, width, 3))
+        try:
+            processed_ref = self.buffer.allocate((height, width))
+        except Exception:
+            self.buffer.release(image_ref)
+            raise
+        job.refs = [image_ref, processed_ref]
+
+    def _release(self, job: _Job):
+        for ref in job.refs:
+            self.buffer.release(ref)
+        job.refs = []
+
+    def parse_many(self, items: Iterable[Tuple[Any, bytes]]
+                   ) -> Iterator[Tuple[Any, Optional[Dict[str, Any]], Optional[str]]]:
+        """Parse (key, image bytes) pairs, yielding (key, check_data, error) as checks finish"""
+        from .check_parser import STATUS_STAGES, CheckParser, incomplete_stages
+
+        items = iter(items)
+        waiting: Optional[_Job] = None
+        active: Dict[Any, _Job] = {}
+        futures: Dict[Any, Tuple[_Job, str]] = {}
+        exhausted = False
+
+        def submit(job: _Job, stage: str, fn, *args):
+            budget = None if self.budget is None else max(0.0, self.budget - job.spent)
+            futures[self.executor.submit(_run_stage, budget, fn, *args)] = (job, stage)
+            job.pending += 1
+
+        def fail(job: _Job, error: str):
+            job.error = job.error or error
+
+        while True:
+            # Admit new checks while there is room in the buffer
+            while not exhausted and len(active) < self.max_in_flight:
+                if waiting is None:
+                    try:
+                        waiting = _Job(*next(items))
+                    except StopIteration:
+                        exhausted = True
+                        break
+                job = waiting
+                try:
+                    self._allocate(job, self._probe_shape(job.image_data))
+                except BufferFull:
+                    if active:
+                        break
+                    waiting = None
+                    yield job.key, None, "Image does not fit in the shared buffer"
+                    continue
+                except Exception as e:
+                    waiting = None
+                    yield job.key, None, f"Failed to decode image: {str(e)}"
+                    continue
+                waiting = None
+                active[id(job)] = job
+                submit(job, 'decode', _decode_stage, job.image_data, job.refs[0])
+
+            if not futures:
+                return
+
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                job, stage = futures.pop(future)
+                job.pending -= 1
+                try:
+                    result, elapsed = future.result()
+                    if stage in SEQUENTIAL_STAGES:
+                        job.spent += elapsed
+                except Exception as e:
+                    fail(job, str(e))
+                    result = None
+
+                if job.error is None:
+                    image_ref, processed_ref = job.refs
+                    if stage == 'decode' and result is not None:
+                        # EXIF orientation changed the shape; retry with the decoded one
+                        self._release(job)
+                        try:
+                            self._allocate(job, tuple(result[:2]))
+                            submit(job, 'decode', _decode_stage, job.image_data, job.refs[0])
+                        except Exception as e:
+                            fail(job, str(e))
+                    elif stage == 'decode':
+                        job.image_data = None
+                        submit(job, 'preprocess', _preprocess_stage, image_ref, processed_ref, self.profile)
+                    elif stage == 'preprocess':
+                        boxes, job.profile = result
+                        job.regions = {name: processed_ref.crop(*box) for name, box in boxes.items()}
+                        for field in OCR_FIELDS:
+                            submit(job, field, _ocr_stage, field, job.regions[field], job.profile)
+                    elif stage == 'score':
+                        is_fraudulent, signature_analysis, status = result
+                        job.results['score'] = (is_fraudulent, signature_analysis)
+                        job.status.update(status)
+                    else:
+                        job.results[stage], job.status[stage] = result
+                        if stage == 'micr':
+                            # Signatures are verified against the account read from the MICR line
+                            submit(job, 'score', _score_stage, image_ref, job.regions,
+                                   job.results['micr']['account_number'])
+
+                if job.pending == 0:
+                    self._release(job)
+                    del active[id(job)]
+                    if job.error is not None:
+                        yield job.key, None, job.error
+                    else:
+                        is_fraudulent, signature_analysis = job.results['score']
+                        check_data = CheckParser.build_result(
+                            job.results['amount'], job.results['date'], job.results['micr'],
+                            is_fraudulent, signature_analysis
+                        )
+                        status = {name: job.status[name] for name in STATUS_STAGES}
+                        check_data['processing_profile'] = job.profile
+                        check_data['field_status'] = status
+                        check_data['partial'] = bool(incomplete_stages(status))
+                        if check_data['partial']:
+                            metrics.increment('partial_results_total')
+                        yield job.key, check_data, None
@@ -0,0 +1,257 @@
+import os
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locking, a single writer is assumed
+    fcntl = None
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Normalized signature size (height, width) before feature extraction
+NORMALIZED_SIZE = (32, 96)
+ORIENTATION_BINS = 8
+GRID = (2, 4)  # Cells (rows, columns) for the gradient orientation histograms
+FEATURE_DIM = NORMALIZED_SIZE[0] + NORMALIZED_SIZE[1] // 2 + GRID[0] * GRID[1] * ORIENTATION_BINS + 2
+
+# Match confidence above which a signature counts as verified
+SIGNATURE_VERIFIED_THRESHOLD = 0.7
+
+# Distance between unit feature vectors that scores exactly SIGNATURE_VERIFIED_THRESHOLD.
+# Rescans and redraws of one signature lie within about 0.15 of each other, while
+# different signatures start around 0.45, so a match must be well inside that gap.
+SIGNATURE_MATCH_DISTANCE = 0.3
+# With several references the scale follows their spread (the farthest any
+# reference is from its nearest neighbour, times a margin), within these bounds
+MATCH_DISTANCE_RANGE = (0.2, 0.35)
+MATCH_SPREAD_MARGIN = 1.5
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def match_distance(references: np.ndarray) -> float:
+    """Distance scale of an account: the default, or one derived from its references' spread"""
+    if len(references) < 2:
+        return SIGNATURE_MATCH_DISTANCE
+    pairwise = np.sqrt(np.square(references[:, None, :] - references[None, :, :]).sum(axis=2))
+    np.fill_diagonal(pairwise, np.inf)
+    spread = float(pairwise.min(axis=1).max())
+    low, high = MATCH_DISTANCE_RANGE
+    return min(high, max(low, spread * MATCH_SPREAD_MARGIN))
+
+
+def distance_confidence(distance: float, scale: float) -> float:
+    """Confidence in (0, 1]: 1 for identical vectors, SIGNATURE_VERIFIED_THRESHOLD at the scale"""
+    return float(SIGNATURE_VERIFIED_THRESHOLD ** ((distance / scale) ** 2))
+
+
+def extract_signature_features(signature_region: np.ndarray, ink: Optional[np.ndarray] = None) -> np.ndarray:
+    """Compact, fixed-length feature vector of a signature crop.
+
+    The ink is cropped to its bounding box and resized to a fixed size, then
+    described by row and column projection histograms, a grid of gradient
+    orientation histograms (HOG-style) and the ink aspect ratio and density.
+    Returns a unit-length float32 vector of FEATURE_DIM values, or zeros if the
+    crop holds no ink. An ink mask already computed for the crop (255 on ink,
+    see CheckFeatures.region_ink) can be passed to skip thresholding.
+    """
+    if ink is None:
+        if len(signature_region.shape) == 3:
+            signature_region = cv2.cvtColor(signature_region, cv2.COLOR_BGR2GRAY)
+        # Ink becomes 255 on a 0 background
+        ink = cv2.threshold(signature_region, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return np.zeros(FEATURE_DIM, dtype=np.float32)
+    x, y, w, h = cv2.boundingRect(points)
+
+    height, width = NORMALIZED_SIZE
+    normalized = cv2.resize(ink[y:y + h, x:x + w], (width, height),
+                            interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+    # Projection histograms (columns pooled in pairs)
+    row_profile = _normalize(normalized.sum(axis=1))
+    column_profile = _normalize(normalized.sum(axis=0).reshape(-1, 2).sum(axis=1))
+
+    # Gradient orientation histograms per grid cell, weighted by magnitude
+    gx = cv2.Sobel(normalized, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(normalized, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude, angle = cv2.cartToPolar(gx, gy)
+    bins = (np.mod(angle, np.pi) / np.pi * ORIENTATION_BINS).astype(np.int32) % ORIENTATION_BINS
+    cell_h, cell_w = height // GRID[0], width // GRID[1]
+    cells = []
+    for row in range(GRID[0]):
+        for column in range(GRID[1]):
+            window = (slice(row * cell_h, (row + 1) * cell_h), slice(column * cell_w, (column + 1) * cell_w))
+            cells.append(np.bincount(bins[window].ravel(), weights=magnitude[window].ravel(),
+                                     minlength=ORIENTATION_BINS))
+    orientation = _normalize(np.concatenate(cells))
+
+    shape = np.array([np.log(w / float(h)), normalized.mean()], dtype=np.float32)
+
+    features = np.concatenate([row_profile, column_profile, orientation, shape]).astype(np.float32)
+    return _normalize(features)
+
+
+class SignatureIndex:
+    """Reference signature vectors per account, stored in memory-mapped files.
+
+    Vectors are appended to a flat float32 file that readers map with np.memmap,
+    alongside a text file naming the account and vector row of each reference, so
+    enrolling a signature is an append and lookups never load the whole store.
+    Every server worker may enroll: appends hold an exclusive flock on the index
+    and take their row from the size of the vectors file at write time.
+    """
+
+    VECTORS_FILE = 'vectors.f32'
+    ACCOUNTS_FILE = 'accounts.txt'
+    LOCK_FILE = 'index.lock'
+    ROW_BYTES = FEATURE_DIM * 4
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.vectors_path = os.path.join(path, self.VECTORS_FILE)
+        self.accounts_path = os.path.join(path, self.ACCOUNTS_FILE)
+        self.lock_path = os.path.join(path, self.LOCK_FILE)
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[int]] = {}
+        self._count = 0  # References (account lines) read so far
+        self._row_count = 0  # Vector rows those references span
+        self._accounts_offset = 0
+        self._rows_recorded = False  # Lines carry their row (older indexes use the line number)
+        self._vectors: Optional[np.ndarray] = None
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """flock on the index, shared by readers and exclusive for appends"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Pick up rows appended since the last refresh, possibly by another process"""
+        if not os.path.exists(self.accounts_path) or os.path.getsize(self.accounts_path) == self._accounts_offset:
+            return
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        if not os.path.exists(self.accounts_path):
+            return
+        with open(self.accounts_path, 'rb') as f:
+            f.seek(self._accounts_offset)
+            data = f.read()
+        # Ignore a trailing line still being written
+        complete = data[:data.rfind(b'\n') + 1]
+        for line in complete.decode('utf-8').splitlines():
+            account, separator, row = line.rpartition('\t')
+            if separator:
+                self._rows_recorded = True
+            elif self._rows_recorded:
+                row = ''  # Unfinished line of a writer that died
+            else:
+                # Indexes written before rows were recorded: the line number is the row
+                account, row = line, str(self._count)
+            if not account or not row.isdigit():
+                logger.warning(f"Skipping a malformed line in {self.accounts_path}: {line!r}")
+                continue
+            row = int(row)
+            self._rows.setdefault(account, []).append(row)
+            self._count += 1
+            self._row_count = max(self._row_count, row + 1)
+        self._accounts_offset += len(complete)
+        self._vectors = None
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None:
+            size = os.path.getsize(self.vectors_path)
+            if size % self.ROW_BYTES:
+                logger.warning(f"Ignoring a partial vector at the end of {self.vectors_path}")
+            if size // self.ROW_BYTES < self._row_count:
+                raise ValueError(f"Signature index {self.path} is corrupt: "
+                                 f"{self._row_count} rows referenced, {size // self.ROW_BYTES} stored")
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                      shape=(self._row_count, FEATURE_DIM))
+        return self._vectors
+
+    def add(self, account_number: str, features: np.ndarray) -> int:
+        """Enroll a reference vector for an account and return its reference count"""
+        account_number = account_number.strip()
+        if not account_number or '\n' in account_number or '\t' in account_number:
+            raise ValueError("Invalid account number")
+        features = np.asarray(features, dtype=np.float32)
+        if features.shape != (FEATURE_DIM,):
+            raise ValueError(f"Expected a feature vector of length {FEATURE_DIM}")
+
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_locked()
+            with open(self.vectors_path, 'ab') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size % self.ROW_BYTES:
+                    # A writer died mid-vector; no account line refers to the torn tail
+                    logger.warning(f"Truncating a partial vector at the end of {self.vectors_path}")
+                    size -= size % self.ROW_BYTES
+                    f.truncate(size)
+                row = size // self.ROW_BYTES
+                # The vector is written before its account line, so readers never see
+                # an account row without its data
+                f.write(features.tobytes())
+            with open(self.accounts_path, 'ab+') as f:
+                line = f"{account_number}\t{row}\n".encode('utf-8')
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        # Terminate a line left unfinished by a writer that died
+                        line = b'\n' + line
+                f.write(line)
+            self._refresh_locked()
+            return len(self._rows[account_number])
+
+    def references(self, account_number: str) -> np.ndarray:
+        """Reference vectors enrolled for an account"""
+        rows = self._rows.get(account_number)
+        if not rows:
+            return np.empty((0, FEATURE_DIM), dtype=np.float32)
+        with self._lock:
+            return np.asarray(self._matrix()[rows])
+
+    def verify(self, account_number: str, features: np.ndarray) -> Dict[str, float]:
+        """Compare a signature against the account's references"""
+        if not account_number:
+            return {'confidence': 0.0, 'consistency_score': 0.0, 'distance': None, 'references': 0}
+        self.refresh()
+        references = self.references(account_number)
+        if len(references) == 0 or not np.any(features):
+            return {'confidence': 0.0, 'consistency_score': 0.0, 'distance': None,
+                    'references': len(references)}
+
+        distances = np.sqrt(np.square(references - features).sum(axis=1))
+        best = float(distances.min())
+        scale = match_distance(references)
+        return {
+            'confidence': distance_confidence(best, scale),
+            'consistency_score': distance_confidence(float(distances.mean()), scale),
+            'distance': best,
+            'match_distance': scale,
+            'references': len(references)
+        }
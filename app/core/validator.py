@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import re
+from .features import CheckFeatures
+from ..config.config import settings
 
 class CheckValidator:
     def __init__(self):
@@ -10,15 +12,27 @@ class CheckValidator:
             'micr': self._validate_micr,
             'signature': self._validate_signature
         }
+        # Rules on the check image, run when its features are available
+        self.image_rules = {
+            'signature_present': self._validate_signature_present,
+            'micr_present': self._validate_micr_present
+        }
         
-    def validate_check(self, check_data: Dict[str, Any]) -> Tuple[bool, List[str]]:
-        """Validate all check data"""
+    def validate_check(self, check_data: Dict[str, Any],
+                       features: Optional[CheckFeatures] = None) -> Tuple[bool, List[str]]:
+        """Validate all check data, and the check image if its features are given"""
         errors = []
         
         for field, validator in self.validation_rules.items():
             is_valid, error = validator(check_data)
             if not is_valid:
                 errors.append(error)
+        
+        if features is not None:
+            for rule, validator in self.image_rules.items():
+                is_valid, error = validator(features)
+                if not is_valid:
+                    errors.append(error)
                 
         return len(errors) == 0, errors
         
@@ -86,4 +100,16 @@ class CheckValidator:
         if not signature_verified:
             return False, "Signature verification failed"
             
-        return True, "" 
\ No newline at end of file
+        return True, "" 
+        
+    def _validate_signature_present(self, features: CheckFeatures) -> Tuple[bool, str]:
+        """Check that the signature line carries ink"""
+        if features.region_stats('signature')['ink_ratio'] < settings.VALIDATION_MIN_SIGNATURE_INK:
+            return False, "Signature is missing"
+        return True, ""
+        
+    def _validate_micr_present(self, features: CheckFeatures) -> Tuple[bool, str]:
+        """Check that the MICR band carries ink"""
+        if features.region_stats('micr')['ink_ratio'] < settings.VALIDATION_MIN_MICR_INK:
+            return False, "MICR line is missing"
+        return True, ""
@@ -0,0 +1,130 @@
+import threading
+import logging
+import weakref
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Workspace statistics exported as gauges by register_workspace_metrics
+WORKSPACE_METRICS = {
+    'allocated_bytes': "Bytes held in reusable image buffers",
+    'peak_bytes': "Peak bytes held in reusable image buffers",
+    'allocations': "Image buffer (re)allocations",
+    'reuses': "Image buffer requests served without allocating"
+}
+
+
+class Workspace:
+    """Reusable output buffers and OpenCV objects for one thread.
+
+    Buffers are keyed by name and reallocated only when the requested shape or dtype
+    changes, so steady-state parsing of same-sized scans performs no large allocations.
+    Arrays handed out by a workspace are overwritten by the next call that uses the
+    same key, so results must be consumed or copied before then. A Workspace must not
+    be shared between threads; use ThreadLocalWorkspace for that.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[str, np.ndarray] = {}
+        self._clahe: Dict[Tuple[float, Tuple[int, int]], Any] = {}
+        self._kernels: Dict[Tuple[int, Tuple[int, int]], np.ndarray] = {}
+        self.allocated_bytes = 0
+        self.peak_bytes = 0
+        self.allocations = 0
+        self.reuses = 0
+
+    def buffer(self, key: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Preallocated array for the given key, shape and dtype"""
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        buf = self._buffers.get(key)
+        if buf is not None and buf.shape == shape and buf.dtype == dtype:
+            self.reuses += 1
+            return buf
+
+        if buf is not None:
+            self.allocated_bytes -= buf.nbytes
+        buf = np.empty(shape, dtype=dtype)
+        self._buffers[key] = buf
+        self.allocations += 1
+        self.allocated_bytes += buf.nbytes
+        self.peak_bytes = max(self.peak_bytes, self.allocated_bytes)
+        return buf
+
+    def clahe(self, clip_limit: float = 2.0, tile_grid_size: Tuple[int, int] = (8, 8)):
+        """Cached CLAHE object"""
+        key = (clip_limit, tuple(tile_grid_size))
+        clahe = self._clahe.get(key)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size))
+            self._clahe[key] = clahe
+        return clahe
+
+    def kernel(self, shape: int, size: Tuple[int, int]) -> np.ndarray:
+        """Cached morphology structuring element"""
+        key = (shape, tuple(size))
+        kernel = self._kernels.get(key)
+        if kernel is None:
+            kernel = cv2.getStructuringElement(shape, tuple(size))
+            self._kernels[key] = kernel
+        return kernel
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'allocated_bytes': self.allocated_bytes,
+            'peak_bytes': self.peak_bytes,
+            'allocations': self.allocations,
+            'reuses': self.reuses
+        }
+
+
+class ThreadLocalWorkspace:
+    """Workspace facade that gives every thread its own Workspace.
+
+    A thread's workspace is owned by its thread-local storage only, so its buffers
+    are freed when the thread ends (threaded dev server, per-sheet thread pools).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._workspaces: "weakref.WeakSet[Workspace]" = weakref.WeakSet()
+
+    def _get(self) -> Workspace:
+        workspace = getattr(self._local, 'workspace', None)
+        if workspace is None:
+            workspace = Workspace()
+            self._local.workspace = workspace
+            with self._lock:
+                self._workspaces.add(workspace)
+        return workspace
+
+    def buffer(self, key: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        return self._get().buffer(key, shape, dtype)
+
+    def clahe(self, clip_limit: float = 2.0, tile_grid_size: Tuple[int, int] = (8, 8)):
+        return self._get().clahe(clip_limit, tile_grid_size)
+
+    def kernel(self, shape: int, size: Tuple[int, int]) -> np.ndarray:
+        return self._get().kernel(shape, size)
+
+    def stats(self) -> Dict[str, int]:
+        """Totals across the threads that are still alive"""
+        with self._lock:
+            workspaces = list(self._workspaces)
+        totals = {'allocated_bytes': 0, 'peak_bytes': 0, 'allocations': 0, 'reuses': 0, 'threads': len(workspaces)}
+        for workspace in workspaces:
+            for key, value in workspace.stats().items():
+                totals[key] += value
+        return totals
+
+
+def register_workspace_metrics(workspace, registry=None):
+    """Export a workspace's stats() as image_workspace_* gauges"""
+    if registry is None:
+        from ..utils.metrics import metrics as registry
+    for key, help_text in WORKSPACE_METRICS.items():
+        registry.gauge(f'image_workspace_{key}', help_text, lambda key=key: workspace.stats()[key])
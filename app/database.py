@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 import os
@@ -36,11 +36,27 @@ try:
             logger.info("Creating database tables...")
             import app.models.check  # Import models
             Base.metadata.create_all(bind=engine)
+            add_missing_columns()
             logger.info("Database tables created successfully")
         except Exception as e:
             logger.error(f"Failed to create database tables: {str(e)}")
             raise
 
+    def add_missing_columns():
+        """Add nullable columns that newer models define to tables created by older versions"""
+        inspector = inspect(engine)
+        with engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing or not column.nullable:
+                        continue
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                    logger.info(f"Added column {table.name}.{column.name}")
+
     def get_db():
         """Get database session"""
         db = SessionLocal()
@@ -0,0 +1,40 @@
+from flask import Flask, g, request
+import logging
+from ..utils.tracing import configure_tracing, parse_traceparent, tracer
+
+logger = logging.getLogger(__name__)
+
+def init_tracing(app: Flask, settings) -> None:
+    """Open a root span for every request and return its trace id in X-Trace-Id"""
+    configure_tracing(settings)
+    
+    @app.before_request
+    def start_request_span():
+        incoming = parse_traceparent(request.headers.get('traceparent'))
+        trace_id, parent_id, sampled = incoming if incoming else (None, None, None)
+        g.trace_span, g.trace_token = tracer.start_span(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            trace_id=trace_id,
+            parent_id=parent_id,
+            # An incoming traceparent carries the caller's sampling decision
+            sampled=sampled,
+            **{'http.method': request.method, 'http.target': request.path,
+               'http.request_content_length': request.content_length or 0}
+        )
+    
+    @app.after_request
+    def finish_request_span(response):
+        span = g.get('trace_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            response.headers['X-Trace-Id'] = span.trace_id
+        return response
+    
+    @app.teardown_request
+    def end_request_span(error=None):
+        span = g.pop('trace_span', None)
+        token = g.pop('trace_token', None)
+        if span is not None:
+            if error is not None:
+                span.record_error(error)
+            tracer.end_span(span, token)
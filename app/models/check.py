@@ -1,4 +1,5 @@
 from datetime import datetime
+import json
 import uuid
 from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
 from sqlalchemy.ext.declarative import declarative_base
@@ -15,7 +16,12 @@ class Check(Base):
     account_number = Column(String(50))
     signature_verified = Column(Boolean, default=False)
     fraud_detected = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Bumped on every ORM update; cached lookups compare it to detect changes from other processes
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when a field timed out or an optional stage was skipped; reprocessing completes such checks
+    partial = Column(Boolean, default=False)
+    field_status = Column(String(200))  # JSON object of status code per field and stage
     
     def __init__(self, **kwargs):
         # Generate a random check number if none is provided or if it's empty
@@ -34,5 +40,7 @@ class Check(Base):
             'account_number': str(self.account_number) if self.account_number else '',
             'signature_verified': bool(self.signature_verified),
             'fraud_detected': bool(self.fraud_detected),
+            'partial': bool(self.partial),
+            'field_status': json.loads(self.field_status) if self.field_status else {},
             'created_at': self.created_at.isoformat() if self.created_at else None
         } 
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""Preforking production server.
+
+The master process builds the Flask app once, which loads the OCR engine, check
+parser and signature index, then forks SERVER_WORKERS workers that share that
+state copy-on-write and accept connections from one listening socket. Each
+worker warms up on a synthetic check before serving, handles requests on a pool
+of SERVER_THREADS threads, and retires after SERVER_MAX_REQUESTS requests: it
+tells the master, which forks its replacement at once, then finishes its requests
+and batch jobs in flight before exiting.
+"""
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from .config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # One request per connection, so idle keep-alive clients cannot pin worker threads
+    protocol_version = 'HTTP/1.0'
+
+
+class WorkerServer(BaseWSGIServer):
+    """WSGI server on an inherited listening socket, handling requests on a thread pool"""
+
+    multithread = True
+
+    def __init__(self, app, sock: socket.socket, threads: int):
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, app, handler=_RequestHandler, fd=sock.fileno())
+        # Several workers accept from the same socket; losing the race must not block
+        self.socket.setblocking(False)
+        self.timeout = 1.0
+        self.handled = 0
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        # One slot per request thread; a connection is accepted only once a slot is free
+        self._slots = threading.BoundedSemaphore(threads)
+        self._dispatched = False
+
+    def _handle_request_noblock(self):
+        # While every thread is busy, connections wait in the listen backlog, where
+        # other workers can still accept them, instead of queueing in this process
+        if not self._slots.acquire(timeout=self.timeout):
+            return
+        self._dispatched = False
+        try:
+            super()._handle_request_noblock()
+        finally:
+            if not self._dispatched:
+                self._slots.release()
+
+    def process_request(self, request, client_address):
+        self.handled += 1
+        self._dispatched = True
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def drain(self):
+        """Wait for requests in flight"""
+        self._pool.shutdown(wait=True)
+
+
+def warm_up(check_parser) -> float:
+    """Parse a synthetic check so first requests do not pay for lazy initialization"""
+    from .utils.synthetic import make_check_file
+
+    started = time.monotonic()
+    try:
+        _, image_data = make_check_file('clean', seed=0)
+        check_parser.parse_check(image_data)
+    except Exception as e:
+        logger.warning(f"Worker warm-up failed: {str(e)}")
+    return time.monotonic() - started
+
+
+class PreforkServer:
+    """Master process that forks, monitors and recycles workers"""
+
+    def __init__(self, app, host: str, port: int, workers: int, threads: int,
+                 max_requests: int = 0, max_requests_jitter: int = 0, warmup: bool = True):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = max(1, threads)
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.warmup = warmup
+        self.children: Dict[int, int] = {}  # pid -> worker number
+        self.retiring: Dict[int, int] = {}  # Replaced workers still finishing their work
+        self.stopping = False
+        self.socket: Optional[socket.socket] = None
+        # Retiring workers write their pid here; small writes to a pipe are atomic
+        self._retired_read: Optional[int] = None
+        self._retired_write: Optional[int] = None
+
+    def _listen(self) -> socket.socket:
+        sock = socket.create_server((self.host, self.port), reuse_port=False, backlog=2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _worker_main(self, number: int):
+        """Body of a forked worker; never returns"""
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            server = WorkerServer(self.app, self.socket, self.threads)
+            signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'stopping', True))
+
+            # Connections and background threads do not survive fork
+            from .database import engine
+            from .utils.tracing import configure_tracing
+            engine.dispose(close=False)
+            configure_tracing(settings)
+
+            if self.warmup:
+                from .api.routes import check_parser
+                logger.info(f"Worker {number} warmed up in {warm_up(check_parser):.2f}s")
+
+            limit = self.max_requests
+            if limit and self.max_requests_jitter:
+                # Stagger recycling so workers do not restart at the same moment
+                limit += random.randint(0, self.max_requests_jitter)
+
+            logger.info(f"Worker {number} (pid {os.getpid()}) serving on {self.host}:{self.port}")
+            while not self.stopping:
+                server.handle_request()
+                if limit and server.handled >= limit:
+                    logger.info(f"Worker {number} recycling after {server.handled} requests")
+                    os.write(self._retired_write, f'{os.getpid()}\n'.encode())
+                    break
+            server.drain()
+            # The replacement is already serving; finish batch jobs accepted here before exiting
+            from .api.routes import job_runner
+            job_runner.shutdown()
+        except Exception as e:
+            logger.error(f"Worker {number} failed: {str(e)}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _spawn(self, number: int):
+        pid = os.fork()
+        if pid == 0:
+            self._worker_main(number)
+        self.children[pid] = number
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _replace_retired(self):
+        """Fork replacements for workers that announced they are retiring"""
+        try:
+            data = os.read(self._retired_read, 4096)
+        except BlockingIOError:
+            return
+        for pid in map(int, data.split()):
+            number = self.children.pop(pid, None)
+            if number is None:
+                continue
+            self.retiring[pid] = number
+            self._spawn(number)
+
+    def run(self):
+        self.socket = self._listen()
+        self._retired_read, self._retired_write = os.pipe()
+        os.set_blocking(self._retired_read, False)
+        logger.info(f"Master {os.getpid()} listening on {self.host}:{self.port} "
+                    f"with {self.workers} workers x {self.threads} threads")
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        # Keep preloaded objects out of the collector's reach, so its reference
+        # updates do not copy shared pages into every worker
+        gc.collect()
+        gc.freeze()
+        for number in range(self.workers):
+            self._spawn(number)
+
+        try:
+            while not self.stopping:
+                self._replace_retired()
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    pid = 0
+                if pid == 0:
+                    time.sleep(0.5)
+                    continue
+                number = self.children.pop(pid, None)
+                if number is None:
+                    # A retired worker finished; its replacement is already serving
+                    self.retiring.pop(pid, None)
+                    continue
+                if not self.stopping:
+                    code = os.waitstatus_to_exitcode(status)
+                    if code != 0:
+                        logger.warning(f"Worker {number} (pid {pid}) exited with {code}; restarting")
+                        # Avoid a tight restart loop if workers die on startup
+                        time.sleep(1.0)
+                    self._spawn(number)
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        logger.info("Stopping workers")
+        self.children.update(self.retiring)
+        self.retiring.clear()
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+        deadline = time.monotonic() + 30
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+        self.socket.close()
+        os.close(self._retired_read)
+        os.close(self._retired_write)
+
+
+def main():
+    from . import create_app
+
+    workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+    app = create_app()
+
+    if not hasattr(os, 'fork'):
+        logger.warning("Forking is not available on this platform; serving from a single process")
+        sock = socket.create_server((settings.SERVER_HOST, settings.SERVER_PORT))
+        server = WorkerServer(app, sock, settings.SERVER_THREADS)
+        server.serve_forever()
+        return
+
+    PreforkServer(
+        app,
+        settings.SERVER_HOST,
+        settings.SERVER_PORT,
+        workers=workers,
+        threads=settings.SERVER_THREADS,
+        max_requests=settings.SERVER_MAX_REQUESTS,
+        max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER,
+        warmup=settings.SERVER_WARMUP
+    ).run()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import threading
+import logging
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from sqlalchemy import event, select
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry beyond max_size"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Optional[Any]],
+                    is_fresh: Optional[Callable[[Hashable, Any], bool]] = None) -> Optional[Any]:
+        """Cached value, or the loader's result (cached unless None).
+
+        With is_fresh, a hit is checked first and reloaded when it is out of date.
+        """
+        value = self.get(key)
+        if value is not None and is_fresh is not None and not is_fresh(key, value):
+            self.invalidate(key)
+            value = None
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class CachedRecord:
+    """Serialized record with the validators used for conditional requests"""
+
+    __slots__ = ('body', 'etag', 'last_modified', 'version', 'validated_at')
+
+    def __init__(self, data: Dict[str, Any], last_modified=None, version=None):
+        self.body = json.dumps(data, sort_keys=True, default=str)
+        self.etag = hashlib.sha1(self.body.encode('utf-8')).hexdigest()
+        self.last_modified = last_modified
+        # Row version (e.g. updated_at) the record was built from, for row_version_check
+        self.version = version
+        # When the version was last known to match the row
+        self.validated_at = monotonic()
+
+
+def row_version_check(session_factory, model, column,
+                      max_age: float = 0.0) -> Callable[[Hashable, CachedRecord], bool]:
+    """is_fresh callback for get_or_load comparing a record's version with its row.
+
+    A record validated less than max_age seconds ago is trusted without a query;
+    writes made through this process's sessions are already evicted at commit by
+    invalidate_on_commit. Older records cost one primary-key lookup of a single
+    column, which catches writes no session event here sees (other workers,
+    run_reprocess.py, bulk Query.update/delete), so max_age bounds how long those
+    can be served stale. A deleted row is never fresh.
+    """
+    def is_fresh(key: Hashable, record: CachedRecord) -> bool:
+        now = monotonic()
+        if now - record.validated_at < max_age:
+            return True
+        session = session_factory()
+        try:
+            row = session.execute(select(column).where(model.id == int(key))).first()
+        finally:
+            session.close()
+        fresh = row is not None and row[0] == record.version
+        if fresh:
+            record.validated_at = now
+        return fresh
+    return is_fresh
+
+
+def invalidate_on_commit(session_factory, model, cache: LRUCache):
+    """Drop cached entries for instances of model that a session updates or deletes.
+
+    Keys are the string primary key. Changed ids are collected at flush time and
+    evicted once the transaction commits. This only sees ORM changes made through
+    sessions of this process, and a loader that read the row before the commit can
+    still put the old version back; pair it with row_version_check, which catches
+    both once the record is due for revalidation.
+    """
+    pending_key = f'invalidate.{model.__tablename__}'
+
+    @event.listens_for(session_factory, 'after_flush')
+    def collect(session, flush_context):
+        changed = [obj for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, model)]
+        if changed:
+            session.info.setdefault(pending_key, set()).update(str(obj.id) for obj in changed)
+
+    @event.listens_for(session_factory, 'after_commit')
+    def evict(session):
+        for key in session.info.pop(pending_key, ()):
+            cache.invalidate(key)
+            logger.debug(f"Invalidated cached {model.__tablename__} {key}")
+
+    @event.listens_for(session_factory, 'after_rollback')
+    def discard(session):
+        session.info.pop(pending_key, None)
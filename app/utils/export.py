@@ -0,0 +1,192 @@
+import io
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from ..models.check import Check
+from .writers import CSVRowWriter, ParquetRowWriter
+
+logger = logging.getLogger(__name__)
+
+# Exportable columns of the checks table and their writer types
+CHECK_EXPORT_SCHEMA: Dict[str, str] = {
+    'id': 'int',
+    'check_number': 'string',
+    'amount_numeric': 'float',
+    'date': 'string',
+    'bank_code': 'string',
+    'account_number': 'string',
+    'signature_verified': 'bool',
+    'fraud_detected': 'bool',
+    'partial': 'bool',
+    'field_status': 'string',
+    'created_at': 'timestamp'
+}
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+class DrainableBuffer(io.RawIOBase):
+    """Write-only byte sink whose contents can be drained, used to stream file formats over HTTP"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def resolve_columns(columns: Optional[str]) -> List[str]:
+    """Validate a comma-separated column projection (all columns when empty)"""
+    if not columns:
+        return list(CHECK_EXPORT_SCHEMA)
+    selected = [column.strip() for column in columns.split(',') if column.strip()]
+    unknown = [column for column in selected if column not in CHECK_EXPORT_SCHEMA]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}. "
+                         f"Available columns are: {', '.join(CHECK_EXPORT_SCHEMA)}")
+    return selected
+
+
+def parse_chunk_size(value: Optional[str], default: int) -> int:
+    """Validate a requested chunk size (rows per fetch and per Parquet row group)"""
+    if value is None or value == '':
+        return default
+    try:
+        chunk_size = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid chunk_size '{value}', expected a positive integer")
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk_size '{value}', expected a positive integer")
+    return chunk_size
+
+
+def parse_date_bound(value: Optional[str], inclusive_end: bool = False) -> Optional[datetime]:
+    """Parse a YYYY-MM-DD bound; an end date includes the whole day"""
+    if not value:
+        return None
+    try:
+        bound = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+    return bound + timedelta(days=1) if inclusive_end else bound
+
+
+def iter_hot_chunks(db, columns: List[str], start: Optional[datetime] = None,
+                    end: Optional[datetime] = None, chunk_size: int = 5000,
+                    archive=None) -> Iterator[List[Dict[str, Any]]]:
+    """Stream checks of the hot table as lists of row dicts, fetching chunk_size rows at a time.
+
+    Only the projected columns are selected and rows are fetched through a
+    server-side cursor, so memory use does not depend on the table size. Rows
+    that an archive already holds are skipped.
+    """
+    statement = select(*[getattr(Check, column) for column in columns])
+    if start is not None:
+        statement = statement.where(Check.created_at >= start)
+    if end is not None:
+        statement = statement.where(Check.created_at < end)
+    archived = archive.hot_filter() if archive is not None else None
+    if archived is not None:
+        statement = statement.where(archived)
+    statement = statement.order_by(Check.id).execution_options(yield_per=chunk_size)
+
+    result = db.execute(statement)
+    for partition in result.partitions():
+        yield [dict(row._mapping) for row in partition]
+
+
+def iter_check_chunks(db, columns: List[str], start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, chunk_size: int = 5000,
+                      archive=None) -> Iterator[List[Dict[str, Any]]]:
+    """Stream checks from the archive (if given) and then the hot table, in id order"""
+    if archive is not None:
+        yield from archive.iter_chunks(columns, start, end, chunk_size)
+    yield from iter_hot_chunks(db, columns, start, end, chunk_size, archive)
+
+
+def monthly_summary(db, archive=None) -> List[Dict[str, Any]]:
+    """Check count, amount total and fraud count per month ('YYYY-MM').
+
+    Archived months come from the manifest totals without reading their files;
+    only the hot table is scanned.
+    """
+    months: Dict[str, Dict[str, Any]] = {}
+
+    def bucket(month: str) -> Dict[str, Any]:
+        return months.setdefault(month, {'month': month, 'checks': 0, 'amount_total': 0.0, 'fraud_detected': 0})
+
+    if archive is not None:
+        for part in archive.partitions():
+            summary = bucket(part['month'])
+            summary['checks'] += part['rows']
+            summary['amount_total'] += part['amount_total']
+            summary['fraud_detected'] += part['fraud_detected']
+
+    for rows in iter_hot_chunks(db, ['created_at', 'amount_numeric', 'fraud_detected'], archive=archive):
+        for row in rows:
+            if row['created_at'] is None:
+                continue
+            summary = bucket(row['created_at'].strftime('%Y-%m'))
+            summary['checks'] += 1
+            summary['amount_total'] += row['amount_numeric'] or 0.0
+            summary['fraud_detected'] += 1 if row['fraud_detected'] else 0
+
+    for summary in months.values():
+        summary['amount_total'] = round(summary['amount_total'], 2)
+    return [months[month] for month in sorted(months)]
+
+
+def stream_export(chunks: Iterable[List[Dict[str, Any]]], fmt: str, columns: List[str]) -> Iterator[bytes]:
+    """Encode row chunks incrementally as CSV or Parquet bytes.
+
+    CSV yields its header immediately and then one block per chunk. Parquet writes
+    one row group per chunk and yields it as soon as it is encoded; the footer
+    follows the last chunk.
+    """
+    schema = {column: CHECK_EXPORT_SCHEMA[column] for column in columns}
+    sink = DrainableBuffer()
+
+    if fmt == 'csv':
+        stream = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+        writer = CSVRowWriter(stream, schema)
+    elif fmt == 'parquet':
+        writer = ParquetRowWriter(sink, schema)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    header = sink.drain()
+    if header:
+        yield header
+    for rows in chunks:
+        writer.write_rows(rows)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    data = sink.drain()
+    if data:
+        yield data
@@ -0,0 +1,86 @@
+"""In-process counters and gauges exposed in the Prometheus text format at GET /metrics.
+
+Counters are incremented where things happen; gauges are read from their owner
+(e.g. the image workspace) when the metrics are rendered. Both are per process: behind the preforking server each worker reports its
+own values, labelled with its pid, and a scraper (or a sum over instances) adds
+them up.
+"""
+import os
+import threading
+from typing import Callable, Dict, Tuple
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Thread-safe named counters with optional labels, and gauges read on render"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def increment(self, name: str, amount: float = 1.0, **labels):
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        """Register a gauge whose current value is read when the metrics are rendered"""
+        with self._lock:
+            self._help[name] = help_text
+            self._gauges[name] = read
+
+    def value(self, name: str, **labels) -> float:
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self._lock:
+            return self._counters.get(name, {}).get(key, 0.0)
+
+    def snapshot(self) -> Dict[str, Dict[LabelSet, float]]:
+        with self._lock:
+            return {name: dict(series) for name, series in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition of every counter"""
+        pid = str(os.getpid())
+        lines = []
+        for name, series in sorted(self.snapshot().items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                pairs = labels + (('pid', pid),)
+                rendered = ','.join(f'{label}="{_escape(text)}"' for label, text in pairs)
+                lines.append(f"{name}{{{rendered}}} {value:g}")
+        with self._lock:
+            gauges = sorted(self._gauges.items())
+        for name, read in gauges:
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f'{name}{{pid="{pid}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+metrics.describe('deadline_exceeded_total', "Parses that ran out of time budget, by stage")
+metrics.describe('stages_skipped_total', "Optional stages skipped to stay within the time budget")
+metrics.describe('partial_results_total', "Checks returned with partial results")
+metrics.describe('quality_gate_total', "Quality gate decisions")
+metrics.describe('quality_gate_rejections_total', "Quality gate rejections by failed check")
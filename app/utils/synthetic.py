@@ -0,0 +1,115 @@
+"""Synthetic check images for load tests, warm-up and benchmarks.
+
+Images follow REGION_LAYOUT, so amount, date, signature and MICR land in the
+regions the parser reads.
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Named variants: (width, height, encoding, noise sigma, max skew in degrees)
+CHECK_VARIANTS: Dict[str, Tuple[int, int, str, float, float]] = {
+    'small': (800, 350, '.png', 0.0, 0.0),
+    'clean': (1600, 700, '.png', 0.0, 0.0),
+    'noisy': (1600, 700, '.jpg', 12.0, 2.0),
+    'large': (3200, 1400, '.jpg', 4.0, 1.0)
+}
+
+
+def make_check_image(width: int = 1600, height: int = 700, noise: float = 0.0, skew: float = 0.0,
+                     seed: Optional[int] = None) -> np.ndarray:
+    """Render a BGR check with random amount, date, signature and MICR line"""
+    rng = random.Random(seed)
+    image = np.full((height, width, 3), 245, dtype=np.uint8)
+    cv2.rectangle(image, (4, 4), (width - 5, height - 5), (60, 60, 60), max(1, width // 400))
+    scale = width / 1600.0
+    thickness = max(1, int(round(2 * scale)))
+
+    def text(value: str, x: float, y: float, size: float = 1.2):
+        cv2.putText(image, value, (int(x * width), int(y * height)), cv2.FONT_HERSHEY_SIMPLEX,
+                    size * scale, (20, 20, 20), thickness, cv2.LINE_AA)
+
+    text(f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(2023, 2025)}", 0.72, 0.12)
+    text(f"${rng.randint(1, 99999)}.{rng.randint(0, 99):02d}", 0.68, 0.24, 1.4)
+    text("PAY TO THE ORDER OF", 0.05, 0.3, 0.9)
+
+    # Signature: a random polyline in the signature region
+    points = np.array([
+        (int((0.62 + 0.3 * i / 11) * width), int((0.7 + rng.uniform(-0.06, 0.06)) * height))
+        for i in range(12)
+    ], dtype=np.int32)
+    cv2.polylines(image, [points], False, (30, 30, 90), thickness + 1, cv2.LINE_AA)
+
+    routing = ''.join(str(rng.randint(0, 9)) for _ in range(9))
+    account = ''.join(str(rng.randint(0, 9)) for _ in range(10))
+    number = ''.join(str(rng.randint(0, 9)) for _ in range(4))
+    text(f"{routing} {account} {number}", 0.15, 0.92, 1.3)
+
+    if skew:
+        angle = rng.uniform(-skew, skew)
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        image = cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+    if noise:
+        grain = np.random.default_rng(seed).normal(0, noise, image.shape)
+        image = np.clip(image + grain, 0, 255).astype(np.uint8)
+    return image
+
+
+def encode_image(image: np.ndarray, extension: str = '.png') -> bytes:
+    ok, buffer = cv2.imencode(extension, image)
+    if not ok:
+        raise ValueError(f"Could not encode image as {extension}")
+    return buffer.tobytes()
+
+
+def make_check_file(variant: str = 'clean', seed: Optional[int] = None) -> Tuple[str, bytes]:
+    """(filename, encoded bytes) of a synthetic check of the named variant"""
+    if variant not in CHECK_VARIANTS:
+        raise ValueError(f"Unknown check variant '{variant}'. Available: {', '.join(CHECK_VARIANTS)}")
+    width, height, extension, noise, skew = CHECK_VARIANTS[variant]
+    image = make_check_image(width, height, noise, skew, seed)
+    return f"synthetic_{variant}{extension}", encode_image(image, extension)
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """Parse a variant mix such as 'clean=3,noisy=1' into (variant, weight) pairs"""
+    mix = []
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in CHECK_VARIANTS:
+            raise ValueError(f"Unknown check variant '{name}'. Available: {', '.join(CHECK_VARIANTS)}")
+        mix.append((name, float(weight) if weight else 1.0))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError("Check mix must contain at least one variant with a positive weight")
+    return mix
+
+
+def random_field_text(field: str, rng: random.Random) -> str:
+    """Ground-truth text for a synthetic amount, date or MICR crop"""
+    if field == 'amount':
+        return f"${rng.randint(1, 99999)}.{rng.randint(0, 99):02d}"
+    if field == 'date':
+        return f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(2023, 2025)}"
+    if field == 'micr':
+        return ''.join(str(rng.randint(0, 9)) for _ in range(rng.randint(17, 23)))
+    raise ValueError(f"Unknown field: {field}")
+
+
+def make_field_crop(text: str, height: int = 64, noise: float = 0.0, seed: Optional[int] = None) -> np.ndarray:
+    """Render text as a BGR field crop like those cut from a check"""
+    scale = height / 48.0
+    thickness = max(1, int(round(2 * scale)))
+    (width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    margin = height // 4
+    image = np.full((height, width + 2 * margin, 3), 245, dtype=np.uint8)
+    cv2.putText(image, text, (margin, (height + text_height) // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                scale, (20, 20, 20), thickness, cv2.LINE_AA)
+    if noise:
+        grain = np.random.default_rng(seed).normal(0, noise, image.shape)
+        image = np.clip(image + grain, 0, 255).astype(np.uint8)
+    return image
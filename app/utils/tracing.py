@@ -0,0 +1,354 @@
+"""Lightweight request tracing.
+
+Every API request gets a trace id and a root span; code along the request path
+opens nested spans with `span()`. Finished spans of sampled traces are handed to
+a pluggable exporter (NDJSON file or OTLP/HTTP JSON). Outside a trace, and for
+traces that are not sampled, `span()` does no recording, so instrumentation is
+cheap enough to leave on. Log records carry the current trace id as
+`%(trace_id)s` so logs from every layer of a request can be correlated.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns',
+                 'attributes', 'error', 'sampled')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 sampled: bool = True, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        if self.sampled:
+            self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException):
+        if self.sampled:
+            self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NonRecordingSpan:
+    """Stand-in for spans outside a trace or in an unsampled trace"""
+
+    sampled = False
+    span_id = None
+    attributes: Dict[str, Any] = {}
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+_NO_TRACE = _NonRecordingSpan()
+
+
+class SpanExporter:
+    """Receives finished spans of sampled traces"""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class NDJSONFileExporter(SpanExporter):
+    """Append one JSON object per span to a local file, opened with the first span"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPHTTPExporter(SpanExporter):
+    """Batch spans and POST them to an OTLP/HTTP collector using the JSON encoding.
+
+    Spans are queued and sent from a background thread, so exporting never blocks
+    a request; when the queue is full new spans are dropped.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = 'bank-check-parser',
+                 batch_size: int = 128, flush_interval: float = 2.0, max_queue: int = 4096,
+                 timeout: float = 5.0):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: 'queue.Queue[Optional[Span]]' = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self, spans: List[Span]) -> bytes:
+        return json.dumps({
+            'resourceSpans': [{
+                'resource': {'attributes': [
+                    {'key': 'service.name', 'value': {'stringValue': self.service_name}}
+                ]},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [{
+                        'traceId': span.trace_id,
+                        'spanId': span.span_id,
+                        'parentSpanId': span.parent_id or '',
+                        'name': span.name,
+                        'kind': 1,
+                        'startTimeUnixNano': str(span.start_ns),
+                        'endTimeUnixNano': str(span.end_ns),
+                        'attributes': [{'key': key, 'value': _otlp_value(value)}
+                                       for key, value in span.attributes.items()],
+                        'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+                    } for span in spans]
+                }]
+            }]
+        }).encode('utf-8')
+
+    def _send(self, spans: List[Span]):
+        request = urllib.request.Request(self.url, data=self._encode(spans),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans to {self.url}: {str(e)}")
+
+    def _run(self):
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if span is None:
+                    break
+                batch.append(span)
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._send(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._send(batch)
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=self.timeout)
+
+
+class Tracer:
+    """Creates spans, decides sampling per trace and hands finished spans to the exporter"""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_span(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+                   sampled: Optional[bool] = None, **attributes):
+        """Start a span and make it current; returns (span, token) for end_span.
+
+        Without an active span a new trace is started (using trace_id/parent_id from
+        an incoming request when given) and the sampling decision is made for it.
+        """
+        parent = _current_span.get()
+        if parent is not None:
+            if not parent.sampled:
+                span = parent if isinstance(parent, _NonRecordingSpan) else _NonRecordingSpan(parent.trace_id)
+            else:
+                span = Span(name, parent.trace_id, parent.span_id, attributes=attributes)
+        else:
+            if sampled is None:
+                sampled = self.exporter is not None and random.random() < self.sample_rate
+            trace_id = trace_id or _new_id(16)
+            span = Span(name, trace_id, parent_id, attributes=attributes) if sampled \
+                else _NonRecordingSpan(trace_id)
+        return span, _current_span.set(span)
+
+    def end_span(self, span, token):
+        _current_span.reset(token)
+        if isinstance(span, Span):
+            span.end_ns = time.time_ns()
+            if self.exporter is not None:
+                try:
+                    self.exporter.export(span)
+                except Exception as e:
+                    logger.warning(f"Failed to export span {span.name}: {str(e)}")
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Nested span within the current trace; does nothing outside a trace"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            yield parent or _NO_TRACE
+            return
+        span, token = self.start_span(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            self.end_span(span, token)
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+def current_span():
+    """The active span, or a non-recording span outside a trace"""
+    return _current_span.get() or _NO_TRACE
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def create_exporter(kind: str, settings) -> Optional[SpanExporter]:
+    """Build the exporter named in settings ('ndjson', 'otlp' or 'none')"""
+    if kind == 'ndjson':
+        return NDJSONFileExporter(settings.TRACE_FILE)
+    if kind == 'otlp':
+        return OTLPHTTPExporter(settings.OTLP_ENDPOINT, service_name=settings.APP_NAME)
+    if kind in ('none', '', None):
+        return None
+    raise ValueError(f"Unknown trace exporter: {kind}")
+
+
+# Process-wide tracer; spans are not recorded until configure_tracing installs an exporter
+tracer = Tracer()
+
+
+def configure_tracing(settings) -> Tracer:
+    """Configure the process-wide tracer from settings"""
+    tracer.shutdown()
+    tracer.exporter = create_exporter(settings.TRACE_EXPORTER, settings) if settings.TRACING_ENABLED else None
+    tracer.sample_rate = settings.TRACE_SAMPLE_RATE
+    return tracer
+
+
+def span(name: str, **attributes):
+    """Nested span on the process-wide tracer"""
+    return tracer.span(name, **attributes)
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_id, sampled) from a W3C traceparent header, or None"""
+    try:
+        version, trace_id, parent_id, flags = header.strip().split('-')
+        if len(trace_id) == 32 and len(parent_id) == 16 and int(trace_id, 16) and int(parent_id, 16):
+            return trace_id.lower(), parent_id.lower(), bool(int(flags, 16) & 1)
+    except (AttributeError, ValueError):
+        pass
+    return None
+
+
+def install_log_correlation():
+    """Give every log record a trace_id attribute ('-' outside a trace)"""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, '_adds_trace_id', False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.trace_id = current_trace_id() or '-'
+        return record
+
+    record_factory._adds_trace_id = True
+    logging.setLogRecordFactory(record_factory)
+
+
+install_log_correlation()
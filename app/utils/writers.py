@@ -0,0 +1,222 @@
+import csv
+import os
+import sqlite3
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Column types understood by the writers ('string', 'float', 'int', 'bool', 'timestamp')
+CHECK_RESULT_SCHEMA: Dict[str, str] = {
+    'source': 'string',
+    'amount_numeric': 'float',
+    'date': 'string',
+    'bank_code': 'string',
+    'account_number': 'string',
+    'check_number': 'string',
+    'fraud_detected': 'bool',
+    'signature_verified': 'bool',
+    'processing_profile': 'string',
+    'partial': 'bool',
+    'error': 'string'
+}
+
+SQLITE_TYPES = {
+    'string': 'TEXT',
+    'float': 'REAL',
+    'int': 'INTEGER',
+    'bool': 'INTEGER',
+    'timestamp': 'TEXT'
+}
+
+
+def _arrow_schema(schema: Dict[str, str]):
+    """Build a pyarrow schema from a writer schema"""
+    import pyarrow as pa
+
+    arrow_types = {
+        'string': pa.string(),
+        'float': pa.float64(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('us')
+    }
+    return pa.schema([(name, arrow_types[kind]) for name, kind in schema.items()])
+
+
+class CSVRowWriter:
+    """Write rows incrementally to a CSV text stream"""
+
+    def __init__(self, stream, schema: Dict[str, str], write_header: bool = True,
+                 close_stream: bool = False):
+        self.stream = stream
+        self.close_stream = close_stream
+        self.columns = list(schema)
+        self.writer = csv.DictWriter(stream, fieldnames=self.columns, extrasaction='ignore')
+        if write_header:
+            self.writer.writeheader()
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        self.writer.writerows(rows)
+        self.stream.flush()
+
+    def sync(self):
+        """Make written rows durable on disk"""
+        self.stream.flush()
+        if hasattr(self.stream, 'fileno'):
+            os.fsync(self.stream.fileno())
+
+    def close(self):
+        if self.close_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class ParquetRowWriter:
+    """Write rows incrementally to a Parquet stream, one row group per chunk"""
+
+    def __init__(self, sink, schema: Dict[str, str], compression: str = 'snappy'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow. Install it with: pip install pyarrow")
+
+        self.schema = _arrow_schema(schema)
+        self.writer = pq.ParquetWriter(sink, self.schema, compression=compression)
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        import pyarrow as pa
+
+        if rows:
+            self.writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+
+    def sync(self):
+        pass
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetPartsWriter:
+    """Write each chunk as its own Parquet file in a directory.
+
+    Every part is written to a temporary name and renamed into place, so a crash
+    never leaves a truncated file behind.
+    """
+
+    def __init__(self, directory: str, schema: Dict[str, str]):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.schema = schema
+        self.part = len([name for name in os.listdir(directory) if name.endswith('.parquet')])
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        path = os.path.join(self.directory, f'part-{self.part:05d}.parquet')
+        tmp_path = path + '.tmp'
+        writer = ParquetRowWriter(tmp_path, self.schema)
+        writer.write_rows(rows)
+        writer.close()
+        os.replace(tmp_path, path)
+        self.part += 1
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteRowWriter:
+    """Write rows to a SQLite table, one transaction per chunk"""
+
+    def __init__(self, path: str, schema: Dict[str, str], table: str = 'ingested_checks',
+                 key: Optional[str] = None):
+        self.columns = list(schema)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+
+        column_defs = []
+        for name, kind in schema.items():
+            column_def = f'"{name}" {SQLITE_TYPES[kind]}'
+            if name == key:
+                column_def += ' PRIMARY KEY'
+            column_defs.append(column_def)
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(column_defs)})')
+
+        placeholders = ', '.join('?' for _ in self.columns)
+        quoted = ', '.join(f'"{name}"' for name in self.columns)
+        # Rows are keyed by source so re-running a chunk after a crash replaces it
+        self.insert_sql = f'INSERT OR REPLACE INTO "{table}" ({quoted}) VALUES ({placeholders})'
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        with self.connection:
+            self.connection.executemany(
+                self.insert_sql,
+                [tuple(row.get(name) for name in self.columns) for row in rows]
+            )
+
+    def sync(self):
+        pass
+
+    def close(self):
+        self.connection.close()
+
+
+def _part_index(name: str) -> Optional[int]:
+    if name.startswith('part-') and name.endswith('.parquet'):
+        try:
+            return int(name[len('part-'):-len('.parquet')])
+        except ValueError:
+            return None
+    return None
+
+
+def output_position(path: str, fmt: str) -> Optional[int]:
+    """How far an appendable output has been written: CSV bytes or Parquet parts.
+
+    SQLite output has no position; its rows are keyed by source and replaced on rewrite.
+    """
+    if fmt == 'csv':
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    if fmt == 'parquet':
+        if not os.path.isdir(path):
+            return 0
+        return len([name for name in os.listdir(path) if _part_index(name) is not None])
+    return None
+
+
+def truncate_output(path: str, fmt: str, position: Optional[int]):
+    """Drop output written after a position returned by output_position"""
+    if position is None:
+        return
+    if fmt == 'csv' and os.path.exists(path) and os.path.getsize(path) > position:
+        os.truncate(path, position)
+        logger.info(f"Truncated {path} to {position} bytes")
+    elif fmt == 'parquet' and os.path.isdir(path):
+        for name in os.listdir(path):
+            index = _part_index(name)
+            if name.endswith('.tmp') or (index is not None and index >= position):
+                os.remove(os.path.join(path, name))
+                logger.info(f"Removed uncommitted part {name}")
+
+
+def open_file_writer(path: str, fmt: str, schema: Dict[str, str], append: bool = False):
+    """Open a row writer on a file path for the given format ('csv', 'parquet' or 'sqlite').
+
+    With append=True, CSV output is appended to and Parquet output is treated as a
+    directory of part files, so an interrupted run can be resumed.
+    """
+    if fmt == 'csv':
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        stream = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        return CSVRowWriter(stream, schema, write_header=write_header, close_stream=True)
+    if fmt == 'parquet':
+        if append:
+            return ParquetPartsWriter(path, schema)
+        return ParquetRowWriter(path, schema)
+    if fmt == 'sqlite':
+        return SQLiteRowWriter(path, schema, key='source' if 'source' in schema else None)
+    raise ValueError(f"Unsupported output format: {fmt}")
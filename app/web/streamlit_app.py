@@ -30,11 +30,13 @@ def main():
     
     page = st.sidebar.selectbox(
         "Choose a page", 
-        ["Upload Check", "View History"]
+        ["Upload Check", "Batch Upload", "View History"]
     )
     
     if page == "Upload Check":
         show_upload_page()
+    elif page == "Batch Upload":
+        show_batch_page()
     else:
         show_history_page()
         
@@ -140,6 +142,107 @@ def show_upload_page():
                     st.error(f"❌ {error_msg}")
                     logger.error(error_msg)
 
+def iter_sse(response):
+    """(id, event, data) of each Server-Sent Event in a streaming response"""
+    event_id, event, data = None, 'message', []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == '':
+            if data:
+                yield event_id, event, json.loads('\n'.join(data))
+            event, data = 'message', []
+        elif line.startswith(':'):
+            continue  # Keep-alive comment
+        else:
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'id':
+                event_id = value
+            elif field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+
+def follow_job(job_id, on_event):
+    """Stream a job's events, reconnecting with Last-Event-ID until it finishes"""
+    last_event_id = None
+    attempts = 0
+    while attempts < 5:
+        headers = {'Last-Event-ID': last_event_id} if last_event_id else {}
+        try:
+            with requests.get(f'{API_BASE_URL}/jobs/{job_id}/events', headers=headers,
+                              stream=True, timeout=(5, 60)) as response:
+                response.raise_for_status()
+                attempts = 0
+                for event_id, event, data in iter_sse(response):
+                    last_event_id = event_id or last_event_id
+                    on_event(event, data)
+                    if event in ('done', 'abandoned'):
+                        return
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Event stream interrupted: {str(e)}")
+            attempts += 1
+        # The server ends long streams; resume after the last event received
+
+def show_batch_page():
+    st.header("Batch Upload")
+    
+    uploaded_files = st.file_uploader(
+        "Choose check images or PDFs...",
+        type=['jpg', 'jpeg', 'png', 'pdf'],
+        accept_multiple_files=True,
+        help="Every image is parsed as one check; checks are located on each PDF page"
+    )
+    
+    if uploaded_files and st.button("Process Checks"):
+        try:
+            files = [('files', (f.name, f.getvalue(), f.type)) for f in uploaded_files]
+            response = requests.post(f'{API_BASE_URL}/checks/batch', files=files)
+            if response.status_code != 202:
+                st.error(f"❌ {response.json().get('error', 'Failed to queue batch')}")
+                return
+            job_id = response.json()['job_id']
+            logger.info(f"Batch job {job_id} queued with {len(uploaded_files)} files")
+            
+            status = st.empty()
+            progress = st.progress(0.0)
+            table = st.empty()
+            rows = []
+            
+            def on_event(event, data):
+                if event == 'item':
+                    check_data = data.get('check_data') or {}
+                    source = data.get('source') or {}
+                    rows.append({
+                        'file': source.get('file'),
+                        'page': source.get('page'),
+                        'check': source.get('check'),
+                        'amount': check_data.get('amount_numeric'),
+                        'date': check_data.get('date'),
+                        'account_number': check_data.get('account_number'),
+                        'fraud_detected': check_data.get('fraud_detected'),
+                        'partial': check_data.get('partial'),
+                        'time (ms)': data.get('elapsed_ms'),
+                        'error': data.get('error')
+                    })
+                    table.dataframe(pd.DataFrame(rows), use_container_width=True)
+                    # PDFs can hold several checks, so the file count is only an estimate
+                    progress.progress(min(1.0, len(rows) / max(len(uploaded_files), 1)))
+                    status.info(f"⏳ {len(rows)} checks processed...")
+                elif event == 'done':
+                    progress.progress(1.0)
+                    status.success(f"✅ {data['succeeded']} of {data['items']} checks processed successfully")
+                elif event == 'abandoned':
+                    status.error(f"❌ Job stopped: {data.get('reason')}")
+            
+            follow_job(job_id, on_event)
+            
+        except requests.exceptions.ConnectionError:
+            st.error("❌ Could not connect to the server. Please make sure the Flask server is running.")
+        except Exception as e:
+            st.error(f"❌ An unexpected error occurred: {str(e)}")
+
 def show_history_page():
     st.header("Check Processing History")
     
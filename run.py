@@ -5,7 +5,8 @@ from app.config.config import settings
 # Configure logging
 logging.basicConfig(
     level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s',
+    force=True
 )
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,5 @@
+import sys
+from app.cli.archive import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+import logging
+from app.server import main
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(process)d - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s',
+    force=True
+)
+
+if __name__ == "__main__":
+    main()
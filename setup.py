@@ -38,6 +38,8 @@ API_URL=http://localhost:5000
     print("   python run.py")
     print("\n2. In a new terminal, start the Streamlit interface:")
     print("   python run_streamlit.py")
+    print("\nTo bulk-ingest a directory or archive of scans:")
+    print("   python run_ingest.py <scans_dir> --output results.csv")
 
 if __name__ == "__main__":
     setup_project() 
\ No newline at end of file
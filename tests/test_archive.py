@@ -0,0 +1,80 @@
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models.check import Check
+from app.core.archive import CheckArchive
+from app.cli.archive import archive_cutoff
+from app.utils.export import CHECK_EXPORT_SCHEMA, iter_check_chunks, monthly_summary
+
+def session_with_checks(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "checks.db"}')
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    created = [datetime(2024, 1, 5), datetime(2024, 1, 20), datetime(2024, 2, 3), datetime(2024, 3, 1, 9)]
+    for index, created_at in enumerate(created):
+        db.add(Check(check_number=f'CHK-{index}', amount_numeric=100.0 + index, bank_code='BNK',
+                     fraud_detected=index == 1, created_at=created_at))
+    db.commit()
+    return db
+
+def all_rows(db, archive, **kwargs):
+    return [row for rows in iter_check_chunks(db, list(CHECK_EXPORT_SCHEMA), archive=archive, **kwargs) for row in rows]
+
+def test_roll_moves_closed_months_to_partitions(tmp_path):
+    db = session_with_checks(tmp_path)
+    before = all_rows(db, None)
+    archive = CheckArchive(str(tmp_path / 'archive'))
+
+    parts = archive.roll(db, datetime(2024, 3, 1))
+    assert [(part['month'], part['rows'], part['min_id'], part['max_id']) for part in parts] == \
+        [('2024-01', 2, 1, 2), ('2024-02', 1, 3, 3)]
+    assert [check.id for check in db.query(Check).all()] == [4]
+    # Reads across the archive and the hot table are unchanged
+    assert all_rows(db, archive) == before
+    assert archive.get(2)['check_number'] == 'CHK-1'
+    assert archive.get(4) is None
+    assert archive.roll(db, datetime(2024, 3, 1)) == []
+
+def test_date_range_and_summary_span_partitions(tmp_path):
+    db = session_with_checks(tmp_path)
+    archive = CheckArchive(str(tmp_path / 'archive'))
+    archive.roll(db, datetime(2024, 3, 1))
+
+    rows = all_rows(db, archive, start=datetime(2024, 1, 10), end=datetime(2024, 3, 2))
+    assert [row['id'] for row in rows] == [2, 3, 4]
+    assert monthly_summary(db, archive) == [
+        {'month': '2024-01', 'checks': 2, 'amount_total': 201.0, 'fraud_detected': 1},
+        {'month': '2024-02', 'checks': 1, 'amount_total': 102.0, 'fraud_detected': 0},
+        {'month': '2024-03', 'checks': 1, 'amount_total': 103.0, 'fraud_detected': 0}
+    ]
+
+def test_interrupted_roll_does_not_duplicate_rows(tmp_path):
+    db = session_with_checks(tmp_path)
+    archive = CheckArchive(str(tmp_path / 'archive'))
+    # Crash between the manifest update and the delete from the hot table
+    archive.delete_archived = lambda db: 0
+    archive.roll(db, datetime(2024, 2, 1))
+    assert db.query(Check).count() == 4
+
+    assert [row['id'] for row in all_rows(db, archive)] == [1, 2, 3, 4]
+    del archive.delete_archived
+    assert archive.delete_archived(db) == 2
+
+def test_archive_cutoff():
+    assert archive_cutoff(1, datetime(2024, 3, 15)) == datetime(2024, 3, 1)
+    assert archive_cutoff(3, datetime(2024, 1, 15)) == datetime(2023, 11, 1)
+
+def test_parts_from_an_older_schema_read_new_columns_as_null(tmp_path, monkeypatch):
+    from app.core import archive as archive_module
+    db = session_with_checks(tmp_path)
+    older = {column: kind for column, kind in CHECK_EXPORT_SCHEMA.items()
+             if column not in ('partial', 'field_status')}
+    monkeypatch.setattr(archive_module, 'CHECK_EXPORT_SCHEMA', older)
+    archive = CheckArchive(str(tmp_path / 'archive'))
+    archive.roll(db, datetime(2024, 3, 1))
+
+    rows = all_rows(db, archive)
+    assert list(rows[0]) == list(CHECK_EXPORT_SCHEMA)
+    assert rows[0]['partial'] is None and rows[0]['field_status'] is None
+    assert Check(**archive.get(1)).to_dict()['partial'] is False
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.cli import reprocess as reprocess_module
+from app.database import Base
+from app.models.check import Check
+from app.core.artifacts import ArtifactStore, stale_stages
+from app.core.check_parser import CheckParser
+from app.core.fraud_detector import FraudDetector
+from app.core.image_processor import ImageProcessor
+from app.utils.synthetic import make_check_file
+
+class CountingOCR:
+    """Stand-in for OCREngine that counts calls instead of running Tesseract"""
+    
+    def __init__(self):
+        self.config = '--oem 3 --psm 6'
+        self.calls = 0
+    
+    def params(self):
+        return {'config': self.config}
+    
+    def extract_amount(self, region, options=None):
+        self.calls += 1
+        return 12.5
+    
+    def extract_date(self, region, options=None):
+        return None
+    
+    def extract_micr(self, region):
+        return {'bank_code': '123', 'account_number': '456789', 'check_number': '0001'}
+
+@pytest.fixture
+def parser():
+    parser = CheckParser.__new__(CheckParser)
+    parser.workspace = None
+    parser.image_processor = ImageProcessor()
+    parser.ocr_engine = CountingOCR()
+    parser.fraud_detector = FraudDetector()
+    return parser
+
+@pytest.fixture
+def stored_check(parser, tmp_path):
+    _, raw = make_check_file('small', seed=3)
+    artifacts = {}
+    parser.parse_check(raw, artifacts)
+    store = ArtifactStore(str(tmp_path))
+    store.save(7, artifacts['arrays'], artifacts['manifest'], raw=raw)
+    return store
+
+def test_store_round_trip(stored_check):
+    assert list(stored_check.ids()) == ['7']
+    arrays = stored_check.load_arrays(7)
+    assert set(arrays) == {'amount', 'date', 'signature', 'micr', 'fraud_input'}
+    assert stored_check.load_manifest(7)['results']['ocr']['amount_numeric'] == 12.5
+
+def test_nothing_is_stale_after_parsing(parser, stored_check):
+    manifest = stored_check.load_manifest(7)
+    assert stale_stages(manifest, parser.stage_records(manifest['processing_profile'])) == []
+
+def test_ocr_change_reruns_ocr_and_dependents_only(parser, stored_check):
+    parser.ocr_engine.config = '--oem 1 --psm 7'
+    manifest = stored_check.load_manifest(7)
+    assert stale_stages(manifest, parser.stage_records(manifest['processing_profile'])) == ['ocr', 'signature']
+    
+    calls = parser.ocr_engine.calls
+    check_data, arrays, manifest, rerun = parser.reprocess(manifest, stored_check.load_arrays(7))
+    assert rerun == ['ocr', 'signature']
+    assert arrays is None
+    assert parser.ocr_engine.calls == calls + 1
+    assert check_data['account_number'] == '456789'
+    assert stale_stages(manifest, parser.stage_records(manifest['processing_profile'])) == []
+
+def test_preprocess_change_needs_raw_image(parser, stored_check, monkeypatch):
+    from app.core import artifacts
+    monkeypatch.setitem(artifacts.STAGE_VERSIONS, 'preprocess', 2)
+    manifest = stored_check.load_manifest(7)
+    
+    _, _, skipped, rerun = parser.reprocess(manifest, stored_check.load_arrays(7))
+    assert rerun == []
+    # Stored regions are kept, so nothing downstream is recomputed and preprocess stays stale
+    assert stale_stages(skipped, parser.stage_records(manifest['processing_profile'])) == ['preprocess', 'ocr', 'signature']
+    
+    _, arrays, updated, rerun = parser.reprocess(manifest, stored_check.load_arrays(7), stored_check.load_raw(7))
+    assert rerun == ['preprocess', 'ocr', 'signature']
+    assert arrays is not None
+    assert stale_stages(updated, parser.stage_records(manifest['processing_profile'])) == []
+
+def test_reprocess_skips_checks_moved_to_the_archive(parser, stored_check, tmp_path, monkeypatch):
+    engine = create_engine(f'sqlite:///{tmp_path / "checks.db"}')
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(reprocess_module, 'SessionLocal', Session)
+    db = Session()
+    db.add(Check(id=7, amount_numeric=10.0))
+    db.commit()
+    # Check 8 has artifacts but its row was rolled into the Parquet archive
+    stored_check.save(8, stored_check.load_arrays(7), stored_check.load_manifest(7), raw=stored_check.load_raw(7))
+    
+    parser.ocr_engine.config = '--oem 1 --psm 7'
+    counts = reprocess_module.run_reprocess(stored_check, parser)
+    assert (counts['checks'], counts['updated'], counts['archived'], counts['errors']) == (2, 1, 1, 0)
+    assert counts['ocr'] == 1
+    assert db.query(Check).filter(Check.id == 7).first().amount_numeric == 12.5
+    # The archived check's manifest still records the old OCR parameters
+    current = parser.stage_records(stored_check.load_manifest(8)['processing_profile'])
+    assert stale_stages(stored_check.load_manifest(8), current) == ['ocr', 'signature']
+    assert stale_stages(stored_check.load_manifest(7), current) == []
@@ -0,0 +1,144 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models.check import Check
+from app.utils import cache as cache_module
+from app.utils.cache import CachedRecord, LRUCache, invalidate_on_commit, row_version_check
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_get_or_load_only_loads_on_miss():
+    cache = LRUCache()
+    calls = []
+    loader = lambda: calls.append(1) or 'value'
+    
+    assert cache.get_or_load('key', loader) == 'value'
+    assert cache.get_or_load('key', loader) == 'value'
+    assert len(calls) == 1
+    # Missing records are not cached
+    assert cache.get_or_load('missing', lambda: None) is None
+    assert len(cache) == 1
+
+def test_etag_changes_with_content():
+    first = CachedRecord({'id': 1, 'amount_numeric': 10.0})
+    assert first.etag == CachedRecord({'amount_numeric': 10.0, 'id': 1}).etag
+    assert first.etag != CachedRecord({'id': 1, 'amount_numeric': 12.5}).etag
+
+def test_updates_and_deletes_invalidate_after_commit():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    cache = LRUCache()
+    invalidate_on_commit(Session, Check, cache)
+    
+    db = Session()
+    check = Check(amount_numeric=10.0)
+    db.add(check)
+    db.commit()
+    key = str(check.id)
+    cache.put(key, CachedRecord(check.to_dict()))
+    
+    check.amount_numeric = 20.0
+    db.flush()
+    assert cache.get(key) is not None
+    db.rollback()
+    assert cache.get(key) is not None
+    
+    check.amount_numeric = 20.0
+    db.commit()
+    assert cache.get(key) is None
+    
+    cache.put(key, CachedRecord(check.to_dict()))
+    db.delete(check)
+    db.commit()
+    assert cache.get(key) is None
+
+def test_writes_from_another_process_are_detected_once_revalidated(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "checks.db"}')
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    # A separate session factory without the cache's listeners stands in for another process
+    Other = sessionmaker(bind=engine)
+    cache = LRUCache()
+    invalidate_on_commit(Session, Check, cache)
+    # The default max_age of 0 revalidates every hit
+    is_fresh = row_version_check(Session, Check, Check.updated_at)
+    
+    db = Session()
+    check = Check(amount_numeric=10.0)
+    db.add(check)
+    db.commit()
+    key = str(check.id)
+    
+    def load():
+        session = Session()
+        try:
+            row = session.query(Check).filter(Check.id == int(key)).first()
+            return CachedRecord(row.to_dict(), version=row.updated_at) if row else None
+        finally:
+            session.close()
+    
+    first = cache.get_or_load(key, load, is_fresh)
+    assert cache.get_or_load(key, load, is_fresh) is first
+    # With max_age=0 every hit revalidates    
+    other = Other()
+    other.query(Check).filter(Check.id == int(key)).update({'amount_numeric': 20.0})
+    other.commit()
+    updated = cache.get_or_load(key, load, is_fresh)
+    assert updated.etag != first.etag and '20.0' in updated.body
+    
+    other.query(Check).filter(Check.id == int(key)).delete()
+    other.commit()
+    assert cache.get_or_load(key, load, is_fresh) is None
+    assert len(cache) == 0
+
+def test_hits_within_max_age_run_no_query(tmp_path, monkeypatch):
+    engine = create_engine(f'sqlite:///{tmp_path / "checks.db"}')
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    Other = sessionmaker(bind=engine)
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, 'monotonic', lambda: now[0])
+    cache = LRUCache()
+    invalidate_on_commit(Session, Check, cache)
+    is_fresh = row_version_check(Session, Check, Check.updated_at, max_age=2.0)
+    
+    db = Session()
+    check = Check(amount_numeric=10.0)
+    db.add(check)
+    db.commit()
+    key = str(check.id)
+    load = lambda: CachedRecord(check.to_dict(), version=check.updated_at)
+    first = cache.get_or_load(key, load, is_fresh)
+    
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    now[0] += 1.0
+    assert cache.get_or_load(key, load, is_fresh) is first
+    assert statements == []
+    
+    # A write from another process is served stale only until the record is due
+    other = Other()
+    other.query(Check).filter(Check.id == int(key)).update({'amount_numeric': 20.0})
+    other.commit()
+    statements.clear()
+    assert cache.get_or_load(key, load, is_fresh) is first
+    assert statements == []
+    now[0] += 1.5
+    db.refresh(check)
+    assert '20.0' in cache.get_or_load(key, load, is_fresh).body
+    assert len(statements) >= 1
+    
+    # A local commit evicts immediately, without waiting for max_age
+    check.amount_numeric = 30.0
+    db.commit()
+    assert cache.get(key) is None
@@ -0,0 +1,128 @@
+import time
+import numpy as np
+import pytest
+from app.config.config import settings
+from app.core.check_parser import CheckParser
+from app.core.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from app.core.fraud_detector import FraudDetector
+from app.core.image_processor import ImageProcessor
+from app.utils.metrics import Metrics, metrics
+from app.utils.synthetic import make_check_file, make_check_image
+
+class SlowOCR:
+    """Stand-in for OCREngine whose amount read takes longer than the budget"""
+
+    def __init__(self, amount_seconds=0.0):
+        self.amount_seconds = amount_seconds
+
+    def params(self):
+        return {}
+
+    def extract_amount(self, region, options=None):
+        time.sleep(self.amount_seconds)
+        current_deadline().check('ocr.amount')
+        return 12.5
+
+    def extract_date(self, region, options=None):
+        current_deadline().check('ocr.date')
+        return None
+
+    def extract_micr(self, region):
+        return {'bank_code': '123', 'account_number': '456789', 'check_number': '0001'}
+
+def make_parser(ocr):
+    parser = CheckParser.__new__(CheckParser)
+    parser.workspace = None
+    parser.image_processor = ImageProcessor()
+    parser.ocr_engine = ocr
+    parser.fraud_detector = FraudDetector()
+    return parser
+
+def test_deadline_scope_is_restored():
+    deadline = Deadline(5.0)
+    with deadline_scope(deadline):
+        assert current_deadline() is deadline
+        assert 4.0 < deadline.timeout() <= 5.0
+        assert deadline.timeout(cap=1.0) == 1.0
+    assert current_deadline() is None
+
+def test_expired_deadline_raises_and_is_counted():
+    before = metrics.value('deadline_exceeded_total', stage='test')
+    deadline = Deadline(0.0)
+    with pytest.raises(DeadlineExceeded):
+        deadline.check('test')
+    assert metrics.value('deadline_exceeded_total', stage='test') == before + 1
+
+def test_preprocessing_steps_are_skipped_by_their_estimated_cost(monkeypatch):
+    image = make_check_image(800, 350)
+    processor = ImageProcessor()
+    skipped = lambda step: metrics.value('stages_skipped_total', stage=f'preprocess.{step}')
+    denoise, deskew = skipped('denoise'), skipped('deskew')
+    monkeypatch.setattr(settings, 'DEADLINE_OCR_RESERVE_S', 3.0)
+    monkeypatch.setattr(settings, 'PREPROCESS_DESKEW_S_PER_MPX', 0.1)
+    
+    # 0.28 megapixels: denoising fits in 3.5s next to the OCR reserve
+    monkeypatch.setattr(settings, 'PREPROCESS_DENOISE_S_PER_MPX', 1.0)
+    with deadline_scope(Deadline(3.5)):
+        processor.preprocess_image(image)
+    assert (skipped('denoise'), skipped('deskew')) == (denoise, deskew)
+    
+    # The same budget cannot fit a denoiser ten times slower, but still fits deskewing
+    monkeypatch.setattr(settings, 'PREPROCESS_DENOISE_S_PER_MPX', 10.0)
+    with deadline_scope(Deadline(3.5)):
+        processor.preprocess_image(image)
+    assert (skipped('denoise'), skipped('deskew')) == (denoise + 1, deskew)
+
+def test_full_parse_within_budget():
+    _, raw = make_check_file('small', seed=1)
+    result = make_parser(SlowOCR()).parse_check(raw, profile='fast', deadline=Deadline(30.0))
+
+    assert result['partial'] is False
+    assert result['field_status'] == {'amount': 'ok', 'date': 'not_found', 'micr': 'ok',
+                                      'fraud': 'ok', 'signature': 'ok'}
+
+def test_slow_ocr_returns_partial_results():
+    _, raw = make_check_file('small', seed=1)
+    artifacts = {}
+    started = time.monotonic()
+    result = make_parser(SlowOCR(amount_seconds=0.3)).parse_check(raw, artifacts, profile='fast',
+                                                                    deadline=Deadline(0.2))
+
+    assert time.monotonic() - started < 1.0
+    assert result['partial'] is True
+    assert result['amount_numeric'] == 0.0
+    assert result['field_status']['amount'] == 'timeout'
+    assert result['field_status']['date'] == 'timeout'
+    assert result['field_status']['fraud'] == 'skipped'
+    assert result['field_status']['signature'] == 'skipped'
+    # Unfinished stages are left out of the stored manifest
+    assert set(artifacts['manifest']['stages']) == {'preprocess'}
+
+def test_reprocessing_completes_partial_results():
+    _, raw = make_check_file('small', seed=1)
+    artifacts = {}
+    ocr = SlowOCR(amount_seconds=0.3)
+    parser = make_parser(ocr)
+    parser.parse_check(raw, artifacts, profile='fast', deadline=Deadline(0.2))
+
+    ocr.amount_seconds = 0.0
+    with deadline_scope(Deadline(30.0)):
+        check_data, arrays, manifest, rerun = parser.reprocess(artifacts['manifest'], artifacts['arrays'])
+    assert rerun == ['ocr', 'fraud', 'signature']
+    assert arrays is None
+    assert check_data['amount_numeric'] == 12.5
+    assert check_data['partial'] is False
+    assert check_data['field_status'] == {'amount': 'ok', 'date': 'not_found', 'micr': 'ok',
+                                          'fraud': 'ok', 'signature': 'ok'}
+    assert manifest['field_status'] == check_data['field_status']
+
+def test_metrics_render_prometheus_text():
+    registry = Metrics()
+    registry.describe('things_total', "Things")
+    registry.increment('things_total', stage='a')
+    registry.increment('things_total', 2, stage='a')
+
+    text = registry.render()
+    assert '# TYPE things_total counter' in text
+    assert 'things_total{stage="a",pid="' in text
+    assert text.rstrip().endswith(' 3')
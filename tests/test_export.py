@@ -0,0 +1,70 @@
+import csv
+import io
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models.check import Check
+from app.utils.export import (iter_check_chunks, parse_chunk_size, parse_date_bound, resolve_columns,
+                              stream_export)
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for day in range(1, 6):
+        session.add(Check(check_number=f'CHK-{day}', amount_numeric=day * 10.0, bank_code='BNK',
+                          created_at=datetime(2024, 1, day, 12)))
+    session.add(Check(check_number='CHK-6', amount_numeric=0.0, partial=True,
+                      field_status='{"amount": "timeout"}', created_at=datetime(2024, 1, 6, 12)))
+    session.commit()
+    yield session
+    session.close()
+
+def test_csv_export_streams_projected_columns(db):
+    columns = resolve_columns('id,amount_numeric')
+    parts = list(stream_export(iter_check_chunks(db, columns, chunk_size=2), 'csv', columns))
+    # Header first, then one block per chunk of two rows
+    assert parts[0] == b'id,amount_numeric\r\n'
+    assert len(parts) == 4
+    rows = list(csv.DictReader(io.StringIO(b''.join(parts).decode('utf-8'))))
+    assert [row['amount_numeric'] for row in rows] == ['10.0', '20.0', '30.0', '40.0', '50.0', '0.0']
+    assert set(rows[0]) == {'id', 'amount_numeric'}
+
+def test_parquet_export_writes_one_row_group_per_chunk(db):
+    pq = pytest.importorskip('pyarrow.parquet')
+    columns = resolve_columns('check_number,created_at')
+    data = b''.join(stream_export(iter_check_chunks(db, columns, chunk_size=2), 'parquet', columns))
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+    assert parquet_file.metadata.num_row_groups == 3
+    table = parquet_file.read()
+    assert table.column_names == ['check_number', 'created_at']
+    assert table.column('check_number').to_pylist() == [f'CHK-{day}' for day in range(1, 7)]
+
+def test_partial_results_are_exported_with_their_status(db):
+    columns = resolve_columns('check_number,partial,field_status')
+    rows = list(csv.DictReader(io.StringIO(b''.join(stream_export(iter_check_chunks(db, columns), 'csv',
+                                                                     columns)).decode('utf-8'))))
+    assert [row['partial'] for row in rows] == ['False'] * 5 + ['True']
+    assert rows[-1]['field_status'] == '{"amount": "timeout"}'
+    check = db.query(Check).filter(Check.check_number == 'CHK-6').one()
+    assert check.to_dict()['field_status'] == {'amount': 'timeout'}
+
+def test_date_bounds_include_the_whole_end_day(db):
+    start = parse_date_bound('2024-01-02')
+    end = parse_date_bound('2024-01-04', inclusive_end=True)
+    rows = [row for chunk in iter_check_chunks(db, ['check_number'], start, end) for row in chunk]
+    assert [row['check_number'] for row in rows] == ['CHK-2', 'CHK-3', 'CHK-4']
+
+def test_invalid_parameters_are_rejected():
+    with pytest.raises(ValueError):
+        resolve_columns('id,secret')
+    with pytest.raises(ValueError):
+        parse_date_bound('01/02/2024')
+    assert parse_chunk_size(None, 5000) == 5000
+    assert parse_chunk_size('100', 5000) == 100
+    for value in ('0', '-5', 'many'):
+        with pytest.raises(ValueError):
+            parse_chunk_size(value, 5000)
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+from app.core.features import CheckFeatures
+from app.core.fraud_detector import FraudDetector, FRAUD_INPUT_SIZE
+from app.core.image_processor import ImageProcessor
+from app.core.signature_index import extract_signature_features
+from app.core.validator import CheckValidator
+from app.utils.synthetic import make_check_image
+
+def check_features(blank_signature=False):
+    image = make_check_image(1600, 700, seed=4)
+    if blank_signature:
+        height, width = image.shape[:2]
+        image[int(height * 0.6):int(height * 0.8), int(width * 0.6):int(width * 0.95)] = 245
+    processor = ImageProcessor()
+    regions = processor.extract_regions(processor.preprocess_image(image, {'threshold': 'otsu', 'denoise': False,
+                                                                          'deskew': False}))
+    return CheckFeatures(image, regions)
+
+def test_features_are_memoized():
+    features = check_features()
+    assert features.gray is features.gray
+    assert features.thumbnail(FRAUD_INPUT_SIZE) is features.thumbnail(FRAUD_INPUT_SIZE)
+    assert features.pyramid_level(2).shape == (175, 400)
+
+def test_thumbnail_close_to_direct_resize():
+    features = check_features()
+    direct = cv2.resize(features.gray, FRAUD_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+    thumbnail = features.thumbnail(FRAUD_INPUT_SIZE)
+    assert thumbnail.shape == (224, 224)
+    assert np.abs(thumbnail.astype(int) - direct.astype(int)).mean() < 2.0
+
+def test_box_stats_match_numpy():
+    features = check_features()
+    top, bottom, left, right = features.region_box('amount')
+    crop = features.gray[top:bottom, left:right].astype(np.float64)
+    mean, std = features.box_stats(top, bottom, left, right)
+    assert abs(mean - crop.mean()) < 1e-6
+    assert abs(std - crop.std()) < 1e-6
+
+def test_fraud_and_signature_read_shared_features():
+    features = check_features()
+    detector = FraudDetector()
+    detector.detect_fraud(features.image, features)
+    assert ('thumbnail', FRAUD_INPUT_SIZE) in features._cache
+
+    region = features.region('signature')
+    assert np.array_equal(extract_signature_features(region, features.region_ink('signature')),
+                          extract_signature_features(region))
+
+def test_validator_flags_blank_signature():
+    validator = CheckValidator()
+    assert validator._validate_signature_present(check_features()) == (True, "")
+    assert validator._validate_signature_present(check_features(blank_signature=True)) == (False, "Signature is missing")
+
+    _, errors = validator.validate_check({}, check_features(blank_signature=True))
+    assert "Signature is missing" in errors
+    assert "MICR line is missing" not in errors
@@ -0,0 +1,47 @@
+from datetime import datetime
+import pytest
+from app.core.field_parser import FieldParser, get_field_parser
+
+def test_amounts_follow_the_locale():
+    eng = FieldParser('eng')
+    assert eng.parse_amount('$1,234.56') == 1234.56
+    assert eng.parse_amount('Amount 1234.56') == 1234.56
+    assert eng.parse_amount('no amount') is None
+
+    fra = FieldParser('fra')
+    assert fra.parse_amount('1 234,56 €') == 1234.56
+    assert fra.parse_amount('1.234,56') == 1234.56
+    assert fra.parse_amount('150,5') == 150.5
+    assert FieldParser('spa').parse_amount('12.345') == 12345.0
+
+def test_numeric_dates_infer_day_and_month_order():
+    eng = FieldParser('eng')
+    assert eng.parse_date('03/04/2024') == datetime(2024, 3, 4)
+    assert eng.parse_date('13/05/2024') == datetime(2024, 5, 13)
+    assert eng.parse_date('1-2-24') == datetime(2024, 1, 2)
+    assert eng.parse_date('2024-03-12') == datetime(2024, 3, 12)
+    # An impossible first match is skipped
+    assert eng.parse_date('02/30/2024 or 02/03/2024') == datetime(2024, 2, 3)
+    assert eng.parse_date('12/03/202') is None
+
+    fra = FieldParser('fra')
+    assert fra.parse_date('03/04/2024') == datetime(2024, 4, 3)
+    assert fra.parse_date('12.03.99') == datetime(1999, 3, 12)
+    assert fra.parse_date('04/25/2024') == datetime(2024, 4, 25)
+
+def test_written_dates():
+    assert FieldParser('eng').parse_date('March 5, 2024') == datetime(2024, 3, 5)
+    assert FieldParser('fra').parse_date('le 1er fevrier 2024') == datetime(2024, 2, 1)
+    assert FieldParser('fra').parse_date('5 juil. 2024') == datetime(2024, 7, 5)
+    assert FieldParser('spa').parse_date('5 de marzo de 2024') == datetime(2024, 3, 5)
+
+def test_batch_apis_match_single_parses():
+    parser = get_field_parser('fra')
+    texts = ['1 234,56', '', 'rien', '1 234,56', '7,00 €']
+    assert parser.parse_amounts(texts) == [1234.56, None, None, 1234.56, 7.0]
+    assert parser.parse_dates(['12/03/2024', 'rien']) == [datetime(2024, 3, 12), None]
+    assert get_field_parser('fra') is parser
+
+def test_unknown_locale():
+    with pytest.raises(ValueError):
+        FieldParser('deu')
@@ -0,0 +1,143 @@
+import io
+import shutil
+import numpy as np
+import cv2
+import pytest
+from PIL import Image
+from app.core.check_parser import CheckParser
+from app.core.fraud_detector import FraudDetector
+from app.core.image_processor import ImageProcessor, ImageQualityError
+from app.utils.metrics import metrics
+from app.utils.synthetic import make_check_image
+
+def make_sheet(bordered=True):
+    # Letter page at 300 DPI with three checks stacked vertically
+    sheet = np.full((3300, 2550, 3), 255, dtype=np.uint8)
+    boxes = []
+    for i in range(3):
+        x, y, w, h = 100, 150 + i * 1050, 2300, 1000
+        if bordered:
+            cv2.rectangle(sheet, (x, y), (x + w, y + h), (235, 225, 210), -1)
+            cv2.rectangle(sheet, (x, y), (x + w, y + h), (90, 90, 90), 4)
+        for line in range(6):
+            cv2.putText(sheet, "PAY TO THE ORDER OF 1234", (x + 60, y + 120 + line * 150),
+                        cv2.FONT_HERSHEY_SIMPLEX, 2.5, (0, 0, 0), 5)
+        boxes.append((x, y, w, h))
+    return sheet, boxes
+
+def overlap(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    return iw * ih / float(aw * ah)
+
+def test_detects_bordered_checks_on_sheet():
+    sheet, expected = make_sheet(bordered=True)
+    boxes = ImageProcessor().detect_checks(sheet)
+    
+    assert len(boxes) == 3
+    for box, truth in zip(boxes, expected):
+        assert overlap(truth, box) > 0.95
+
+def test_detects_borderless_checks_from_projection():
+    sheet, expected = make_sheet(bordered=False)
+    boxes = ImageProcessor().detect_checks(sheet)
+    
+    assert len(boxes) == 3
+    for box, truth in zip(boxes, expected):
+        assert truth[1] <= box[1] + box[3] // 2 <= truth[1] + truth[3]
+
+def test_single_check_is_returned_whole():
+    image = np.full((1000, 2200, 3), 255, dtype=np.uint8)
+    assert ImageProcessor().detect_checks(image) == [(0, 0, 2200, 1000)]
+
+def rejection_codes(image):
+    return [reason['code'] for reason in ImageProcessor().assess_quality(image)['reasons']]
+
+def test_quality_gate_accepts_synthetic_checks():
+    assert ImageProcessor().assess_quality(make_check_image(1600, 700, seed=1))['passed']
+    assert ImageProcessor().assess_quality(make_check_image(1600, 700, noise=12.0, skew=2.0, seed=1))['passed']
+
+def test_quality_gate_rejects_unusable_scans():
+    image = make_check_image(1600, 700, seed=1)
+    assert rejection_codes(cv2.GaussianBlur(image, (0, 0), 6)) == ['blurry']
+    assert 'underexposed' in rejection_codes((image * 0.2).astype(np.uint8))
+    # Bottom of the check cut off
+    assert rejection_codes(image[:450]) == ['micr_missing', 'aspect_ratio']
+
+def test_rejection_reasons_are_structured():
+    blank = np.full((700, 1600, 3), 245, dtype=np.uint8)
+    reasons = ImageProcessor().assess_quality(blank)['reasons']
+    blurry = next(reason for reason in reasons if reason['code'] == 'blurry')
+    assert blurry['value'] == 0.0
+    assert blurry['threshold'] > 0
+    assert blurry['message']
+
+def test_parser_rejects_before_preprocessing():
+    parser = CheckParser.__new__(CheckParser)
+    parser.image_processor = ImageProcessor()
+    parser.extract_check_regions = lambda *args: pytest.fail("preprocessing ran on a rejected scan")
+    before = metrics.value('quality_gate_total', decision='rejected')
+    
+    with pytest.raises(ImageQualityError) as error:
+        parser.parse_image(cv2.GaussianBlur(make_check_image(1600, 700, seed=1), (0, 0), 6))
+    assert error.value.reasons[0]['code'] == 'blurry'
+    assert metrics.value('quality_gate_total', decision='rejected') == before + 1
+
+class StubOCR:
+    """Stand-in for OCREngine, so the pipeline runs without Tesseract"""
+
+    def params(self):
+        return {}
+
+    def extract_amount(self, region, options=None):
+        return 12.5
+
+    def extract_date(self, region, options=None):
+        return None
+
+    def extract_micr(self, region):
+        return {'bank_code': '123', 'account_number': '456789', 'check_number': '0001'}
+
+def make_stub_parser():
+    parser = CheckParser.__new__(CheckParser)
+    parser.workspace = None
+    parser.image_processor = ImageProcessor()
+    parser.ocr_engine = StubOCR()
+    parser.fraud_detector = FraudDetector()
+    return parser
+
+def letter_page(checks=1):
+    # US letter at 200 DPI with checks printed at their real size
+    page = np.full((2200, 1700, 3), 255, dtype=np.uint8)
+    check = cv2.resize(make_check_image(1600, 700, seed=1), (1200, 525), interpolation=cv2.INTER_AREA)
+    for i in range(checks):
+        page[150 + i * 750:675 + i * 750, 250:1450] = check
+    return page
+
+def test_checks_on_a_page_pass_the_quality_gate():
+    parser = make_stub_parser()
+    page = letter_page(checks=2)
+    # The page as a whole has neither the proportions nor the MICR band of a check
+    with pytest.raises(ImageQualityError):
+        parser.parse_image(page)
+    
+    checks = parser.crop_checks(page)
+    assert [bbox['y'] for bbox, _ in checks] == pytest.approx([150, 900], abs=10)
+    for _, crop in checks:
+        assert parser.parse_image(crop)['amount_numeric'] == 12.5
+
+def test_pdf_page_parses_end_to_end():
+    if shutil.which('pdftoppm') is None:
+        pytest.skip("poppler is not installed")
+    buffer = io.BytesIO()
+    Image.fromarray(cv2.cvtColor(letter_page(), cv2.COLOR_BGR2RGB)).save(buffer, 'PDF', resolution=200.0)
+    parser = make_stub_parser()
+    
+    [page] = list(parser.image_processor.pdf_pages(buffer.getvalue(), dpi=200))
+    assert page.shape[:2] == (2200, 1700)
+    [(bbox, crop)] = parser.crop_checks(page)
+    result = parser.parse_image(crop)
+    assert result['partial'] is False
+    assert result['account_number'] == '456789'
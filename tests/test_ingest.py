@@ -0,0 +1,84 @@
+import csv
+import pytest
+from app.cli import ingest
+from app.cli.ingest import IngestCheckpoint, run_ingest
+
+def fake_parse(sources, workers, max_in_flight, profile=None):
+    for source, image_data in sources:
+        yield ingest._to_row(source, {'amount_numeric': len(image_data)}, None)
+
+def scans(tmp_path, count=5):
+    directory = tmp_path / 'scans'
+    directory.mkdir()
+    for index in range(count):
+        (directory / f'check-{index}.png').write_bytes(b'x' * (index + 1))
+    return str(directory)
+
+def crash_on_chunk(monkeypatch, chunk):
+    """Make the checkpoint commit of the given chunk fail, as if the process died after the write"""
+    mark_done = IngestCheckpoint.mark_done
+    calls = []
+
+    def failing(self, sources, position):
+        if sources:
+            calls.append(sources)
+            if len(calls) == chunk:
+                raise RuntimeError("crash")
+        mark_done(self, sources, position)
+
+    monkeypatch.setattr(IngestCheckpoint, 'mark_done', failing)
+
+def read_sources(output, fmt):
+    if fmt == 'csv':
+        with open(output, newline='', encoding='utf-8') as f:
+            return [row['source'] for row in csv.DictReader(f)]
+    import pyarrow.parquet as pq
+    return pq.read_table(output).column('source').to_pylist()
+
+@pytest.mark.parametrize('fmt,name', [('csv', 'results.csv'), ('parquet', 'results.parquet')])
+def test_resume_after_crash_does_not_duplicate_rows(tmp_path, monkeypatch, fmt, name):
+    monkeypatch.setattr(ingest, '_parse_with_pool', fake_parse)
+    paths = [scans(tmp_path)]
+    output = str(tmp_path / name)
+    checkpoint = output + '.checkpoint'
+
+    with monkeypatch.context() as patch:
+        crash_on_chunk(patch, 2)
+        with pytest.raises(RuntimeError):
+            run_ingest(paths, output, fmt, checkpoint, workers=1, chunk_size=2, progress_interval=60)
+    # The second chunk reached the output but not the checkpoint
+    assert len(read_sources(output, fmt)) == 4
+
+    summary = run_ingest(paths, output, fmt, checkpoint, workers=1, chunk_size=2, progress_interval=60)
+    assert summary['skipped'] == 2 and summary['processed'] == 3
+    sources = read_sources(output, fmt)
+    assert sorted(sources) == sorted(set(sources)) and len(sources) == 5
+
+def test_crash_before_first_chunk_is_undone(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, '_parse_with_pool', fake_parse)
+    paths = [scans(tmp_path, 3)]
+    output = str(tmp_path / 'results.csv')
+    with monkeypatch.context() as patch:
+        crash_on_chunk(patch, 1)
+        with pytest.raises(RuntimeError):
+            run_ingest(paths, output, 'csv', output + '.checkpoint', workers=1, chunk_size=2, progress_interval=60)
+
+    run_ingest(paths, output, 'csv', output + '.checkpoint', workers=1, chunk_size=2, progress_interval=60)
+    assert len(read_sources(output, 'csv')) == 3
+
+def test_checkpoint_ignores_a_torn_line(tmp_path):
+    path = str(tmp_path / 'run.checkpoint')
+    checkpoint = IngestCheckpoint(path)
+    checkpoint.mark_done(['a.png', 'b.png'], 120)
+    checkpoint.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"sources": ["c.png"], "posi')
+
+    resumed = IngestCheckpoint(path)
+    assert 'b.png' in resumed and 'c.png' not in resumed
+    assert resumed.position == 120
+    resumed.mark_done(['c.png'], 180)
+    resumed.close()
+    final = IngestCheckpoint(path)
+    assert 'c.png' in final
+    final.close()
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from app.core.jobs import JobRunner, JobStore, run_job, stream_events, summarize
+
+def messages(stream):
+    """(id, event) of each SSE message, skipping the retry hint and keep-alives"""
+    result = []
+    for message in stream:
+        fields = dict(line.split(': ', 1) for line in message.strip().splitlines() if not line.startswith(':'))
+        if 'id' in fields:
+            result.append((int(fields['id']), fields['event']))
+    return result
+
+def fail(error):
+    raise error
+
+def test_job_events_and_summary(tmp_path):
+    store = JobStore(str(tmp_path))
+    job_id, log = store.create()
+    items = [({'file': 'a.png'}, lambda: 1), ({'file': 'b.png'}, lambda: fail(ValueError("bad image"))),
+             ({'file': 'c.png'}, lambda: 3)]
+    run_job(log, items, lambda value: {'value': value}, ['a.png', 'b.png', 'c.png'])
+
+    events, _ = store.open(job_id).read()
+    assert [event['event'] for event in events] == ['started', 'item', 'item', 'item', 'done']
+    assert events[2]['data']['error'] == "bad image"
+    assert events[3]['data']['check_data'] == {'value': 3}
+    assert summarize(events) == {'status': 'done', 'items': 3, 'succeeded': 2, 'failed': 1, 'last_event_id': 5}
+
+def test_stream_resumes_after_last_event_id(tmp_path):
+    store = JobStore(str(tmp_path))
+    job_id, log = store.create()
+    run_job(log, [({'file': 'a.png'}, lambda: 1), ({'file': 'b.png'}, lambda: 2)], lambda value: {})
+
+    assert messages(stream_events(log)) == [(1, 'started'), (2, 'item'), (3, 'item'), (4, 'done')]
+    assert messages(stream_events(log, last_event_id=2)) == [(3, 'item'), (4, 'done')]
+
+def test_stream_follows_a_running_job(tmp_path):
+    store = JobStore(str(tmp_path))
+    job_id, log = store.create()
+    release = threading.Event()
+
+    def process(value):
+        release.wait(5)
+        return {'value': value}
+
+    worker = threading.Thread(target=run_job, args=(log, [({'file': 'a.png'}, lambda: 1)], process))
+    worker.start()
+    stream = stream_events(store.open(job_id), poll_interval=0.01)
+    assert next(stream).startswith('retry:')
+    assert messages([next(stream)]) == [(1, 'started')]
+    release.set()
+    assert messages(stream) == [(2, 'item'), (3, 'done')]
+    worker.join()
+
+def test_stale_job_is_reported_abandoned_without_writing(tmp_path):
+    store = JobStore(str(tmp_path))
+    job_id, log = store.create()
+    log.append('started', {'files': []})
+    past = time.time() - 60
+    os.utime(log.path, (past, past))
+
+    stream = list(stream_events(log, stale_after=30, poll_interval=0.01))
+    assert messages(stream) == [(1, 'started')]
+    assert stream[-1].startswith('event: abandoned\n')
+    # Only the owning process writes the log
+    events, _ = log.read()
+    assert [event['event'] for event in events] == ['started']
+    assert summarize(events, log.is_stale(30))['status'] == 'abandoned'
+    assert summarize(events)['status'] == 'running'
+
+def test_heartbeat_keeps_queued_jobs_fresh(tmp_path):
+    store = JobStore(str(tmp_path))
+    runner = JobRunner(workers=1, heartbeat=0.05)
+    release = threading.Event()
+    try:
+        _, running = store.create()
+        runner.submit(running, [({'file': 'a.png'}, lambda: 1)], lambda value: release.wait(5) and {})
+        _, queued = store.create()
+        runner.submit(queued, [({'file': 'b.png'}, lambda: 2)], lambda value: {})
+
+        events, _ = queued.read()
+        assert [event['event'] for event in events] == ['queued']
+        assert summarize(events)['status'] == 'queued'
+        past = time.time() - 60
+        os.utime(queued.path, (past, past))
+        time.sleep(0.3)
+        # Waiting behind the running job, but its process is alive
+        assert not queued.is_stale(30)
+    finally:
+        release.set()
+        runner.shutdown()
+    assert summarize(queued.read()[0])['status'] == 'done'
+
+def test_unknown_job_ids(tmp_path):
+    store = JobStore(str(tmp_path))
+    assert store.open('0' * 32) is None
+    assert store.open('../etc/passwd') is None
@@ -0,0 +1,29 @@
+import cv2
+import numpy as np
+import pytest
+from app.cli.loadtest import build_report
+from app.utils.synthetic import CHECK_VARIANTS, make_check_file, parse_mix
+
+def test_synthetic_checks_decode_at_variant_size():
+    for variant, (width, height, extension, _, _) in CHECK_VARIANTS.items():
+        filename, data = make_check_file(variant, seed=1)
+        assert filename.endswith(extension)
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        assert image.shape == (height, width, 3)
+
+def test_parse_mix():
+    assert parse_mix('clean=3, noisy') == [('clean', 3.0), ('noisy', 1.0)]
+    with pytest.raises(ValueError):
+        parse_mix('blurry=1')
+
+def test_report_percentiles_and_errors():
+    records = [(i / 100, (i + 1) / 1000, 500 if i % 10 == 0 else 200, 'clean') for i in range(100)]
+    records.append((0.5, 0.2, None, 'noisy'))
+    report = build_report(records, 1.0, [], {})
+    
+    assert report['requests'] == 101
+    assert report['errors'] == 11
+    assert report['status_codes'] == {'200': 90, '500': 10, 'connection_error': 1}
+    assert report['latency_ms']['p50'] == pytest.approx(51.0)
+    assert report['variants']['noisy']['errors'] == 1
+    assert report['timeline'][0]['requests'] == 101
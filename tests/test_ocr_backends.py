@@ -0,0 +1,70 @@
+import threading
+import numpy as np
+import pytest
+from app.core.ocr_backends import ONNXDigitBackend, _MicroBatcher, ctc_greedy_decode
+
+def test_ctc_greedy_decode_merges_repeats_and_drops_blanks():
+    # Classes: 0 blank, 1 '1', 2 '2'
+    steps = [1, 1, 0, 1, 2, 2, 0, 0]
+    logits = np.eye(3)[steps][None]
+    assert ctc_greedy_decode(logits, '12') == ['112']
+
+def test_micro_batcher_groups_concurrent_requests():
+    sizes = []
+    def run_batch(items):
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+    batcher = _MicroBatcher(run_batch, max_batch=8, max_wait=0.2)
+    
+    results = {}
+    def submit(i):
+        results[i] = batcher.submit(i).result()
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+    
+    assert results == {i: i * 2 for i in range(8)}
+    assert sum(sizes) == 8 and len(sizes) < 8
+
+@pytest.fixture
+def blob_model(tmp_path):
+    """Model that emits '0' for every inked column run and blank for white columns"""
+    onnx = pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+    from onnx import TensorProto, helper
+    
+    graph = helper.make_graph(
+        [
+            helper.make_node('ReduceMin', ['x'], ['column'], axes=[1, 2], keepdims=0),
+            helper.make_node('Unsqueeze', ['column', 'axis'], ['blank']),
+            helper.make_node('Sub', ['one', 'blank'], ['ink']),
+            helper.make_node('Concat', ['blank', 'ink'], ['y'], axis=2)
+        ],
+        'blobs',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, ['n', 1, 'h', 'w'])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, ['n', 'w', 2])],
+        [helper.make_tensor('axis', TensorProto.INT64, [1], [2]),
+         helper.make_tensor('one', TensorProto.FLOAT, [], [1.0])]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)], ir_version=7)
+    path = tmp_path / 'blobs.onnx'
+    onnx.save(model, str(path))
+    return str(path)
+
+def make_blobs(count, width=20):
+    image = np.full((32, width * (2 * count + 1)), 255, dtype=np.uint8)
+    for i in range(count):
+        image[8:24, width * (2 * i + 1):width * (2 * i + 2)] = 0
+    return image
+
+def test_onnx_backend_batches_crops_of_different_widths(blob_model):
+    backend = ONNXDigitBackend(blob_model, '0', max_wait_ms=1)
+    try:
+        assert backend.recognize_batch([make_blobs(1), make_blobs(3), make_blobs(2)], 'amount') == ['0', '000', '00']
+        assert backend.recognize(make_blobs(4), 'amount') == '0000'
+        assert backend.params()['model'] == 'blobs.onnx'
+    finally:
+        backend.close()
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+import pytest
+from app.core.check_parser import CheckParser, select_profile
+from app.core.image_processor import ImageProcessor
+from app.utils.synthetic import CHECK_VARIANTS, make_check_image
+
+def variant_image(name, seed=1):
+    width, height, _, noise, skew = CHECK_VARIANTS[name]
+    return make_check_image(width, height, noise, skew, seed)
+
+@pytest.fixture
+def parser():
+    # Only the image processor is needed to resolve profiles
+    parser = CheckParser.__new__(CheckParser)
+    parser.image_processor = ImageProcessor()
+    return parser
+
+def test_fast_profile_is_otsu_threshold_only():
+    image = variant_image('clean')
+    processed = ImageProcessor().preprocess_image(image, {'threshold': 'otsu', 'denoise': False, 'deskew': False})
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    expected = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    assert np.array_equal(processed, expected)
+
+def test_default_options_match_accurate_profile():
+    image = variant_image('small')
+    processor = ImageProcessor()
+
+    accurate = {'threshold': 'adaptive', 'denoise': True, 'denoise_search_window': 21,
+                'deskew': True, 'interpolation': 'cubic'}
+    assert np.array_equal(processor.preprocess_image(image), processor.preprocess_image(image, accurate))
+
+def test_quality_estimate_separates_clean_and_noisy_scans():
+    processor = ImageProcessor()
+    clean = processor.estimate_quality(variant_image('clean'))
+    noisy = processor.estimate_quality(variant_image('noisy'))
+
+    assert clean['noise'] < 1.0
+    assert noisy['noise'] > 4.0
+
+def test_auto_picks_fast_for_clean_and_accurate_for_noisy(parser):
+    assert parser.resolve_profile('auto', variant_image('clean'))[0] == 'fast'
+    assert parser.resolve_profile('auto', variant_image('noisy'))[0] == 'accurate'
+
+def test_select_profile_thresholds():
+    assert select_profile({'noise': 0.5, 'sharpness': 3000.0, 'skew': 0.0}) == 'fast'
+    # Skewed or blurry scans still need deskewing
+    assert select_profile({'noise': 0.5, 'sharpness': 3000.0, 'skew': 2.0}) == 'balanced'
+    assert select_profile({'noise': 0.5, 'sharpness': 100.0, 'skew': 0.0}) == 'balanced'
+    assert select_profile({'noise': 9.0, 'sharpness': 3000.0, 'skew': 0.0}) == 'accurate'
+
+def test_explicit_and_unknown_profiles(parser):
+    image = variant_image('small')
+    name, options = parser.resolve_profile('balanced', image)
+    assert name == 'balanced'
+    assert options['image']['denoise_search_window'] == 11
+    with pytest.raises(ValueError):
+        parser.resolve_profile('turbo', image)
@@ -0,0 +1,128 @@
+import os
+import signal
+import socket
+import threading
+import time
+import urllib.request
+
+from app.server import PreforkServer, WorkerServer
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def pid_app(environ, start_response):
+    if environ['PATH_INFO'] == '/slow':
+        time.sleep(3.0)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode()]
+
+
+def get(port, timeout=10.0, path='/'):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=timeout) as response:
+        return response.read().decode()
+
+
+def start_master(port, **kwargs):
+    master = os.fork()
+    if master == 0:
+        code = 0
+        try:
+            PreforkServer(pid_app, '127.0.0.1', port, warmup=False, **kwargs).run()
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    return master
+
+
+def wait_until_serving(port):
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            return get(port, timeout=2.0)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def test_accepts_only_when_a_thread_is_free():
+    release = threading.Event()
+    started = []
+
+    def blocking_app(environ, start_response):
+        started.append(time.monotonic())
+        release.wait(10)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    sock = socket.create_server(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    server = WorkerServer(blocking_app, sock, threads=2)
+    server.timeout = 0.1
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            server.handle_request()
+
+    accept_loop = threading.Thread(target=serve, daemon=True)
+    accept_loop.start()
+    clients = [threading.Thread(target=get, args=(port,), daemon=True) for _ in range(3)]
+    try:
+        for client in clients:
+            client.start()
+        time.sleep(1.0)
+        # Both threads are busy, so the third connection is still in the listen backlog
+        assert server.handled == 2
+        assert len(started) == 2
+
+        release.set()
+        for client in clients:
+            client.join(10)
+        assert server.handled == 3
+    finally:
+        release.set()
+        stop.set()
+        accept_loop.join(5)
+        server.drain()
+        sock.close()
+
+
+def test_workers_are_recycled_after_max_requests():
+    port = free_port()
+    master = start_master(port, workers=1, threads=1, max_requests=2)
+    try:
+        pids = [wait_until_serving(port)]
+        pids += [get(port) for _ in range(5)]
+        # Each worker serves its two requests, then a fresh fork takes over
+        assert len(set(pids)) >= 3
+        assert all(pids.count(pid) <= 2 for pid in set(pids))
+    finally:
+        os.kill(master, signal.SIGTERM)
+        os.waitpid(master, 0)
+
+
+def test_replacement_serves_while_retiring_worker_finishes():
+    port = free_port()
+    master = start_master(port, workers=1, threads=1, max_requests=2)
+    try:
+        first = wait_until_serving(port)
+        slow = []
+        client = threading.Thread(target=lambda: slow.append(get(port, path='/slow')))
+        client.start()
+        time.sleep(0.5)
+        # The first worker is busy with its last request; its replacement already serves
+        started = time.monotonic()
+        replacement = get(port)
+        assert time.monotonic() - started < 2.0
+        client.join(10)
+        assert slow == [first]
+        assert replacement != first
+    finally:
+        os.kill(master, signal.SIGTERM)
+        os.waitpid(master, 0)
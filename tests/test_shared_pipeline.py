@@ -0,0 +1,157 @@
+import pickle
+import time
+from functools import partial
+import cv2
+import pytest
+import numpy as np
+from app.core import shared_pipeline
+from app.core.check_parser import CheckParser
+from app.core.deadline import current_deadline
+from app.core.fraud_detector import FraudDetector
+from app.core.image_processor import ImageProcessor, ImageQualityError
+from app.core.shared_pipeline import SharedMemoryPipeline, SharedRingBuffer, BufferFull, attach_array
+from app.utils.synthetic import make_check_file, make_check_image
+
+@pytest.fixture
+def ring_buffer():
+    buffer = SharedRingBuffer(1024)
+    yield buffer
+    buffer.close()
+
+def test_allocations_share_memory_across_views(ring_buffer):
+    ref = ring_buffer.allocate((4, 8))
+    ring_buffer.view(ref)[:] = 7
+    
+    assert attach_array(ref).sum() == 7 * 32
+    assert attach_array(ref.crop(1, 3, 2, 6)).shape == (2, 4)
+    ring_buffer.release(ref)
+
+def test_ring_buffer_reuses_space_in_allocation_order(ring_buffer):
+    first = ring_buffer.allocate((256,))
+    second = ring_buffer.allocate((256,))
+    third = ring_buffer.allocate((256,))
+    
+    # Releasing a newer allocation does not free space before the oldest is released
+    ring_buffer.release(second)
+    with pytest.raises(BufferFull):
+        ring_buffer.allocate((512,))
+    
+    ring_buffer.release(first)
+    wrapped = ring_buffer.allocate((512,))
+    assert wrapped.offset == 0
+    
+    ring_buffer.release(third)
+    ring_buffer.release(wrapped)
+    assert ring_buffer.used_bytes == 0
+    assert ring_buffer.live_allocations == 0
+
+def test_release_rejects_unknown_allocation(ring_buffer):
+    ref = ring_buffer.allocate((16,))
+    ring_buffer.release(ref)
+    with pytest.raises(ValueError):
+        ring_buffer.release(ref)
+
+class StubOCR:
+    """Stand-in for OCREngine, so the worker processes run without Tesseract"""
+
+    def __init__(self, amount_seconds=0.0):
+        self.amount_seconds = amount_seconds
+
+    def params(self):
+        return {}
+
+    def extract_amount(self, region, options=None):
+        time.sleep(self.amount_seconds)
+        if current_deadline() is not None:
+            current_deadline().check('ocr.amount')
+        return 12.5
+
+    def extract_date(self, region, options=None):
+        return None
+
+    def extract_micr(self, region):
+        return {'bank_code': '123', 'account_number': '456789', 'check_number': '0001'}
+
+class CropOCR:
+    """Stand-in for OCREngine whose readings are digests of the crops it is given"""
+
+    def params(self):
+        return {}
+
+    def extract_amount(self, region, options=None):
+        return round(float(region.mean()), 6)
+
+    def extract_date(self, region, options=None):
+        return None
+
+    def extract_micr(self, region):
+        return {'bank_code': 'x'.join(map(str, region.shape)), 'account_number': str(int(region.sum())),
+                'check_number': str(int(np.count_nonzero(region)))}
+
+def make_stub_parser(ocr=None):
+    parser = CheckParser.__new__(CheckParser)
+    parser.workspace = None
+    parser.image_processor = ImageProcessor()
+    parser.ocr_engine = ocr or StubOCR()
+    parser.fraud_detector = FraudDetector()
+    return parser
+
+def init_stub_worker(ocr):
+    shared_pipeline._worker_parser = make_stub_parser(ocr)
+
+def make_stub_pipeline(monkeypatch, ocr=None, budget=None, profile='fast'):
+    # Worker processes are forked, so they pick up the patched initializer
+    monkeypatch.setattr(shared_pipeline, '_init_worker', partial(init_stub_worker, ocr or StubOCR()))
+    return SharedMemoryPipeline(workers=2, buffer_bytes=32 * 1024 * 1024, profile=profile, budget=budget)
+
+@pytest.fixture
+def stub_pipeline(monkeypatch):
+    pipeline = make_stub_pipeline(monkeypatch)
+    yield pipeline
+    pipeline.close()
+
+def png(image):
+    return cv2.imencode('.png', image)[1].tobytes()
+
+def test_quality_error_survives_pickling():
+    error = pickle.loads(pickle.dumps(ImageQualityError([{'code': 'blurry'}], {'sharpness': 1.0})))
+    assert error.reasons == [{'code': 'blurry'}] and error.quality == {'sharpness': 1.0}
+    assert str(error) == "Image quality too low: blurry"
+
+def test_pipeline_rejects_scans_failing_the_quality_gate(stub_pipeline):
+    image = make_check_image(1600, 700, seed=1)
+    items = [('good', png(image)), ('blurry', png(cv2.GaussianBlur(image, (0, 0), 6)))]
+    results = {key: (check_data, error) for key, check_data, error in stub_pipeline.parse_many(items)}
+
+    assert results['blurry'] == (None, "Image quality too low: blurry")
+    check_data, error = results['good']
+    assert error is None and check_data['amount_numeric'] == 12.5
+
+def test_pipeline_reports_field_status(stub_pipeline):
+    [(_, check_data, error)] = stub_pipeline.parse_many([('check', png(make_check_image(1600, 700, seed=1)))])
+    assert error is None
+    assert check_data['partial'] is False
+    assert check_data['field_status'] == {'amount': 'ok', 'date': 'not_found', 'micr': 'ok',
+                                          'fraud': 'ok', 'signature': 'ok'}
+
+def test_pipeline_returns_partial_results_within_the_budget(monkeypatch):
+    with make_stub_pipeline(monkeypatch, StubOCR(amount_seconds=0.6), budget=0.4) as pipeline:
+        [(_, check_data, error)] = pipeline.parse_many([('check', png(make_check_image(1600, 700, seed=1)))])
+    assert error is None
+    assert check_data['partial'] is True
+    assert check_data['amount_numeric'] == 0.0
+    assert check_data['field_status']['amount'] == 'timeout'
+    # Too little of the budget is left for the optional stages after the MICR read
+    assert check_data['field_status']['fraud'] == 'skipped'
+    assert check_data['field_status']['signature'] == 'skipped'
+
+@pytest.mark.parametrize('profile', ['fast', 'accurate'])
+def test_pipeline_matches_the_in_process_parser(monkeypatch, profile):
+    items = [(variant, make_check_file(variant, seed=3)[1]) for variant in ('clean', 'noisy')]
+    parser = make_stub_parser(CropOCR())
+    expected = {variant: parser.parse_check(image_data, profile=profile) for variant, image_data in items}
+
+    with make_stub_pipeline(monkeypatch, CropOCR(), profile=profile) as pipeline:
+        results = {key: (check_data, error) for key, check_data, error in pipeline.parse_many(items)}
+    for variant, check_data in expected.items():
+        assert results[variant] == (check_data, None)
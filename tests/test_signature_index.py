@@ -0,0 +1,159 @@
+import os
+import numpy as np
+import cv2
+import pytest
+from app.core.check_parser import CheckParser
+from app.core.fraud_detector import FraudDetector
+from app.core.image_processor import ImageProcessor
+from app.core.signature_index import (FEATURE_DIM, MATCH_DISTANCE_RANGE, SIGNATURE_VERIFIED_THRESHOLD, SignatureIndex,
+                                      extract_signature_features)
+from app.utils.synthetic import make_check_file
+
+def draw_signature(points, thickness=3):
+    image = np.full((120, 360), 255, dtype=np.uint8)
+    cv2.polylines(image, [np.array(points, dtype=np.int32)], False, 0, thickness)
+    return image
+
+SIGNATURE = [(20, 90), (60, 20), (100, 95), (150, 30), (200, 80), (260, 25), (330, 70)]
+OTHER = [(30, 30), (330, 40), (40, 100), (320, 95)]
+# Signatures with a stroke layout close to SIGNATURE, which a loose distance mapping accepts
+LOOKALIKES = [
+    [(20, 60), (90, 30), (160, 90), (240, 40), (330, 85)],
+    [(20, 90), (110, 25), (200, 95), (330, 30)],
+    [(25, 40), (120, 95), (210, 35), (335, 90)],
+    [(20, 80), (80, 30), (140, 80), (200, 30), (260, 80), (330, 30)]
+]
+
+def shifted(points, dx, dy):
+    return [(x + dx * (i % 2), y + dy * ((i + 1) % 2)) for i, (x, y) in enumerate(points)]
+
+def test_features_are_fixed_length_unit_vectors():
+    features = extract_signature_features(draw_signature(SIGNATURE))
+    
+    assert features.shape == (FEATURE_DIM,)
+    assert features.dtype == np.float32
+    assert abs(np.linalg.norm(features) - 1.0) < 1e-5
+
+def test_blank_region_has_no_features():
+    blank = np.full((120, 360), 255, dtype=np.uint8)
+    assert not np.any(extract_signature_features(blank))
+
+def test_verification_prefers_enrolled_signature(tmp_path):
+    index = SignatureIndex(str(tmp_path))
+    assert index.add('12345678', extract_signature_features(draw_signature(SIGNATURE))) == 1
+    
+    genuine = index.verify('12345678', extract_signature_features(draw_signature(SIGNATURE, thickness=4)))
+    forged = index.verify('12345678', extract_signature_features(draw_signature(OTHER)))
+    
+    assert genuine['references'] == 1
+    assert genuine['confidence'] > SIGNATURE_VERIFIED_THRESHOLD
+    assert genuine['confidence'] > forged['confidence']
+
+def test_different_signatures_are_not_verified(tmp_path):
+    index = SignatureIndex(str(tmp_path))
+    index.add('12345678', extract_signature_features(draw_signature(SIGNATURE)))
+    
+    # Redrawn with a thinner pen and a slightly unsteady hand: still verified
+    for variant in (draw_signature(SIGNATURE, thickness=2), draw_signature(shifted(SIGNATURE, 3, -2))):
+        assert index.verify('12345678', extract_signature_features(variant))['confidence'] > SIGNATURE_VERIFIED_THRESHOLD
+    for points in LOOKALIKES + [OTHER]:
+        result = index.verify('12345678', extract_signature_features(draw_signature(points)))
+        assert result['confidence'] < SIGNATURE_VERIFIED_THRESHOLD, points
+
+def test_match_distance_follows_reference_spread(tmp_path):
+    index = SignatureIndex(str(tmp_path))
+    for thickness in (2, 3, 4):
+        index.add('111', extract_signature_features(draw_signature(SIGNATURE, thickness=thickness)))
+    result = index.verify('111', extract_signature_features(draw_signature(SIGNATURE)))
+    assert MATCH_DISTANCE_RANGE[0] <= result['match_distance'] <= MATCH_DISTANCE_RANGE[1]
+    assert result['confidence'] > SIGNATURE_VERIFIED_THRESHOLD
+
+def test_unknown_account_is_not_verified(tmp_path):
+    index = SignatureIndex(str(tmp_path))
+    result = index.verify('999', extract_signature_features(draw_signature(SIGNATURE)))
+    assert result['confidence'] == 0.0
+    assert result['references'] == 0
+
+def test_references_persist_and_are_picked_up_incrementally(tmp_path):
+    writer = SignatureIndex(str(tmp_path))
+    reader = SignatureIndex(str(tmp_path))
+    writer.add('111', extract_signature_features(draw_signature(SIGNATURE)))
+    writer.add('111', extract_signature_features(draw_signature(OTHER)))
+    
+    reader.refresh()
+    assert len(reader) == 2
+    assert reader.references('111').shape == (2, FEATURE_DIM)
+
+def marker_vector(process, index):
+    vector = np.zeros(FEATURE_DIM, dtype=np.float32)
+    vector[process] = 1.0
+    vector[4 + index % 100] = 1.0
+    vector[104 + index // 100] = 1.0
+    return vector
+
+def test_concurrent_enrollment_from_several_processes(tmp_path):
+    # Index opened before the others enroll, as in every prefork worker
+    indexes = [SignatureIndex(str(tmp_path)) for _ in range(4)]
+    children = []
+    for process, index in enumerate(indexes):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for i in range(200):
+                    index.add(f'acct-{process}', marker_vector(process, i))
+            finally:
+                os._exit(0)
+        children.append(pid)
+    for pid in children:
+        os.waitpid(pid, 0)
+    
+    reader = SignatureIndex(str(tmp_path))
+    assert len(reader) == 800
+    for process in range(4):
+        expected = np.stack([marker_vector(process, i) for i in range(200)])
+        np.testing.assert_array_equal(reader.references(f'acct-{process}'), expected)
+
+def test_torn_vector_write_does_not_shift_later_rows(tmp_path):
+    index = SignatureIndex(str(tmp_path))
+    index.add('111', marker_vector(1, 0))
+    # A writer died halfway through a vector, before writing its account line
+    with open(index.vectors_path, 'ab') as f:
+        f.write(marker_vector(2, 0).tobytes()[:100])
+    
+    other = SignatureIndex(str(tmp_path))
+    assert other.add('222', marker_vector(2, 1)) == 1
+    np.testing.assert_array_equal(SignatureIndex(str(tmp_path)).references('222'), [marker_vector(2, 1)])
+    np.testing.assert_array_equal(index.references('111'), [marker_vector(1, 0)])
+
+class StubOCR:
+    """Stand-in for OCREngine, reading the enrolled account from every check"""
+
+    def params(self):
+        return {}
+
+    def extract_amount(self, region, options=None):
+        return 12.5
+
+    def extract_date(self, region, options=None):
+        return None
+
+    def extract_micr(self, region):
+        return {'bank_code': '123', 'account_number': '456789', 'check_number': '0001'}
+
+@pytest.mark.parametrize('profile', ['fast', 'accurate'])
+def test_enrolled_check_verifies_under_the_same_profile(tmp_path, profile):
+    parser = CheckParser.__new__(CheckParser)
+    parser.workspace = None
+    parser.image_processor = ImageProcessor()
+    parser.ocr_engine = StubOCR()
+    parser.fraud_detector = FraudDetector(signature_index=SignatureIndex(str(tmp_path)))
+    _, raw = make_check_file('noisy', seed=2)
+    
+    assert parser.enroll_signature(raw, '456789', profile) == 1
+    result = parser.parse_check(raw, profile=profile)
+    assert result['signature_verified']
+    # Enrollment and parsing preprocess the crop identically, so the vectors match exactly
+    image = parser.decode_image(raw)
+    _, options = parser.resolve_profile(profile, image)
+    probe = extract_signature_features(parser.extract_check_regions(image, options.get('image'))['signature'])
+    assert parser.fraud_detector.signature_index.verify('456789', probe)['distance'] == pytest.approx(0.0, abs=1e-5)
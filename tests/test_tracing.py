@@ -0,0 +1,102 @@
+import json
+from types import SimpleNamespace
+from flask import Flask
+from app.utils.tracing import Tracer, NDJSONFileExporter, OTLPHTTPExporter, parse_traceparent, current_trace_id
+from app.middleware.tracing import init_tracing
+
+def read_spans(path):
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+    except FileNotFoundError:
+        return []
+
+def test_nested_spans_share_trace_and_link_parents(tmp_path):
+    path = str(tmp_path / 'traces.ndjson')
+    tracer = Tracer(NDJSONFileExporter(path), sample_rate=1.0)
+    
+    root, token = tracer.start_span('request')
+    with tracer.span('preprocess', width=100) as preprocess:
+        with tracer.span('tesseract') as ocr:
+            ocr.set_attribute('text_length', 5)
+    tracer.end_span(root, token)
+    tracer.shutdown()
+    
+    spans = {span['name']: span for span in read_spans(path)}
+    assert set(spans) == {'request', 'preprocess', 'tesseract'}
+    assert len({span['trace_id'] for span in spans.values()}) == 1
+    assert spans['preprocess']['parent_id'] == spans['request']['span_id']
+    assert spans['tesseract']['parent_id'] == spans['preprocess']['span_id']
+    assert spans['tesseract']['attributes'] == {'text_length': 5}
+    assert spans['preprocess']['attributes'] == {'width': 100}
+
+def test_unsampled_traces_keep_trace_id_but_export_nothing(tmp_path):
+    path = str(tmp_path / 'traces.ndjson')
+    tracer = Tracer(NDJSONFileExporter(path), sample_rate=0.0)
+    
+    root, token = tracer.start_span('request')
+    with tracer.span('preprocess'):
+        assert current_trace_id() == root.trace_id
+    tracer.end_span(root, token)
+    tracer.shutdown()
+    
+    assert read_spans(path) == []
+    assert current_trace_id() is None
+
+def test_spans_outside_a_trace_are_not_recorded(tmp_path):
+    path = str(tmp_path / 'traces.ndjson')
+    tracer = Tracer(NDJSONFileExporter(path), sample_rate=1.0)
+    with tracer.span('orphan') as span:
+        span.set_attribute('ignored', True)
+    tracer.shutdown()
+    assert read_spans(path) == []
+
+def test_otlp_payload_encoding():
+    exporter = OTLPHTTPExporter('http://localhost:1', flush_interval=60)
+    tracer = Tracer(None)
+    span, token = tracer.start_span('request', sampled=True, size=3, ratio=0.5, ok=True)
+    tracer.end_span(span, token)
+    
+    payload = json.loads(exporter._encode([span]))
+    encoded = payload['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+    assert encoded['traceId'] == span.trace_id
+    assert {'key': 'size', 'value': {'intValue': '3'}} in encoded['attributes']
+    assert {'key': 'ok', 'value': {'boolValue': True}} in encoded['attributes']
+    exporter._queue.put(None)
+
+def test_traceparent_parsing():
+    header = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+    assert parse_traceparent(header) == ('4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7', True)
+    assert parse_traceparent('garbage') is None
+    assert parse_traceparent(None) is None
+
+def test_requests_get_trace_id_header(tmp_path):
+    settings = SimpleNamespace(TRACING_ENABLED=True, TRACE_EXPORTER='ndjson', TRACE_SAMPLE_RATE=1.0,
+                               TRACE_FILE=str(tmp_path / 'traces.ndjson'), OTLP_ENDPOINT='', APP_NAME='test')
+    app = Flask(__name__)
+    init_tracing(app, settings)
+    
+    @app.route('/ping')
+    def ping():
+        return current_trace_id()
+    
+    response = app.test_client().get('/ping')
+    assert response.headers['X-Trace-Id'] == response.get_data(as_text=True)
+    assert read_spans(settings.TRACE_FILE)[0]['attributes']['http.status_code'] == 200
+
+def test_incoming_sampling_decision_is_honoured(tmp_path):
+    settings = SimpleNamespace(TRACING_ENABLED=True, TRACE_EXPORTER='ndjson', TRACE_SAMPLE_RATE=1.0,
+                               TRACE_FILE=str(tmp_path / 'traces.ndjson'), OTLP_ENDPOINT='', APP_NAME='test')
+    app = Flask(__name__)
+    init_tracing(app, settings)
+    
+    @app.route('/ping')
+    def ping():
+        return current_trace_id()
+    
+    trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+    response = app.test_client().get('/ping', headers={'traceparent': f'00-{trace_id}-00f067aa0ba902b7-00'})
+    assert response.headers['X-Trace-Id'] == trace_id
+    # Not sampled upstream, so nothing is exported (and no file is created)
+    assert read_spans(settings.TRACE_FILE) == []
+    assert not (tmp_path / 'traces.ndjson').exists()
@@ -0,0 +1,94 @@
+import gc
+import threading
+import weakref
+import numpy as np
+import cv2
+from app.core.image_processor import ImageProcessor
+from app.core.ocr_engine import OCREngine
+from app.core.workspace import Workspace, ThreadLocalWorkspace, register_workspace_metrics
+from app.utils.metrics import Metrics
+
+def make_image(height=300, width=700):
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(image, "0123456789", (20, height - 30), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    return image
+
+def test_buffers_are_reused_until_shape_changes():
+    workspace = Workspace()
+    first = workspace.buffer('gray', (10, 20))
+    assert workspace.buffer('gray', (10, 20)) is first
+    
+    resized = workspace.buffer('gray', (20, 20))
+    assert resized is not first
+    assert workspace.allocated_bytes == resized.nbytes
+    assert workspace.peak_bytes == resized.nbytes
+    assert workspace.allocations == 2
+
+def test_opencv_objects_are_cached():
+    workspace = Workspace()
+    assert workspace.clahe(2.0, (8, 8)) is workspace.clahe(2.0, (8, 8))
+    assert workspace.kernel(cv2.MORPH_RECT, (3, 3)) is workspace.kernel(cv2.MORPH_RECT, (3, 3))
+
+def test_workspace_output_matches_allocating_path():
+    image = make_image()
+    plain = ImageProcessor()
+    pooled = ImageProcessor(workspace=Workspace())
+    
+    np.testing.assert_array_equal(plain.preprocess_image(image), pooled.preprocess_image(image))
+    np.testing.assert_array_equal(plain.enhance_micr(image[200:, 50:650]),
+                                  pooled.enhance_micr(image[200:, 50:650]))
+
+def test_steady_state_does_not_allocate(monkeypatch):
+    monkeypatch.setattr(OCREngine, '_test_ocr', lambda self: None)
+    workspace = ThreadLocalWorkspace()
+    processor = ImageProcessor(workspace=workspace)
+    engine = OCREngine(workspace=workspace)
+    image = make_image()
+    
+    def parse():
+        regions = processor.extract_regions(processor.preprocess_image(image))
+        # Crops of different shapes, as for a real check
+        engine.prepare_crop(regions['amount'], field='amount')
+        engine.prepare_crop(regions['date'], field='date')
+        engine.prepare_crop(processor.enhance_micr(regions['micr']), field='micr')
+    
+    parse()
+    allocations = workspace.stats()['allocations']
+    parse()
+    parse()
+    
+    assert workspace.stats()['allocations'] == allocations
+    assert workspace.stats()['peak_bytes'] > 0
+
+def test_workspaces_of_finished_threads_are_released():
+    workspace = ThreadLocalWorkspace()
+    retired = []
+    
+    def work():
+        workspace.buffer('large', (1000, 1000))
+        retired.append(weakref.ref(workspace._get()))
+    
+    threads = [threading.Thread(target=work) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+    
+    assert all(ref() is None for ref in retired)
+    assert workspace.stats()['threads'] == 0
+    assert workspace.stats()['allocated_bytes'] == 0
+
+def test_workspace_stats_are_exported_as_gauges():
+    workspace = ThreadLocalWorkspace()
+    registry = Metrics()
+    register_workspace_metrics(workspace, registry)
+    workspace.buffer('gray', (10, 20))
+    workspace.buffer('gray', (10, 20))
+    
+    lines = registry.render().splitlines()
+    assert '# TYPE image_workspace_allocated_bytes gauge' in lines
+    values = {line.split('{')[0]: float(line.rsplit(' ', 1)[1]) for line in lines if not line.startswith('#')}
+    assert values['image_workspace_allocated_bytes'] == 200
+    assert values['image_workspace_allocations'] == 1
+    assert values['image_workspace_reuses'] == 1